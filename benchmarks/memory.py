@@ -0,0 +1,53 @@
+from __future__ import annotations
+from typing import Callable, Dict
+import json
+import tracemalloc
+
+from lark_dynamic import Alias, Grammar, Group, Literal, RegExp, Variable
+from lark_dynamic.definitions import RuleDef
+from lark_dynamic.token import Token
+
+
+# Usage: python -m benchmarks.memory
+# Prints the average memory taken by a single node of each kind, in bytes
+
+COUNT = 10000
+
+
+def per_node(make: Callable[[int], object]) -> float:
+    tracemalloc.start()
+    try:
+        start = tracemalloc.get_traced_memory()[0]
+        nodes = [make(i) for i in range(COUNT)]
+        size = tracemalloc.get_traced_memory()[0] - start
+    finally:
+        tracemalloc.stop()
+    del nodes
+    return size / COUNT
+
+
+def main() -> None:
+    g = Grammar()
+    strings = [f"string{i}" for i in range(COUNT)]
+    children = ("a", "b")
+
+    cases: Dict[str, Callable[[int], object]] = {
+        "Literal": lambda i: Literal(strings[i]),
+        "RegExp": lambda i: RegExp(strings[i]),
+        "Group": lambda i: Group(*children),
+        "Alias": lambda i: Alias(strings[i], children),
+        "Variable": lambda i: Variable(len),
+        "RuleDef": lambda i: RuleDef(strings[i], children),
+        # repeated references to the same rule
+        "Rule reference": lambda i: g.some_rule,
+        "Token": lambda i: Token(),
+    }
+
+    # the list holding the nodes is included in the measurement, so it's subtracted
+    baseline = per_node(lambda i: None)
+
+    print(json.dumps({name: per_node(make) - baseline for name, make in cases.items()}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
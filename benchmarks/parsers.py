@@ -0,0 +1,54 @@
+from __future__ import annotations
+from argparse import ArgumentParser
+from typing import Any
+
+from lark import Lark
+
+from lark_dynamic.direct import build_lark_direct
+
+from .run import measure
+from .synthetic import GENERATORS
+
+
+# Parser build time from grammar text (render + Lark's meta-parse + compile) vs direct construction.
+# Usage:
+#   python -m benchmarks.parsers --scale 100 1000 --parser earley lalr
+
+
+START = {
+    "static_rules": "rule_0",
+    "wide_options": "start",
+    "variables": "rule_0",
+    "templates": "use_0",
+}
+
+
+def run_case(name: str, scale: int, parser: str, repeat: int) -> dict[str, Any]:
+    grammar = GENERATORS[name](scale)
+    options = {"parser": parser, "start": START[name]}
+
+    text = measure(lambda: Lark(grammar.generate(), **options), repeat)
+    direct = measure(lambda: build_lark_direct(grammar, {}, options), repeat)
+    return {"case": name, "scale": scale, "parser": parser, "text": text, "direct": direct}
+
+
+def main() -> None:
+    parser = ArgumentParser(description="parser build benchmarks")
+    parser.add_argument("--scale", type=int, nargs="+", default=[100])
+    parser.add_argument("--case", nargs="+", choices=sorted(START), default=sorted(START))
+    parser.add_argument("--parser", nargs="+", default=["earley", "lalr"])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    for name in args.case:
+        for scale in args.scale:
+            for lark_parser in args.parser:
+                result = run_case(name, scale, lark_parser, args.repeat)
+                print(
+                    f"{name}[{scale}] {lark_parser}: text {result['text']:.4f}s, "
+                    f"direct {result['direct']:.4f}s (x{result['text'] / result['direct']:.2f})"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+from __future__ import annotations
+from argparse import ArgumentParser
+from datetime import datetime, timezone
+from time import perf_counter
+from typing import Any, Callable
+import json
+import platform
+import subprocess
+import sys
+import tracemalloc
+
+from lark_dynamic import Grammar
+from lark_dynamic.treedump import iter_trees
+
+from .synthetic import GENERATORS
+
+
+# Usage:
+#   python -m benchmarks.run --scale 100 10000 100000 --output results.json
+#   python -m benchmarks.run --compare old.json new.json
+
+
+# `repr()` indents every level, so its output is quadratic in the depth of a tree,
+# trees of deep cases are cut at this depth to measure the dumper and not the size of the indentation.
+# Other cases measure `repr()` of shallow trees as is
+REPR_DEPTH = 1000
+DEEP_CASES = {"deep_nesting"}
+
+
+def measure(function: Callable[[], object], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = perf_counter()
+        function()
+        best = min(best, perf_counter() - start)
+    return best
+
+
+def peak_memory(function: Callable[[], object]) -> int:
+    tracemalloc.start()
+    try:
+        function()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def run_case(name: str, scale: int, repeat: int) -> dict[str, Any]:
+    make_grammar = GENERATORS[name]
+    grammar = make_grammar(scale)
+
+    def construct_and_generate() -> None:
+        make_grammar(scale).generate()
+
+    result: dict[str, Any] = {
+        "case": name,
+        "scale": scale,
+        "construct": measure(lambda: make_grammar(scale), repeat),
+        # the first call fills render caches, so both are measured separately
+        "generate_first": measure(lambda: make_grammar(scale).generate(), 1),
+        "generate": measure(grammar.generate, repeat),
+        "repr": measure(lambda: dump_repr(grammar, name in DEEP_CASES), repeat),
+        "peak_memory": peak_memory(construct_and_generate),
+        "output_size": len(grammar.generate()),
+    }
+    return result
+
+
+def dump_repr(grammar: Grammar, deep: bool) -> str:
+    # `repr(grammar)`, up to `REPR_DEPTH` for deep trees
+    if not deep:
+        return repr(grammar)
+    return "".join(iter_trees(grammar.use_wrapper().repr_definitions(), REPR_DEPTH))
+
+
+def get_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(old_path: str, new_path: str) -> None:
+    with open(old_path) as file:
+        old = {(r["case"], r["scale"]): r for r in json.load(file)["results"]}
+    with open(new_path) as file:
+        new = json.load(file)["results"]
+
+    for result in new:
+        previous = old.get((result["case"], result["scale"]))
+        if previous is None:
+            continue
+        ratios = ", ".join(
+            f"{metric} x{result[metric] / previous[metric]:.2f}"
+            for metric in ("construct", "generate", "repr", "peak_memory")
+            if previous[metric]
+        )
+        print(f"{result['case']}[{result['scale']}]: {ratios}")
+
+
+def main() -> None:
+    parser = ArgumentParser(description="lark_dynamic benchmarks")
+    parser.add_argument("--scale", type=int, nargs="+", default=[100, 10000, 100000])
+    parser.add_argument("--case", nargs="+", choices=sorted(GENERATORS), default=sorted(GENERATORS))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="file to write JSON results to (stdout by default)")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"))
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    results = []
+    for name in args.case:
+        for scale in args.scale:
+            result = run_case(name, scale, args.repeat)
+            print(
+                f"{name}[{scale}]: generate {result['generate']:.4f}s, peak {result['peak_memory']} B",
+                file=sys.stderr,
+            )
+            results.append(result)
+
+    report = {
+        "meta": {
+            "commit": get_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+        },
+        "results": results,
+    }
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+from __future__ import annotations
+from typing import Callable, Dict
+
+from lark_dynamic import (
+    Grammar,
+    Literal,
+    Many,
+    Maybe,
+    Option,
+    RegExp,
+    Some,
+    Variable,
+    makeBoolVariable,
+)
+from lark_dynamic.constants import ContextType
+from lark_dynamic.token import Renderable
+
+
+# Synthetic grammars for benchmarks. Every generator takes a scale (roughly a number of definitions or nodes)
+
+
+def static_rules(scale: int) -> Grammar:
+    g = Grammar()
+    g.NAME = RegExp(r"[a-z_]\w*")
+    g.NUMBER = RegExp(r"\d+")
+    for i in range(scale):
+        setattr(
+            g,
+            f"rule_{i}",
+            Option(
+                (f"kw{i}", g.NAME, Maybe("=", g.NUMBER)),
+                (getattr(g, f"rule_{(i + 1) % scale}"), Some(",", g.NAME)),
+            ),
+        )
+    return g
+
+
+def deep_nesting(scale: int) -> Grammar:
+    # a single tree `scale` levels deep, rendered flat, as larger scales are past the recursion limit
+    g = Grammar(flat=True)
+    token: Renderable = "leaf"
+    for level in range(scale):
+        token = Maybe(token, "x") if level % 2 else (token, Many("y"))
+    g.deep = token
+    return g
+
+
+def wide_options(scale: int) -> Grammar:
+    g = Grammar()
+    g.KEYWORD = Option(*(Literal(f"keyword{i}") for i in range(scale)))
+    g.start = Some(g.KEYWORD)
+    return g
+
+
+def keyword_variable(context: ContextType) -> Renderable:
+    return Option(*(f"{context.get('prefix', 'kw')}{i}" for i in range(5)))
+
+
+def variables(scale: int) -> Grammar:
+    g = Grammar()
+    for i in range(scale):
+        if i % 2:
+            token: Renderable = makeBoolVariable(f"flag{i % 10}", f"yes{i}", f"no{i}")
+        else:
+            token = Variable(keyword_variable)
+        setattr(g, f"rule_{i}", ("a", token, Maybe("b")))
+    return g
+
+
+def templates(scale: int) -> Grammar:
+    g = Grammar()
+    g.NAME = RegExp(r"\w+")
+    for i in range(scale // 2):
+        getattr(g, f"list_{i}")[g.item, g.sep] = g.item, Some(g.sep, g.item)
+        setattr(g, f"use_{i}", getattr(g, f"list_{i}")[g.NAME, f",{i}"])
+    return g
+
+
+GENERATORS: Dict[str, Callable[[int], Grammar]] = {
+    "static_rules": static_rules,
+    "deep_nesting": deep_nesting,
+    "wide_options": wide_options,
+    "variables": variables,
+    "templates": templates,
+}
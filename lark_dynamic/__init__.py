@@ -6,6 +6,7 @@ from .atoms import (
     Regexp as Regexp,
     Empty as Empty,
     Prerendered as Prerendered,
+    KeywordSet as KeywordSet,
 )
 
 from .combinators import (
@@ -33,6 +34,12 @@ from .variable import (
     Variable as Variable,
     BoolVariable as BoolVariable,
     makeBoolVariable as makeBoolVariable,
+    Lookup as Lookup,
+    BoolSwitch as BoolSwitch,
+    Switch as Switch,
+    CallableRef as CallableRef,
 )
 
+from .aio import AsyncVariable as AsyncVariable
+
 from .definitions import Alias as Alias
@@ -0,0 +1,112 @@
+from __future__ import annotations
+from typing import Any, Awaitable, Callable, Hashable, Sequence
+from contextvars import ContextVar
+import asyncio
+
+from .constants import ContextType
+from .token import Renderable
+from .variable import Variable, memo_scope
+
+
+# Async variables can't be awaited while rendering, so `agenerate` renders in passes:
+# a pass renders unresolved async variables as empty and collects them, then all of them are awaited
+# at once and the grammar is rendered again, until a pass finds nothing new (results of async
+# variables can contain other async variables). Renders don't use grammar caches, as they can't tell
+# results of async variables apart
+
+AsyncCallback = Callable[[ContextType], Awaitable[Renderable]]
+
+
+class Resolver:
+    __slots__ = ("values", "pending")
+
+    def __init__(self) -> None:
+        self.values: dict[Hashable, Renderable] = {}
+        # equal variables (e.g. the same callback used in many places) are awaited once
+        self.pending: dict[Hashable, AsyncVariable] = {}
+
+    def get(self, variable: AsyncVariable) -> Renderable:
+        key = variable.get_key()
+        if key in self.values:
+            return self.values[key]
+        self.pending.setdefault(key, variable)
+        return Prerendered("")
+
+    async def resolve(self, context: ContextType) -> None:
+        keys = list(self.pending)
+        variables = list(self.pending.values())
+        self.pending.clear()
+
+        results = await asyncio.gather(*[variable.fetch(context) for variable in variables])
+        self.values.update(zip(keys, results))
+
+
+# set for the duration of `agenerate`, so concurrent renders have separate values
+resolver: ContextVar[Resolver | None] = ContextVar("resolver", default=None)
+
+
+class AsyncVariable(Variable):
+    # `default` is used when the callback takes longer than `timeout` seconds
+    __slots__ = ("function", "timeout", "default")
+
+    def __init__(
+        self,
+        callback: AsyncCallback,
+        timeout: float | None = None,
+        default: Renderable | None = None,
+    ):
+        super().__init__(self.evaluate)
+        self.function = callback
+        self.timeout = timeout
+        self.default = default
+
+    def evaluate(self, context: ContextType) -> Renderable:
+        current = resolver.get()
+        if current is None:
+            raise RuntimeError(
+                "Grammars with async variables can only be rendered with `await grammar.agenerate()`"
+            )
+        return current.get(self)
+
+    async def fetch(self, context: ContextType) -> Renderable:
+        try:
+            return await asyncio.wait_for(self.function(context), self.timeout)
+        except asyncio.TimeoutError:
+            if self.default is None:
+                raise
+            return self.default
+
+    def get_children(self) -> Sequence[Renderable]:
+        return () if self.default is None else (self.default,)
+
+    def get_key(self) -> tuple[Hashable, ...]:
+        return (self.function, self.timeout)
+
+    def replace_children(self, children: Sequence[Renderable]) -> AsyncVariable:
+        return AsyncVariable(self.function, self.timeout, children[0] if children else None)
+
+    def repr_children(self) -> str:
+        return str(self.function.__doc__ or self.function)
+
+
+async def agenerate(grammar: Grammar, context: dict[str, Any]) -> str:
+    current = Resolver()
+    token = resolver.set(current)
+    try:
+        while True:
+            with memo_scope():
+                if grammar.__flat__:
+                    result = render_parts_flat(grammar_parts(grammar), context).strip()
+                else:
+                    result = "".join(grammar.build_grammar(context)).strip()
+
+            if not current.pending:
+                return result
+            await current.resolve(context)
+    finally:
+        resolver.reset(token)
+
+
+from .grammar import Grammar
+from .atoms import Prerendered
+from .renderer import grammar_parts, render_parts_flat
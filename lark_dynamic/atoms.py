@@ -1,13 +1,16 @@
 from __future__ import annotations
-from typing import Iterable
+from typing import Hashable, Iterable, Sequence
 import warnings
 
-from .utils import comma_separated
+from .utils import comma_separated, separated_parts
 from .constants import ContextType
-from .token import Renderable, Token
+from .token import CLOSE_BRACE, COMMA, DUMP_NEWLINE, Raw, Renderable, Token
+from .trie import BranchCache, trie_pattern
 
 
 class Literal(Token):
+    __slots__ = ("string", "flags")
+
     def __init__(self, string: str, flags: str = ""):
         self.string = string
         self.flags = flags
@@ -18,7 +21,16 @@ class Literal(Token):
         if self.flags:
             yield self.flags
 
+    def render_parts(self, context: ContextType) -> Sequence[Renderable]:
+        string = self.string.replace('"', '\\"')
+        return [Raw(f'"{string}"{self.flags}')]
+
+    def get_key(self) -> tuple[Hashable, ...]:
+        return (self.string, self.flags)
+
     def __getattr__(self, attr: str) -> Literal:
+        if attr.startswith("__"):
+            raise AttributeError(attr)
         return Literal(self.string, self.flags + attr)
 
     def repr_children(self) -> str:
@@ -27,6 +39,8 @@ class Literal(Token):
 
 
 class RegExp(Token):
+    __slots__ = ("regexp", "flags")
+
     def __init__(self, regexp: str, flags: str = ""):
         self.regexp = regexp
         self.flags = flags
@@ -34,7 +48,15 @@ class RegExp(Token):
     def render(self, context: ContextType) -> Iterable[str]:
         yield f"/{self.regexp}/{self.flags}"
 
+    def render_parts(self, context: ContextType) -> Sequence[Renderable]:
+        return [Raw(f"/{self.regexp}/{self.flags}")]
+
+    def get_key(self) -> tuple[Hashable, ...]:
+        return (self.regexp, self.flags)
+
     def __getattr__(self, attr: str) -> RegExp:
+        if attr.startswith("__"):
+            raise AttributeError(attr)
         return RegExp(self.regexp, self.flags + attr)
 
     def repr_children(self) -> str:
@@ -43,25 +65,93 @@ class RegExp(Token):
 
 
 class Regexp(RegExp):
-    pass
+    __slots__ = ()
+
+
+class KeywordSet(Token):
+    # a large set of literal alternatives, rendered as a single prefix-factored regexp
+    __slots__ = ("keywords", "flags", "pattern", "branches")
+
+    def __init__(self, keywords: Iterable[str], flags: str = ""):
+        if "x" in flags:
+            raise ValueError("KeywordSet can't be used with the x (verbose) flag")
+
+        self.keywords = frozenset(keywords)
+        self.flags = flags
+        self.pattern: str | None = None
+        # shared with the sets made by `add`/`remove`, and freed with them
+        self.branches: BranchCache = {}
+
+        if not self.keywords or "" in self.keywords:
+            raise ValueError("KeywordSet must contain at least one non-empty keyword")
+
+    def get_pattern(self) -> str:
+        if self.pattern is None:
+            keywords = self.keywords
+            if "i" in self.flags:
+                # case variants would be separate branches, and the first one would win
+                keywords = frozenset(keyword.lower() for keyword in keywords)
+            self.pattern = trie_pattern(keywords, self.branches)
+        return self.pattern
+
+    def add(self, *keywords: str) -> KeywordSet:
+        return self.derive(self.keywords.union(keywords))
+
+    def remove(self, *keywords: str) -> KeywordSet:
+        return self.derive(self.keywords.difference(keywords))
+
+    def derive(self, keywords: Iterable[str]) -> KeywordSet:
+        derived = KeywordSet(keywords, self.flags)
+        derived.branches = self.branches
+        return derived
+
+    def render(self, context: ContextType) -> Iterable[str]:
+        yield f"/{self.get_pattern()}/{self.flags}"
+
+    def render_parts(self, context: ContextType) -> Sequence[Renderable]:
+        return [Raw(f"/{self.get_pattern()}/{self.flags}")]
+
+    def get_key(self) -> tuple[Hashable, ...]:
+        return (self.keywords, self.flags)
+
+    def __getattr__(self, attr: str) -> KeywordSet:
+        if attr.startswith("__"):
+            raise AttributeError(attr)
+        return KeywordSet(self.keywords, self.flags + attr)
+
+    def repr_children(self) -> str:
+        return f"{len(self.keywords)} keywords {self.flags}".strip()
 
 
 class Prerendered(Token):
+    __slots__ = ("string",)
+
     def __init__(self, string: str):
         self.string = string
 
     def render(self, context: ContextType) -> Iterable[str]:
         yield self.string
 
+    def render_parts(self, context: ContextType) -> Sequence[Renderable]:
+        return [Raw(self.string)]
+
+    def get_key(self) -> tuple[Hashable, ...]:
+        return (self.string,)
+
     def repr_children(self) -> str:
         return self.string
 
 
 class Rule(Prerendered):
+    __slots__ = ("grammar",)
+
     def __init__(self, string: str, grammar: Grammar):
         self.string = string
         self.grammar = grammar
 
+    def get_key(self) -> tuple[Hashable, ...]:
+        return (self.string, self.grammar)
+
     def __getitem__(self, item: Renderable) -> Template:
         if not isinstance(item, tuple):
             item = (item,)
@@ -76,10 +166,15 @@ class Rule(Prerendered):
 
 
 class Terminal(Prerendered):
+    __slots__ = ("grammar",)
+
     def __init__(self, string: str, grammar: Grammar):
         self.string = string
         self.grammar = grammar
 
+    def get_key(self) -> tuple[Hashable, ...]:
+        return (self.string, self.grammar)
+
     def __getitem__(self, item: Renderable) -> Template:
         warnings.warn(
             f"You are trying to make a terminal template: {self.string}[{item}]`, this won't work"
@@ -97,10 +192,21 @@ class Terminal(Prerendered):
 
 
 class Template(Token):
+    __slots__ = ("name", "args", "hash_value")
+
     def __init__(self, name: str, args: tuple[Renderable, ...]):
         self.name = name
         self.args = args
 
+    def get_children(self) -> Sequence[Renderable]:
+        return self.args
+
+    def get_key(self) -> tuple[Hashable, ...]:
+        return (self.name,)
+
+    def replace_children(self, children: Sequence[Renderable]) -> Template:
+        return Template(self.name, tuple(children))
+
     def render(self, context: ContextType) -> Iterable[str]:
         yield self.name
         yield "{"
@@ -109,8 +215,15 @@ class Template(Token):
         )
         yield "}"
 
-    def repr_children(self) -> str:
-        return "\n".join(map(repr, self.args))
+    def render_parts(self, context: ContextType) -> Sequence[Renderable]:
+        return [
+            Raw(self.name + "{"),
+            *separated_parts(self.args, COMMA),
+            CLOSE_BRACE,
+        ]
+
+    def repr_parts(self) -> Sequence[Renderable]:
+        return separated_parts(self.args, DUMP_NEWLINE)
 
 
 Empty = Prerendered("")
@@ -0,0 +1,148 @@
+from __future__ import annotations
+from collections import OrderedDict
+from typing import Callable, Generic, Hashable, NamedTuple, TypeVar
+from threading import RLock
+
+from .constants import ContextType
+from .tracking import Dependencies, TrackingContext
+
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class CacheInfo(NamedTuple):
+    hits: int
+    misses: int
+    maxsize: int
+    currsize: int
+
+
+class LRUCache(Generic[K, V]):
+    # caches are shared by threads rendering the same grammar (e.g. a frozen snapshot),
+    # the lock keeps the order of `data` consistent
+    def __init__(self, maxsize: int = 128):
+        if maxsize < 1:
+            raise ValueError(f"Cache size must be positive, not {maxsize}")
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.data: OrderedDict[K, V] = OrderedDict()
+        self.lock = RLock()
+
+    def get(self, key: K) -> V | None:
+        with self.lock:
+            try:
+                value = self.data[key]
+            except KeyError:
+                self.misses += 1
+                return None
+            self.data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: K, value: V) -> None:
+        with self.lock:
+            self.data[key] = value
+            self.data.move_to_end(key)
+            while len(self.data) > self.maxsize:
+                self.evicted(*self.data.popitem(last=False))
+
+    def evicted(self, key: K, value: V) -> None:
+        pass
+
+    def clear(self) -> None:
+        with self.lock:
+            self.data.clear()
+
+    def info(self) -> CacheInfo:
+        return CacheInfo(self.hits, self.misses, self.maxsize, len(self.data))
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+
+MISSING = object()
+
+
+class GenerationCache(LRUCache[Hashable, V]):
+    # results are keyed only by the context keys the grammar has read while rendering,
+    # so unrelated keys passed to `generate()` don't cause cache misses
+    def __init__(self, maxsize: int = 128):
+        super().__init__(maxsize)
+        # known dependency sets -> number of cached entries using them
+        self.dependencies: dict[Dependencies, int] = {}
+
+    def make_key(
+        self, context: ContextType, dependencies: Dependencies
+    ) -> Hashable | None:
+        # `dict` methods don't count as reads of a tracking context
+        if dependencies is None:
+            items = tuple(sorted(dict.items(context)))
+        else:
+            items = tuple(
+                (key, dict.get(context, key, MISSING)) for key in sorted(dependencies)
+            )
+
+        key = (dependencies, items)
+        try:
+            hash(key)
+        except TypeError:
+            # unhashable context values can't be cached
+            return None
+        return key
+
+    def find(self, context: ContextType) -> tuple[Dependencies, V] | None:
+        with self.lock:
+            for dependencies in self.dependencies:
+                key = self.make_key(context, dependencies)
+                if key is not None and key in self.data:
+                    result = self.get(key)
+                    assert result is not None
+                    return dependencies, result
+            self.misses += 1
+            return None
+
+    def get_or_compute(
+        self, context: ContextType, compute: Callable[[TrackingContext], V]
+    ) -> tuple[Dependencies, V]:
+        # a kept result is reused, with its reads replayed into a tracking `context`,
+        # otherwise `compute` gets a tracking context and its result is kept unless impure
+        found = self.find(context)
+        if found is not None:
+            if isinstance(context, TrackingContext):
+                context.replay(found[0])
+            return found
+
+        tracked = TrackingContext(context)
+        result = compute(tracked)
+        dependencies = tracked.dependencies()
+        if not tracked.impure:
+            self.store(context, dependencies, result)
+        return dependencies, result
+
+    def store(self, context: ContextType, dependencies: Dependencies, result: V) -> None:
+        key = self.make_key(context, dependencies)
+        if key is None:
+            return
+        with self.lock:
+            if key not in self.data:
+                self.dependencies[dependencies] = self.dependencies.get(dependencies, 0) + 1
+            self.put(key, result)
+
+    def remove(self, context: ContextType, dependencies: Dependencies) -> None:
+        key = self.make_key(context, dependencies)
+        with self.lock:
+            if key is not None and key in self.data:
+                self.evicted(key, self.data.pop(key))
+
+    def evicted(self, key: Hashable, value: V) -> None:
+        dependencies = key[0]  # type: ignore
+        self.dependencies[dependencies] -= 1
+        if not self.dependencies[dependencies]:
+            del self.dependencies[dependencies]
+
+    def clear(self) -> None:
+        with self.lock:
+            super().clear()
+            self.dependencies.clear()
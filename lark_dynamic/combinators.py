@@ -1,60 +1,149 @@
 from __future__ import annotations
 
-from typing import Iterable
+from typing import Hashable, Iterable, Sequence
 
-from lark_dynamic.utils import render_all, separated, wrap
+from lark_dynamic.utils import freeze, render_all, separated, separated_parts, wrap
 from .constants import ContextType
-from .token import Renderable, Token
+from .token import (
+    CLOSE_BRACKET,
+    CLOSE_PAREN,
+    DUMP_NEWLINE,
+    OPEN_BRACKET,
+    OPEN_PAREN,
+    PIPE,
+    SPACE,
+    DumpText,
+    Raw,
+    Renderable,
+    Token,
+)
 
 
 class Combinator(Token):
+    __slots__ = ("children", "hash_value")
+
     def __init__(self, *children: Renderable):
         self.children = children
 
-    def repr_children(self) -> str:
-        return "\n".join(map(repr, self.children))
+    def get_children(self) -> Sequence[Renderable]:
+        return self.children
+
+    def replace_children(self, children: Sequence[Renderable]) -> Combinator:
+        return type(self)(*children)
+
+    def repr_parts(self) -> Sequence[Renderable]:
+        return separated_parts(self.children, DUMP_NEWLINE)
 
 
 class PostfixCombinator(Combinator):
+    __slots__ = ()
+
     postfix: str
 
     def render(self, context: ContextType) -> Iterable[str]:
         yield from Group(*self.children).render(context)
         yield self.postfix
 
+    def render_parts(self, context: ContextType) -> Sequence[Renderable]:
+        return [
+            OPEN_PAREN,
+            *separated_parts(self.children, SPACE),
+            Raw(")" + self.postfix),
+        ]
+
 
 class Some(PostfixCombinator):
+    __slots__ = ()
+
     postfix = "*"
 
 
 class Many(PostfixCombinator):
+    __slots__ = ()
+
     postfix = "+"
 
 
 class Maybe(PostfixCombinator):
+    __slots__ = ()
+
     postfix = "?"
 
 
 class Optional(Combinator):
+    __slots__ = ()
+
     def render(self, context: ContextType) -> Iterable[str]:
         yield from wrap(
             "[]",
             separated(render_all(self.children, context), " "),
         )
 
+    def render_parts(self, context: ContextType) -> Sequence[Renderable]:
+        return [OPEN_BRACKET, *separated_parts(self.children, SPACE), CLOSE_BRACKET]
+
 
 class Group(Combinator):
+    __slots__ = ()
+
     def render(self, context: ContextType) -> Iterable[str]:
         yield from wrap(
             "()",
             separated(render_all(self.children, context), " "),
         )
 
+    def render_parts(self, context: ContextType) -> Sequence[Renderable]:
+        return [OPEN_PAREN, *separated_parts(self.children, SPACE), CLOSE_PAREN]
+
 
 class Option(Combinator):
+    __slots__ = ()
+
     def render(self, context: ContextType) -> Iterable[str]:
         yield from separated(render_all(self.children, context), " | ")
 
+    def render_parts(self, context: ContextType) -> Sequence[Renderable]:
+        return separated_parts(self.children, PIPE)
+
+
+class Concat(Combinator):
+    # children separated by spaces, without parens (unlike tuples and `Group`)
+    __slots__ = ()
+
+    def render(self, context: ContextType) -> Iterable[str]:
+        yield from separated(render_all(self.children, context), " ")
+
+    def render_parts(self, context: ContextType) -> Sequence[Renderable]:
+        return separated_parts(self.children, SPACE)
+
+
+class Suffixed(Token):
+    # a token followed by an operator as is (e.g. `"a"*`), the token must be an atom
+    __slots__ = ("content", "suffix", "hash_value")
+
+    def __init__(self, content: Renderable, suffix: str):
+        self.content = content
+        self.suffix = suffix
+
+    def get_children(self) -> Sequence[Renderable]:
+        return (self.content,)
+
+    def get_key(self) -> tuple[Hashable, ...]:
+        return (self.suffix,)
+
+    def replace_children(self, children: Sequence[Renderable]) -> Suffixed:
+        return Suffixed(children[0], self.suffix)
+
+    def render(self, context: ContextType) -> Iterable[str]:
+        yield from Token.render_str(self.content, context)
+        yield self.suffix
+
+    def render_parts(self, context: ContextType) -> Sequence[Renderable]:
+        return [self.content, Raw(self.suffix)]
+
+    def repr_parts(self) -> Sequence[Renderable]:
+        return [self.content, DumpText(" " + self.suffix)]
+
 
 def OptionG(*children: Renderable) -> Group:
     return Group(Option(*children))
@@ -70,26 +159,28 @@ def SomeSeparated(sep: Renderable, token: Renderable) -> Group:
 
 # aliases
 class Star(Some):
-    pass
+    __slots__ = ()
 
 
 class Plus(Many):
-    pass
+    __slots__ = ()
 
 
 class QuestionMark(Maybe):
-    pass
+    __slots__ = ()
 
 
 class Brackets(Optional):
-    pass
+    __slots__ = ()
 
 
 class Parens(Group):
-    pass
+    __slots__ = ()
 
 
 class Repeat(Token):
+    __slots__ = ("content", "number_or_range", "hash_value")
+
     def __init__(
         self,
         content: Renderable,
@@ -98,11 +189,27 @@ class Repeat(Token):
         self.content = content
         self.number_or_range = number_or_range
 
+    def get_children(self) -> Sequence[Renderable]:
+        return (self.content,)
+
+    def get_key(self) -> tuple[Hashable, ...]:
+        return (freeze(self.number_or_range),)
+
+    def replace_children(self, children: Sequence[Renderable]) -> Repeat:
+        return Repeat(children[0], self.number_or_range)
+
     def render(self, context: ContextType) -> Iterable[str]:
         yield from Group(self.content).render(context)
         yield " ~ "
         yield from self.render_range(context)
 
+    def render_parts(self, context: ContextType) -> Sequence[Renderable]:
+        return [
+            OPEN_PAREN,
+            self.content,
+            Raw(") ~ " + "".join(self.render_range(context))),
+        ]
+
     def render_range(self, context: ContextType) -> Iterable[str]:
         if not self.number_or_range:
             raise ValueError("Cannot create a range of 0 occurences")
@@ -121,12 +228,14 @@ class Repeat(Token):
 
         yield str(self.number_or_range)
 
-    def repr_children(self) -> str:
+    def repr_parts(self) -> Sequence[Renderable]:
         context: ContextType = {}
-        return "".join([repr(self.content), " ~ ", *self.render_range(context)])
+        return [self.content, DumpText(" ~ " + "".join(self.render_range(context)))]
 
 
 class Range(Token):
+    __slots__ = ("start", "end")
+
     def __init__(self, start: int, end: int):
         self.start = start
         self.end = end
@@ -136,5 +245,11 @@ class Range(Token):
         yield ".."
         yield str(self.end)
 
+    def render_parts(self, context: ContextType) -> Sequence[Renderable]:
+        return [Raw(f"{self.start}..{self.end}")]
+
+    def get_key(self) -> tuple[Hashable, ...]:
+        return (self.start, self.end)
+
     def repr_children(self) -> str:
         return "\n".join(map(repr, [self.start, self.end]))
@@ -0,0 +1,294 @@
+from __future__ import annotations
+from typing import Any, Hashable, Iterable, Sequence
+import re
+
+from .constants import ContextType
+from .token import NEWLINE, DumpText, Raw, Renderable, Token
+from .utils import get_children, rebuild_tree, separated_parts
+from .variable import Variable
+from .definitions import Definition, DirectiveDef, TemplateDef
+
+
+# Including a grammar mounts its definitions into another grammar under a namespace, with names
+# mangled like Lark's `%import`: rule -> ns__rule, _rule -> _ns__rule, TERM -> NS__TERM.
+# The mangled definitions and their rendered text (a fragment) are kept by the included grammar,
+# so every grammar including it with the same namespace reuses them. Changing the included grammar
+# drops its fragments and marks only the include as changed in the grammars including it.
+# Freezing an include keeps its fragment, so the snapshot doesn't see later changes of the included grammar.
+# Names in prerendered text are not mangled. `%ignore` and other directives of the included
+# grammar are left out (as Lark does for imports), except `%import` and `%declare`
+
+IMPORT_RE = re.compile(r"\s*([\w.]+)\.(\w+)\s*(?:->\s*(\w+))?\s*$")
+IMPORT_MANY_RE = re.compile(r"\s*([\w.]+)\s*\(([^)]*)\)\s*$")
+
+
+def mangle_name(name: str, namespace: str) -> str:
+    if name.lstrip("_")[:1].isupper():
+        namespace = namespace.upper()
+    if name.startswith("_"):
+        return f"_{namespace}__{name[1:]}"
+    return f"{namespace}__{name}"
+
+
+def mangle_token(token: Renderable, namespace: str) -> Renderable:
+    return rebuild_tree(
+        token,
+        lambda node, children: mangle_node(node, children, namespace),
+        mangled_children,
+    )
+
+
+def mangled_children(node: Renderable) -> Sequence[Renderable]:
+    # values of variables are mangled when they are rendered
+    if isinstance(node, Variable):
+        return ()
+    return get_children(node)
+
+
+def mangle_node(
+    node: Renderable, children: list[Renderable], namespace: str
+) -> Renderable:
+    if isinstance(node, str):
+        return node
+    if isinstance(node, tuple):
+        return tuple(children)
+    if isinstance(node, list):
+        return children
+    if isinstance(node, Rule):
+        return Rule(mangle_name(node.string, namespace), node.grammar)
+    if isinstance(node, Terminal):
+        return Terminal(mangle_name(node.string, namespace), node.grammar)
+    if isinstance(node, Template):
+        return Template(mangle_name(node.name, namespace), tuple(children))
+    if isinstance(node, Variable):
+        # values of variables are mangled when they are rendered
+        return Mangled(node, namespace)
+    if not children:
+        return node
+    return node.replace_children(children)
+
+
+class Mangled(Variable):
+    __slots__ = ("variable", "namespace")
+
+    def __init__(self, variable: Variable, namespace: str):
+        super().__init__(self.evaluate, variable.pure)
+        self.variable = variable
+        self.namespace = namespace
+
+    def evaluate(self, context: ContextType) -> Renderable:
+        return mangle_token(self.variable.evaluate(context), self.namespace)
+
+    def get_key(self) -> tuple[Hashable, ...]:
+        return (self.variable, self.namespace)
+
+    def repr_parts(self) -> Sequence[Renderable]:
+        return [DumpText(f"{self.namespace}: "), self.variable]
+
+
+def mangle_definition(definition: Definition, namespace: str) -> Definition:
+    name = mangle_name(definition.name, namespace)
+    if isinstance(definition, TemplateDef):
+        return TemplateDef(
+            name,
+            mangle_token(definition.args, namespace),
+            tuple(mangle_token(token, namespace) for token in definition.tokens),
+            definition.modifier,
+        )
+    return type(definition)(
+        name,
+        tuple(mangle_token(token, namespace) for token in definition.tokens),
+        definition.modifier,
+        definition.priority,
+    )
+
+
+def mangle_directive(directive: DirectiveDef, namespace: str) -> DirectiveDef:
+    content = directive.content
+    if isinstance(content, Token):
+        mangled = mangle_token(content, namespace)
+        assert isinstance(mangled, Token)
+        return DirectiveDef(directive.name, mangled)
+
+    if directive.name == "declare":
+        names = [mangle_name(name, namespace) for name in content.split()]
+        return DirectiveDef("declare", " ".join(names))
+
+    match = IMPORT_RE.match(content)
+    if match:
+        path, name, alias = match.groups()
+        alias = mangle_name(alias or name, namespace)
+        return DirectiveDef("import", f"{path}.{name} -> {alias}")
+
+    match = IMPORT_MANY_RE.match(content)
+    if match:
+        path, imported = match.groups()
+        lines = [
+            f"{path}.{name} -> {mangle_name(name, namespace)}"
+            for name in map(str.strip, imported.split(","))
+            if name
+        ]
+        return DirectiveDef("import", "\n%import ".join(lines))
+
+    return directive
+
+
+class Fragment:
+    # the mangled definitions of an included grammar, and their rendered text by context.
+    # The grammar itself isn't kept, the definitions are all a fragment needs
+    __slots__ = ("flat", "definitions", "outputs")
+
+    def __init__(self, grammar: Grammar, namespace: str | None):
+        wrapper = grammar.use_wrapper()
+        self.flat = grammar.__flat__
+        self.definitions: list[Definition] = []
+
+        if namespace is None:
+            self.definitions.extend(wrapper.terminals.values())
+            self.definitions.extend(wrapper.rules.values())
+            self.definitions.extend(wrapper.templates.values())
+        else:
+            for section in (
+                wrapper.terminals.values(),
+                wrapper.rules.values(),
+                wrapper.templates.values(),
+            ):
+                self.definitions.extend(
+                    mangle_definition(definition, namespace) for definition in section
+                )
+
+        for directive in wrapper.directives:
+            if isinstance(directive, IncludeDef):
+                # nested includes are a part of the fragment, their names are mangled twice
+                if namespace is not None:
+                    nested = namespace
+                    if directive.namespace is not None:
+                        nested = f"{namespace}__{directive.namespace}"
+                    directive = IncludeDef(directive.grammar, nested)
+                self.definitions.append(directive)
+            elif directive.name in ("import", "declare"):
+                if namespace is not None:
+                    directive = mangle_directive(directive, namespace)
+                self.definitions.append(directive)
+
+        self.outputs: GenerationCache[str] = GenerationCache(
+            grammar.__cache__.maxsize if grammar.__cache__ is not None else 128
+        )
+
+    def freeze(self) -> None:
+        for definition in self.definitions:
+            definition.freeze(self.flat)
+
+    def render_text(self, context: ContextType) -> str:
+        if self.flat:
+            return "\n".join(
+                render_parts_flat([definition], context) for definition in self.definitions
+            )
+        return "\n".join("".join(definition.render(context)) for definition in self.definitions)
+
+    def render(self, context: ContextType) -> str:
+        if resolver.get() is not None or isinstance(context, DeferredContext):
+            # values of async variables aren't in the context, so they can't be cached,
+            # and deferred renders only have holes in place of variables
+            return self.render_text(context)
+
+        return self.outputs.get_or_compute(context, self.render_text)[1]
+
+
+class IncludeDef(DirectiveDef):
+    # rendered in place of directives: Lark doesn't care about the order of definitions
+    __slots__ = ("grammar", "namespace", "fragment")
+
+    def __init__(self, grammar: Grammar, namespace: str | None = None):
+        super().__init__(namespace or "", "")
+        self.grammar = grammar
+        self.namespace = namespace
+        # the fragment kept when frozen
+        self.fragment: Fragment | None = None
+
+    def get_fragment(self) -> Fragment:
+        if self.fragment is not None:
+            return self.fragment
+        fragments = self.grammar.__fragments__
+        fragment = fragments.get(self.namespace)
+        if fragment is None:
+            fragment = fragments[self.namespace] = Fragment(self.grammar, self.namespace)
+        return fragment
+
+    def get_children(self) -> Sequence[Renderable]:
+        return self.get_fragment().definitions
+
+    def get_key(self) -> tuple[Hashable, ...]:
+        return (id(self.grammar), self.namespace)
+
+    def replace_children(self, children: Sequence[Renderable]) -> IncludeDef:
+        return self
+
+    def copy(self) -> IncludeDef:
+        return IncludeDef(self.grammar, self.namespace)
+
+    def __getstate__(self) -> dict[str, Any]:
+        # the kept fragment has caches, it's made again when needed
+        state = super().__getstate__()
+        state.pop("fragment", None)
+        return state
+
+    def __setstate__(self, state: dict[str, Any]) -> None:
+        super().__setstate__(state)
+        self.fragment = None
+
+    def freeze(self, flat: bool = False) -> None:
+        # definitions of the fragment are frozen too, so the included grammar copies them before changes
+        fragment = self.get_fragment()
+        fragment.freeze()
+        self.fragment = fragment
+        super().freeze(flat)
+
+    def render_definition(self, context: ContextType) -> Iterable[str]:
+        fragment = self.get_fragment()
+        if isinstance(context, DeferredContext):
+            # holes of variables have to be kept
+            for i, definition in enumerate(fragment.definitions):
+                if i:
+                    yield "\n"
+                yield from definition.render(context)
+            return
+        yield fragment.render(context)
+
+    def definition_parts(self, context: ContextType) -> list[Renderable]:
+        fragment = self.get_fragment()
+        if isinstance(context, DeferredContext):
+            # holes of variables have to be kept
+            return separated_parts(fragment.definitions, NEWLINE)
+        return [Raw(fragment.render(context))]
+
+    def repr_parts(self) -> Sequence[Renderable]:
+        definitions = len(self.get_fragment().definitions)
+        return [DumpText(f"{self.namespace}: {definitions} definitions")]
+
+
+def includes(grammar: Grammar, other: Grammar) -> bool:
+    # whether `grammar` is `other` or includes it, directly or not
+    stack = [grammar]
+    seen: set[int] = set()
+    while stack:
+        current = stack.pop()
+        if current is other:
+            return True
+        if id(current) in seen:
+            continue
+        seen.add(id(current))
+        stack.extend(
+            directive.grammar
+            for directive in current.use_wrapper().directives
+            if isinstance(directive, IncludeDef)
+        )
+    return False
+
+
+from .grammar import Grammar
+from .atoms import Rule, Template, Terminal
+from .cache import GenerationCache
+from .variable import DeferredContext
+from .renderer import render_parts_flat
+from .aio import resolver
@@ -1,14 +1,33 @@
 from __future__ import annotations
 
-from typing import Iterable, Sequence
+from typing import Any, Hashable, Iterable, Sequence
+from hashlib import sha256
 
-from .utils import add_tab, comma_separated, render_all, spaced, wrap
+from .utils import (
+    comma_separated,
+    render_all,
+    separated_parts,
+    spaced,
+    wrap,
+)
 from .constants import ContextType
-from .token import Renderable, Token
+from .token import COMMA, DUMP_NEWLINE, SPACE, Raw, Renderable, Token
 from .combinators import Group
 
 
 class Definition(Token):
+    __slots__ = (
+        "name",
+        "tokens",
+        "modifier",
+        "priority",
+        "rendered",
+        "static",
+        "segments",
+        "frozen",
+        "digest",
+    )
+
     def __init__(
         self, name: str, tokens: Renderable, modifier: str = "", priority: int = 1
     ):
@@ -18,8 +37,125 @@ class Definition(Token):
         self.tokens = tokens
         self.modifier = modifier
         self.priority = priority
+        self.rendered: str | None = None
+        self.static: bool | None = None
+        self.segments: GenerationCache[str] | None = None
+        # frozen definitions are shared with grammar snapshots, so they are copied before changes
+        self.frozen = False
+        self.digest: bytes | None = None
+
+    # definitions are edited in place by the grammar wrapper, so they are compared by identity
+    def __eq__(self, other: object) -> bool:
+        return self is other
+
+    def __hash__(self) -> int:
+        return object.__hash__(self)
 
     def render(self, context: ContextType) -> Iterable[str]:
+        # context-independent definitions are rendered once
+        if self.rendered is None:
+            if self.static is None:
+                self.static = self.is_static()
+            if not self.static:
+                yield from self.render_definition(context)
+                return
+            self.rendered = "".join(self.render_definition(context))
+        yield self.rendered
+
+    def render_parts(self, context: ContextType) -> Sequence[Renderable]:
+        if self.rendered is None:
+            if self.static is None:
+                self.static = self.is_static()
+            if not self.static:
+                return self.definition_parts(context)
+            self.rendered = render_parts_flat(self.definition_parts(context), context)
+        return [Raw(self.rendered)]
+
+    def render_segment(self, context: ContextType, maxsize: int, flat: bool = False) -> str:
+        # dynamic definitions keep their output for each projection of the context on the keys
+        # they read, so only edited definitions and the ones reading changed keys are rendered again
+        if self.static is None:
+            self.static = self.is_static()
+
+        if self.static:
+            # rendered once anyway
+            if flat:
+                return render_parts_flat([self], context)
+            return "".join(self.render(context))
+
+        if self.segments is None:
+            self.segments = GenerationCache(maxsize)
+
+        if flat:
+            return self.segments.get_or_compute(
+                context, lambda tracked: render_parts_flat([self], tracked)
+            )[1]
+        return self.segments.get_or_compute(
+            context, lambda tracked: "".join(self.render(tracked))
+        )[1]
+
+    def get_digest(
+        self, context: ContextType, maxsize: int | None = None, flat: bool = False
+    ) -> bytes:
+        # hash of the rendered definition, kept for static definitions
+        if self.digest is not None:
+            return self.digest
+
+        if maxsize:
+            text = self.render_segment(context, maxsize, flat)
+        elif flat:
+            text = render_parts_flat([self], context)
+        else:
+            text = "".join(self.render(context))
+        digest = sha256(text.encode("utf-8")).digest()
+
+        if self.static:
+            self.digest = digest
+        return digest
+
+    def __getstate__(self) -> dict[str, Any]:
+        # render caches are not pickled
+        return {
+            slot: getattr(self, slot)
+            for cls in type(self).__mro__
+            for slot in getattr(cls, "__slots__", ())
+            if slot not in ("rendered", "static", "segments", "frozen", "digest")
+            and hasattr(self, slot)
+        }
+
+    def __setstate__(self, state: dict[str, Any]) -> None:
+        for slot, value in state.items():
+            setattr(self, slot, value)
+        self.invalidate()
+        self.frozen = False
+
+    def invalidate(self) -> None:
+        self.rendered = None
+        self.static = None
+        self.segments = None
+        self.digest = None
+
+    def freeze(self, flat: bool = False) -> None:
+        # static definitions are rendered in advance, so rendering a frozen definition never changes it
+        if self.static is None:
+            self.static = self.is_static()
+        if self.static:
+            self.get_digest({}, flat=flat)
+        self.frozen = True
+
+    def copy(self) -> Definition:
+        return self.replace_children(self.get_children())
+
+    def get_children(self) -> Sequence[Renderable]:
+        return self.tokens
+
+    def get_key(self) -> tuple[Hashable, ...]:
+        return (self.name, self.modifier, self.priority)
+
+    def replace_children(self, children: Sequence[Renderable]) -> Definition:
+        return type(self)(self.name, tuple(children), self.modifier, self.priority)
+
+    def render_definition(self, context: ContextType) -> Iterable[str]:
         yield self.modifier
         yield self.name
         if self.priority != 1:
@@ -29,24 +165,54 @@ class Definition(Token):
 
         yield from spaced(render_all(self.tokens, context))
 
-    def repr_children(self) -> str:
-        return "\n".join(map(repr, self.tokens))
+    def definition_parts(self, context: ContextType) -> list[Renderable]:
+        header = self.modifier + self.name
+        if self.priority != 1:
+            header += f".{self.priority}"
+        return [Raw(header + ": "), *separated_parts(self.tokens, SPACE)]
+
+    def repr_parts(self) -> Sequence[Renderable]:
+        return separated_parts(self.tokens, DUMP_NEWLINE)
 
 
 class RuleDef(Definition):
-    pass
+    __slots__ = ()
 
 
 class TerminalDef(Definition):
-    pass
+    __slots__ = ()
 
 
 class DirectiveDef(Definition):
+    __slots__ = ("content",)
+
     def __init__(self, name: str, content: Token | str):
         self.name = name
         self.content = content
+        self.rendered = None
+        self.static = None
+        self.segments = None
+        self.frozen = False
+        self.digest = None
 
-    def render(self, context: ContextType) -> Iterable[str]:
+    def get_children(self) -> Sequence[Renderable]:
+        if isinstance(self.content, Token):
+            return (self.content,)
+        return ()
+
+    def get_key(self) -> tuple[Hashable, ...]:
+        return (self.name, None if isinstance(self.content, Token) else self.content)
+
+    def replace_children(self, children: Sequence[Renderable]) -> DirectiveDef:
+        if not children:
+            return self
+        assert isinstance(children[0], Token)
+        return DirectiveDef(self.name, children[0])
+
+    def copy(self) -> DirectiveDef:
+        return DirectiveDef(self.name, self.content)
+
+    def render_definition(self, context: ContextType) -> Iterable[str]:
         yield "%"
         yield self.name
         yield " "
@@ -55,11 +221,17 @@ class DirectiveDef(Definition):
         else:
             yield self.content
 
-    def repr_children(self) -> str:
-        return repr(self.content)
+    def definition_parts(self, context: ContextType) -> list[Renderable]:
+        content = self.content if isinstance(self.content, Token) else Raw(self.content)
+        return [Raw(f"%{self.name} "), content]
+
+    def repr_parts(self) -> Sequence[Renderable]:
+        return [self.content]
 
 
 class TemplateDef(Definition):
+    __slots__ = ("args",)
+
     def __init__(
         self,
         name: str,
@@ -71,36 +243,60 @@ class TemplateDef(Definition):
         self.args = args
         self.tokens = tokens
         self.modifier = modifier
+        self.rendered = None
+        self.static = None
+        self.segments = None
+        self.frozen = False
+        self.digest = None
 
-    def render(self, context: ContextType) -> Iterable[str]:
-        yield self.modifier
-        yield self.name
+    def get_children(self) -> Sequence[Renderable]:
+        return (self.args, *self.tokens)
 
-        args: Sequence[Renderable]
+    def get_key(self) -> tuple[Hashable, ...]:
+        return (self.name, self.modifier)
 
-        if isinstance(self.args, Group):
-            args = self.args.children[:]
-        elif isinstance(self.args, (tuple, list)):
-            args = self.args[:]
-        else:
-            args = (self.args,)
+    def replace_children(self, children: Sequence[Renderable]) -> TemplateDef:
+        return TemplateDef(self.name, children[0], tuple(children[1:]), self.modifier)
+
+    def render_definition(self, context: ContextType) -> Iterable[str]:
+        yield self.modifier
+        yield self.name
 
         yield from wrap(
             "{}",
-            comma_separated(render_all(args, context)),
+            comma_separated(render_all(self.get_args(), context)),
         )
 
         yield ": "
 
         yield from spaced(render_all(self.tokens, context))
 
+    def definition_parts(self, context: ContextType) -> list[Renderable]:
+        return [
+            Raw(self.modifier + self.name + "{"),
+            *separated_parts(self.get_args(), COMMA),
+            Raw("}: "),
+            *separated_parts(self.tokens, SPACE),
+        ]
+
+    def get_args(self) -> Sequence[Renderable]:
+        if isinstance(self.args, Group):
+            return self.args.children[:]
+        if isinstance(self.args, (tuple, list)):
+            return self.args[:]
+        return (self.args,)
+
 
 class MetaAlias(type):
     def __getattr__(self, attr: str) -> Alias:
+        if attr.startswith("__"):
+            raise AttributeError(attr)
         return Alias(attr, ())
 
 
 class Alias(Token, metaclass=MetaAlias):
+    # no __slots__ here: slot descriptors would shadow `Alias.name` and `Alias.tokens` aliases
+
     def __init__(self, name: str, tokens: tuple[Renderable, ...]):
         self.name = name
         self.tokens = tokens
@@ -108,13 +304,29 @@ class Alias(Token, metaclass=MetaAlias):
     def __call__(self, *tokens: Renderable) -> Alias:
         return Alias(self.name, tokens)
 
+    def get_children(self) -> Sequence[Renderable]:
+        return self.tokens
+
+    def get_key(self) -> tuple[Hashable, ...]:
+        return (self.name,)
+
+    def replace_children(self, children: Sequence[Renderable]) -> Alias:
+        return Alias(self.name, tuple(children))
+
     def render(self, context: ContextType) -> Iterable[str]:
         yield from spaced(render_all(self.tokens, context))
         yield " -> "
         yield self.name
 
-    def __repr__(self) -> str:
-        return f"{self.get_name()}:{self.name}({add_tab(self.repr_children())})"
+    def render_parts(self, context: ContextType) -> Sequence[Renderable]:
+        return [*separated_parts(self.tokens, SPACE), Raw(" -> " + self.name)]
+
+    def repr_header(self) -> str:
+        return f"{self.get_name()}:{self.name}"
+
+    def repr_parts(self) -> Sequence[Renderable]:
+        return separated_parts(self.tokens, DUMP_NEWLINE)
+
 
-    def repr_children(self) -> str:
-        return "\n".join(map(repr, self.tokens))
+from .cache import GenerationCache
+from .renderer import render_parts_flat
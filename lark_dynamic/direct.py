@@ -0,0 +1,427 @@
+from __future__ import annotations
+from typing import Any, Iterable, List, NamedTuple, Sequence, Union
+import re
+
+try:
+    from lark import Lark, Token as LarkToken, Tree
+    from lark.exceptions import LarkError
+    from lark.grammar import NonTerminal, Symbol, Terminal as LarkTerminal
+except ImportError:  # pragma: no cover
+    raise ImportError(
+        "Lark is required to build parsers, install it with `python -m pip install lark-dynamic[lark]`"
+    ) from None
+
+try:
+    # private parts of Lark, these work the same in Lark 1.1 - 1.3
+    from lark.load_grammar import (
+        Grammar as LarkGrammar,
+        GrammarBuilder,
+        _parse_grammar,
+        resolve_term_references,
+    )
+
+    internals = True
+except ImportError:  # pragma: no cover
+    internals = False
+
+from .constants import ContextType
+from .token import Raw, Renderable, Token, str_encoder
+
+
+# Builds Lark grammars from definitions directly, without rendering them to text and parsing it
+# with Lark's meta-grammar: definitions are turned into the statement trees the meta-parser
+# would produce for their text, which are then loaded like `GrammarBuilder.load_grammar` does.
+# Tokens are flattened into items and `|` / `->` markers in the order they are rendered,
+# so alternatives and aliases group exactly as in the text. A definition with a token
+# that has no tree form (e.g. non-empty `Prerendered`) or a directive with text content
+# is rendered and parsed on its own, like the whole grammar would be (common `%import`,
+# `%ignore` and `%declare` directives are converted too).
+# This relies on Lark internals, if they don't work as expected, the grammar text is built instead
+
+GRAMMAR_NAME = "<string>"
+OPERATORS = ("*", "+", "?")
+RULE_MODIFIERS = ("!", "?", "!?", "?!")
+# names as matched by Lark's meta-grammar
+RULE_RE = re.compile(r"_?[a-z][_a-z0-9]*$")
+TERMINAL_RE = re.compile(r"_?[A-Z][_A-Z0-9]*$")
+
+
+class Unsupported(Exception):
+    # a token can't be converted, its definition is parsed from text
+    pass
+
+
+class AliasMark(NamedTuple):
+    name: str
+
+
+class OrMark:
+    pass
+
+
+OR = OrMark()
+
+Stream = List[Union["Tree[Any]", AliasMark, OrMark]]
+
+
+def string_literal(text: str) -> Tree[Any]:
+    return Tree("value", [Tree("literal", [LarkToken("STRING", text)])])
+
+
+def regexp_literal(text: str) -> Tree[Any]:
+    return Tree("value", [Tree("literal", [LarkToken("REGEXP", text)])])
+
+
+def repeat_expr(atom: Tree[Any], range_text: str) -> Tree[Any]:
+    numbers = [number.strip() for number in range_text.split("..")]
+    if len(numbers) > 2 or not all(number.isdigit() for number in numbers):
+        raise Unsupported(range_text)
+    return Tree(
+        "expr",
+        [
+            atom,
+            LarkToken("TILDE", "~"),
+            *[LarkToken("NUMBER", number) for number in numbers],
+        ],
+    )
+
+
+def single_item(token: Renderable, context: ContextType) -> Tree[Any]:
+    # an atom, as required before postfix operators and in template arguments
+    stream: Stream = []
+    flatten(token, context, stream)
+    item = stream[0] if len(stream) == 1 else None
+    if not isinstance(item, Tree):
+        raise Unsupported(token)
+    return item
+
+
+def flatten(token: Renderable, context: ContextType, stream: Stream) -> None:
+    if isinstance(token, Raw):
+        raise Unsupported(token)
+    if isinstance(token, str):
+        escaped = str_encoder(token)[0].decode("utf-8")
+        if '"' in escaped:
+            # not a valid literal, the text path reports it
+            raise Unsupported(token)
+        stream.append(string_literal(f'"{escaped}"'))
+    elif isinstance(token, tuple):
+        stream.append(expansions(token, context))
+    elif isinstance(token, list):
+        stream.append(Tree("maybe", [expansions(token, context)]))
+    elif isinstance(token, Group):
+        stream.append(expansions(token.children, context))
+    elif isinstance(token, Optional):
+        stream.append(Tree("maybe", [expansions(token.children, context)]))
+    elif isinstance(token, Variable):
+        flatten(token.evaluate(context), context, stream)
+    elif isinstance(token, Option):
+        for i, child in enumerate(token.children):
+            if i:
+                stream.append(OR)
+            flatten(child, context, stream)
+    elif isinstance(token, Concat):
+        for child in token.children:
+            flatten(child, context, stream)
+    elif isinstance(token, Alias):
+        for child in token.tokens:
+            flatten(child, context, stream)
+        stream.append(AliasMark(token.name))
+    elif isinstance(token, PostfixCombinator):
+        operator = LarkToken("OP", token.postfix)
+        stream.append(Tree("expr", [expansions(token.children, context), operator]))
+    elif isinstance(token, Suffixed):
+        atom = single_item(token.content, context)
+        if token.suffix in OPERATORS:
+            stream.append(Tree("expr", [atom, LarkToken("OP", token.suffix)]))
+        elif token.suffix.lstrip().startswith("~"):
+            stream.append(repeat_expr(atom, token.suffix.lstrip()[1:]))
+        else:
+            raise Unsupported(token)
+    elif isinstance(token, Repeat):
+        group = expansions((token.content,), context)
+        stream.append(repeat_expr(group, "".join(token.render_range(context))))
+    elif isinstance(token, Rule):
+        stream.append(Tree("value", [NonTerminal(token.string)]))
+    elif isinstance(token, Terminal):
+        name = token.string
+        stream.append(
+            Tree("value", [LarkTerminal(name, filter_out=name.startswith("_"))])
+        )
+    elif isinstance(token, Template):
+        args = [single_item(arg, context) for arg in token.args]
+        if not all(arg.data == "value" for arg in args):
+            raise Unsupported(token)
+        usage = Tree("template_usage", [NonTerminal(token.name), *args])
+        stream.append(Tree("value", [usage]))
+    elif isinstance(token, Literal):
+        stream.append(string_literal("".join(token.render(context))))
+    elif isinstance(token, (RegExp, KeywordSet)):
+        stream.append(regexp_literal("".join(token.render(context))))
+    elif type(token) is Prerendered and not token.string:
+        pass
+    else:
+        raise Unsupported(token)
+
+
+def expansions(tokens: Sequence[Renderable], context: ContextType) -> Tree[Any]:
+    # tokens separated by spaces, like the body of a definition or a group
+    stream: Stream = []
+    for token in tokens:
+        flatten(token, context, stream)
+
+    alternatives: list[Tree[Any]] = []
+    items: list[Tree[Any]] = []
+    alias: AliasMark | None = None
+    for item in [*stream, OR]:
+        if isinstance(item, OrMark):
+            expansion = Tree("expansion", items)
+            if alias is not None:
+                expansion = Tree("alias", [expansion, NonTerminal(alias.name)])
+            alternatives.append(expansion)
+            items = []
+            alias = None
+        elif alias is not None:
+            # items after an alias are a syntax error, the text path reports it
+            raise Unsupported(item)
+        elif isinstance(item, AliasMark):
+            alias = item
+        else:
+            items.append(item)
+    return Tree("expansions", alternatives)
+
+
+def split_header(header: str) -> tuple[str, str]:
+    name = header.lstrip("!?")
+    return header[: len(header) - len(name)], name
+
+
+def definition_statements(
+    definition: Definition, context: ContextType, flat: bool
+) -> list[Tree[Any]]:
+    try:
+        return convert_definition(definition, context)
+    except Unsupported:
+        pass
+
+    if flat:
+        text = render_parts_flat([definition], context)
+    else:
+        text = "".join(definition.render(context))
+    statements: list[Tree[Any]] = _parse_grammar(text, GRAMMAR_NAME).children
+    return statements
+
+
+def convert_definition(definition: Definition, context: ContextType) -> list[Tree[Any]]:
+    if isinstance(definition, IncludeDef):
+        statements = []
+        fragment = definition.get_fragment()
+        for child in fragment.definitions:
+            statements.extend(definition_statements(child, context, fragment.flat))
+        return statements
+
+    if isinstance(definition, DirectiveDef):
+        if isinstance(definition.content, str):
+            return convert_directive(definition.name, definition.content)
+        if definition.name == "ignore":
+            return [Tree("ignore", [expansions((definition.content,), context)])]
+        raise Unsupported(definition)
+
+    body = expansions(definition.tokens, context)
+    modifiers, name = split_header(definition.modifier + definition.name)
+    if modifiers and modifiers not in RULE_MODIFIERS:
+        raise Unsupported(definition)
+
+    if isinstance(definition, TerminalDef):
+        if modifiers:
+            raise Unsupported(definition)
+        children: list[Any] = [LarkToken("TERMINAL", name)]
+        if definition.priority != 1:
+            children.append(LarkToken("NUMBER", str(definition.priority)))
+        return [Tree("term", [*children, body])]
+
+    params: list[Any] = []
+    priority: list[Any] = []
+    if isinstance(definition, TemplateDef):
+        for arg in definition.get_args():
+            if not isinstance(arg, Rule):
+                raise Unsupported(definition)
+            params.append(LarkToken("RULE", arg.string))
+    elif definition.priority != 1:
+        priority.append(LarkToken("NUMBER", str(definition.priority)))
+
+    return [
+        Tree(
+            "rule",
+            [
+                Tree(
+                    "rule_modifiers",
+                    [LarkToken("RULE_MODIFIERS", modifiers)] if modifiers else [],
+                ),
+                LarkToken("RULE", name),
+                Tree("template_params", params),
+                Tree("priority", priority),
+                body,
+            ],
+        )
+    ]
+
+
+def name_token(name: str) -> LarkToken:
+    if RULE_RE.match(name):
+        return LarkToken("RULE", name)
+    if TERMINAL_RE.match(name):
+        return LarkToken("TERMINAL", name)
+    raise Unsupported(name)
+
+
+def symbol(name: str) -> Symbol:
+    if name_token(name).type == "RULE":
+        return NonTerminal(name)
+    return LarkTerminal(name, filter_out=name.startswith("_"))
+
+
+def import_path(path: str, name: str | None = None) -> Tree[Any]:
+    # `.path` is relative to the grammar, other paths are looked up in Lark's library
+    data = "import_lib"
+    if path.startswith("."):
+        data = "import_rel"
+        path = path[1:]
+    names = path.split(".") if name is None else [*path.split("."), name]
+    return Tree(data, [name_token(part) for part in names])
+
+
+def convert_directive(name: str, content: str) -> list[Tree[Any]]:
+    # the most common text directives, the others are parsed
+    if name == "ignore":
+        return [Tree("ignore", [expansions_of(symbol(content.strip()))])]
+
+    if name == "declare":
+        return [Tree("declare", [symbol(part) for part in content.split()])]
+
+    if name != "import":
+        raise Unsupported(content)
+
+    statements = []
+    # mangled imports are joined by `\n%import `
+    for line in content.split("\n%import "):
+        match = IMPORT_RE.match(line)
+        if match:
+            path, imported, alias = match.groups()
+            children: list[Any] = [import_path(path, imported)]
+            if alias is not None:
+                children.append(name_token(alias))
+            statements.append(Tree("import", children))
+            continue
+
+        match = IMPORT_MANY_RE.match(line)
+        if not match:
+            raise Unsupported(line)
+        path, imported = match.groups()
+        names: list[Any] = [name_token(part.strip()) for part in imported.split(",")]
+        statements.append(Tree("import", [import_path(path), Tree("name_list", names)]))
+    return statements
+
+
+def expansions_of(item: Symbol) -> Tree[Any]:
+    return Tree("expansions", [Tree("expansion", [Tree("value", [item])])])
+
+
+def grammar_statements(grammar: Grammar, context: ContextType) -> list[Tree[Any]]:
+    # in the order of the rendered grammar
+    statements: list[Tree[Any]] = []
+    for part in grammar_parts(grammar):
+        if isinstance(part, Definition):
+            statements.extend(definition_statements(part, context, grammar.__flat__))
+    return statements
+
+
+def load_statements(builder: GrammarBuilder, statements: Iterable[Tree[Any]]) -> None:
+    # the same as `GrammarBuilder.load_grammar`, after parsing
+    statements = list(statements)
+    imports: dict[tuple[str, ...], tuple[Any, dict[str, str]]] = {}
+    for statement in statements:
+        if statement.data == "import":
+            dotted_path, base_path, aliases = builder._unpack_import(statement, GRAMMAR_NAME)
+            if dotted_path in imports:
+                imports[dotted_path][1].update(aliases)
+            else:
+                imports[dotted_path] = base_path, aliases
+
+    for dotted_path, (base_path, aliases) in imports.items():
+        builder.do_import(dotted_path, base_path, aliases, None)
+
+    for statement in statements:
+        if statement.data in ("term", "rule"):
+            builder._define(*builder._unpack_definition(statement, None))
+        elif statement.data == "override":
+            (definition,) = statement.children
+            builder._define(*builder._unpack_definition(definition, None), override=True)
+        elif statement.data == "extend":
+            (definition,) = statement.children
+            builder._extend(*builder._unpack_definition(definition, None))
+        elif statement.data == "ignore":
+            builder._ignore(*statement.children)
+        elif statement.data == "declare":
+            for symbol in statement.children:
+                assert isinstance(symbol, Symbol), symbol
+                builder._define(symbol.name, isinstance(symbol, LarkTerminal), None)
+        else:
+            assert statement.data == "import", statement
+
+    resolve_term_references(
+        {name: d.tree for name, d in builder._definitions.items() if d.is_term}
+    )
+
+
+def build_lark_grammar(
+    grammar: Grammar,
+    context: ContextType,
+    import_paths: Sequence[Any] = (),
+    keep_all_tokens: bool = False,
+) -> LarkGrammar:
+    builder = GrammarBuilder(keep_all_tokens, list(import_paths))
+    load_statements(builder, grammar_statements(grammar, context))
+    return builder.build()
+
+
+def build_lark_direct(
+    grammar: Grammar, context: ContextType, options: dict[str, Any]
+) -> Lark:
+    # the options used by Lark to load grammar text are used to build the grammar here
+    if not internals:  # pragma: no cover
+        return build_lark(grammar.generate(**context), options)
+
+    try:
+        with memo_scope():
+            lark_grammar = build_lark_grammar(
+                grammar,
+                context,
+                options.get("import_paths") or (),
+                options.get("keep_all_tokens", False),
+            )
+        return Lark(lark_grammar, **options)
+    except LarkError:
+        # errors in the grammar
+        raise
+    except Exception:
+        # other versions of Lark can have other internals
+        return build_lark(grammar.generate(**context), options)
+
+
+from .grammar import Grammar
+from .atoms import KeywordSet, Literal, Prerendered, RegExp, Rule, Template, Terminal
+from .combinators import (
+    Concat,
+    Group,
+    Option,
+    Optional,
+    PostfixCombinator,
+    Repeat,
+    Suffixed,
+)
+from .definitions import Alias, Definition, DirectiveDef, TemplateDef, TerminalDef
+from .variable import Variable, memo_scope
+from .parser import build_lark
+from .renderer import grammar_parts, render_parts_flat
+from .composition import IMPORT_MANY_RE, IMPORT_RE, IncludeDef
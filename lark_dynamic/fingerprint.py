@@ -0,0 +1,60 @@
+from __future__ import annotations
+from typing import Iterable
+from hashlib import sha256
+from operator import attrgetter
+
+from .constants import ContextType
+
+
+# A grammar fingerprint is a hash of the hashes of its definitions, equal for equal sets of
+# definitions, without joining and hashing the whole grammar text. Hashes of static definitions
+# are combined once, so only definitions with variables are rendered and hashed for each context.
+# Rules, terminals and templates are hashed sorted by name, directives in their order
+# (it matters for %import and %override). Only sha256 of UTF-8 text is used,
+# so fingerprints are the same in every process and Python version
+
+VERSION = b"lark-dynamic-fingerprint-1"
+
+
+class Fingerprint:
+    __slots__ = ("static", "dynamic", "flat")
+
+    def __init__(
+        self,
+        terminals: Iterable[TerminalDef],
+        rules: Iterable[RuleDef],
+        directives: Iterable[DirectiveDef],
+        templates: Iterable[TemplateDef],
+        flat: bool = False,
+    ):
+        # definitions of flat grammars are rendered with the flat renderer, see renderer.py
+        self.flat = flat
+        static = sha256(VERSION)
+        self.dynamic: list[Definition] = []
+
+        for tag, definitions in (
+            (b"terminals", terminals),
+            (b"rules", rules),
+            (b"templates", templates),
+        ):
+            static.update(b"\0" + tag + b"\0")
+            for definition in sorted(definitions, key=attrgetter("name")):
+                if definition.static is None:
+                    definition.static = definition.is_static()
+                if definition.static:
+                    static.update(definition.get_digest({}, flat=flat))
+                else:
+                    self.dynamic.append(definition)
+
+        # every definition hashes its name with it, so dynamic ones can be hashed in any fixed order
+        self.dynamic.extend(directives)
+        self.static = static.digest()
+
+    def compute(self, context: ContextType, maxsize: int | None = None) -> str:
+        digest = sha256(self.static)
+        for definition in self.dynamic:
+            digest.update(definition.get_digest(context, maxsize, self.flat))
+        return digest.hexdigest()
+
+
+from .definitions import Definition, DirectiveDef, RuleDef, TemplateDef, TerminalDef
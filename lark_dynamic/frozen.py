@@ -0,0 +1,125 @@
+from __future__ import annotations
+from types import MappingProxyType
+from typing import Any, Iterable, Mapping
+
+from .constants import ContextType
+
+
+# An immutable snapshot of a grammar. Definitions are not copied, but frozen: the grammar (and grammars
+# made with `.thaw()`) copy a frozen definition before changing it, so the snapshot never changes.
+# Static definitions are rendered when freezing, so rendering a snapshot doesn't change its definitions.
+# It still writes to caches of variables with a `cache_size` and of included grammars,
+# these are locked, so a snapshot can be rendered from any number of threads at once
+
+
+class FrozenGrammar:
+    __slots__ = (
+        "terminals",
+        "rules",
+        "directives",
+        "templates",
+        "definitions",
+        "flat",
+        "fingerprint_state",
+    )
+
+    terminals: tuple[TerminalDef, ...]
+    rules: tuple[RuleDef, ...]
+    directives: tuple[DirectiveDef, ...]
+    templates: tuple[TemplateDef, ...]
+    definitions: Mapping[str, RuleDef | TerminalDef | TemplateDef]
+    flat: bool
+    fingerprint_state: Fingerprint
+
+    def __init__(self, grammar: Grammar):
+        wrapper = grammar.use_wrapper()
+
+        init = super().__setattr__
+        init("terminals", tuple(wrapper.terminals.values()))
+        init("rules", tuple(wrapper.rules.values()))
+        init("directives", tuple(wrapper.directives))
+        init("templates", tuple(wrapper.templates.values()))
+        init(
+            "definitions",
+            MappingProxyType(
+                {**wrapper.templates, **wrapper.terminals, **wrapper.rules}
+            ),
+        )
+        init("flat", grammar.__flat__)
+
+        for section in self.sections():
+            for definition in section:
+                definition.freeze(self.flat)
+        init(
+            "fingerprint_state",
+            Fingerprint(
+                self.terminals, self.rules, self.directives, self.templates, self.flat
+            ),
+        )
+
+    def __setattr__(self, attr: str, value: Any) -> None:
+        raise AttributeError("FrozenGrammar is immutable, use .thaw() to make a mutable copy")
+
+    def __delattr__(self, attr: str) -> None:
+        raise AttributeError("FrozenGrammar is immutable, use .thaw() to make a mutable copy")
+
+    def sections(self) -> tuple[tuple[Definition, ...], ...]:
+        return (self.terminals, self.rules, self.directives, self.templates)
+
+    def get_def(self, key: str) -> RuleDef | TerminalDef | TemplateDef | None:
+        return self.definitions.get(key)
+
+    def build_grammar(self, context: ContextType) -> Iterable[str]:
+        for section in self.sections():
+            for definition in section:
+                yield from definition.render(context)
+                yield "\n"
+            yield "\n"
+
+    def generate(self, **context: Any) -> str:
+        with memo_scope():
+            return self.render(context)
+
+    def render(self, context: ContextType) -> str:
+        if self.flat:
+            parts: list[Renderable] = []
+            for section in self.sections():
+                for definition in section:
+                    parts.append(definition)
+                    parts.append(NEWLINE)
+                parts.append(NEWLINE)
+            return render_parts_flat(parts, context).strip()
+        return "".join(self.build_grammar(context)).strip()
+
+    def fingerprint(self, **context: Any) -> str:
+        # same as the fingerprint of the grammar
+        with memo_scope():
+            return self.fingerprint_state.compute(context)
+
+    def thaw(
+        self, cache_size: int | None = None, parser_cache: ParserCache | None = None
+    ) -> Grammar:
+        # the new grammar shares definitions with the snapshot until they are changed
+        grammar = Grammar(cache_size, parser_cache, self.flat)
+        wrapper = grammar.use_wrapper()
+
+        wrapper.terminals.update((d.name, d) for d in self.terminals)
+        wrapper.rules.update((d.name, d) for d in self.rules)
+        wrapper.directives.extend(self.directives)
+        wrapper.templates.update((d.name, d) for d in self.templates)
+        wrapper.track_includes()
+        wrapper.invalidate()
+        return grammar
+
+    def __repr__(self) -> str:
+        return "".join(iter_trees([*self.rules, *self.terminals, *self.directives]))
+
+
+from .grammar import Grammar
+from .token import NEWLINE, Renderable
+from .definitions import Definition, DirectiveDef, RuleDef, TemplateDef, TerminalDef
+from .parser import ParserCache
+from .renderer import render_parts_flat
+from .fingerprint import Fingerprint
+from .variable import memo_scope
+from .treedump import iter_trees
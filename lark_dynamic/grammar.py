@@ -1,34 +1,179 @@
 from __future__ import annotations
-from typing import Any, Iterable
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Container,
+    Iterable,
+    Iterator,
+    Mapping,
+    TypeVar,
+    cast,
+)
+from weakref import WeakSet
+
+if TYPE_CHECKING:
+    from lark import Lark
+
+
+D = TypeVar("D", bound="Definition")
 
 
 class Grammar:
-    def __init__(self) -> None:
+    def __init__(
+        self,
+        cache_size: int | None = None,
+        parser_cache: ParserCache | None = None,
+        flat: bool = False,
+    ) -> None:
         self.__rules__: dict[str, RuleDef] = {}
         self.__terminals__: dict[str, TerminalDef] = {}
         self.__directives__: list[DirectiveDef] = []
         self.__templates__: dict[str, TemplateDef] = {}
         self.__wrapper__: GrammarWrapper = GrammarWrapper(self)
+        self.__references__: dict[str, Rule | Terminal] = {}
+        self.__cache__: GenerationCache[str] | None = (
+            GenerationCache(cache_size) if cache_size else None
+        )
+        self.__segments__: SegmentCache | None = (
+            SegmentCache(cache_size) if cache_size else None
+        )
+        self.__parsers__: ParserCache = (
+            default_parser_cache if parser_cache is None else parser_cache
+        )
+        self.__flat__ = flat
+        # hash of static definitions, see fingerprint.py
+        self.__fingerprint__: Fingerprint | None = None
+        # mangled definitions of this grammar by namespace, and the grammars including it
+        self.__fragments__: dict[str | None, Fragment] = {}
+        self.__includers__: WeakSet[Grammar] = WeakSet()
 
     def generate(self, **context: Any) -> str:
-        return "".join(self.build_grammar(context)).strip()
+        cache = self.__cache__
+
+        with memo_scope():
+            if cache is None:
+                return render_grammar(self, context)
+
+            return cache.get_or_compute(
+                context, lambda tracked: render_grammar(self, tracked)
+            )[1]
+
+    async def agenerate(self, **context: Any) -> str:
+        # for grammars with `AsyncVariable`s, their callbacks are awaited concurrently
+        return await agenerate(self, context)
+
+    def generate_many(self, contexts: Iterable[ContextType]) -> list[str]:
+        # static parts are rendered once, only variables are rendered for each context
+        pieces: Iterable[str]
+        if self.__flat__:
+            pieces = render_pieces_flat(grammar_parts(self), DeferredContext())
+        else:
+            pieces = self.build_grammar(DeferredContext())
+        parts = split_holes(pieces)
+        texts = []
+        for context in contexts:
+            with memo_scope():
+                texts.append("".join(fill_holes(parts, context, self.__flat__)).strip())
+        return texts
+
+    def generate_variants(
+        self, domains: Mapping[str, Iterable[Any]], processes: int = 1, **context: Any
+    ) -> dict[str, list[dict[str, Any]]]:
+        return generate_variants(self, domains, processes, context)
+
+    def generate_pruned(
+        self, start: str | Iterable[str] = "start", **context: Any
+    ) -> PrunedGrammar:
+        with memo_scope():
+            return generate_pruned(self, start, context)
+
+    def generate_profiled(self, **context: Any) -> RenderProfile:
+        with memo_scope():
+            return generate_profiled(self, context)
+
+    def include(self, other: Grammar, namespace: str | None = None) -> IncludeDef:
+        # definitions of `other` are rendered into this grammar, names prefixed with `namespace__`
+        if namespace is not None and not is_rule(namespace):
+            raise ValueError(
+                f"Invalid namespace: '{namespace}'. Namespaces must only contain chars [a-z0-9_] and cannot start with a digit"
+            )
+        if includes(other, self):
+            raise ValueError("Grammars can't include themselves")
+
+        includedef = IncludeDef(other, namespace)
+        self.__directives__.append(includedef)
+        self.__wrapper__.track_includes()
+        self.__wrapper__.invalidate()
+        return includedef
+
+    def freeze(self) -> FrozenGrammar:
+        return FrozenGrammar(self)
+
+    def generate_optimized(self, **context: Any) -> OptimizedGrammar:
+        with memo_scope():
+            return generate_optimized(self, context)
+
+    def fingerprint(self, **context: Any) -> str:
+        if self.__fingerprint__ is None:
+            self.__fingerprint__ = Fingerprint(
+                self.__terminals__.values(),
+                self.__rules__.values(),
+                self.__directives__,
+                self.__templates__.values(),
+                self.__flat__,
+            )
+        segments = self.__segments__
+        with memo_scope():
+            return self.__fingerprint__.compute(
+                context, segments.maxsize if segments else None
+            )
 
-    def build_grammar(self, context: ContextType) -> Iterable[str]:
-        for terminal in self.__terminals__.values():
-            yield from terminal.render(context)
-            yield "\n"
+    def build_parser(
+        self, lark_options: dict[str, Any] | None = None, **context: Any
+    ) -> Lark:
+        # the grammar is rendered only when the parser isn't cached
+        return self.__parsers__.get_parser_by_fingerprint(
+            self.fingerprint(**context),
+            lark_options or {},
+            lambda: self.generate(**context),
+        )
+
+    def build_parser_direct(
+        self, lark_options: dict[str, Any] | None = None, **context: Any
+    ) -> Lark:
+        # the same parser as of `build_parser`, built without rendering and parsing the grammar text
+        from .direct import build_lark_direct
+
+        options = lark_options or {}
+        return self.__parsers__.get_parser_by_fingerprint(
+            self.fingerprint(**context),
+            options,
+            lambda: self.generate(**context),
+            lambda: build_lark_direct(self, context, options),
+        )
+
+    def build_grammar(
+        self, context: ContextType, names: Container[str] | None = None
+    ) -> Iterable[str]:
+        # `names` limits the output to the given definitions (directives are always included)
+        for name, terminal in self.__terminals__.items():
+            if names is None or name in names:
+                yield from terminal.render(context)
+                yield "\n"
         yield "\n"
-        for rule in self.__rules__.values():
-            yield from rule.render(context)
-            yield "\n"
+        for name, rule in self.__rules__.items():
+            if names is None or name in names:
+                yield from rule.render(context)
+                yield "\n"
         yield "\n"
         for directive in self.__directives__:
             yield from directive.render(context)
             yield "\n"
         yield "\n"
-        for template in self.__templates__.values():
-            yield from template.render(context)
-            yield "\n"
+        for name, template in self.__templates__.items():
+            if names is None or name in names:
+                yield from template.render(context)
+                yield "\n"
         yield "\n"
 
     def make_rule(
@@ -52,6 +197,7 @@ class Grammar:
 
         ruledef = RuleDef(name, tokens, modifier, priority)
         self.__rules__[name] = ruledef
+        self.__wrapper__.invalidate()
         return ruledef
 
     def make_terminal(
@@ -74,11 +220,13 @@ class Grammar:
 
         termdef = TerminalDef(name, tokens, modifier, priority)
         self.__terminals__[name] = termdef
+        self.__wrapper__.invalidate()
         return termdef
 
     def make_directive(self, name: str, content: Token | str) -> DirectiveDef:
         directivedef = DirectiveDef(name, content)
         self.__directives__.append(directivedef)
+        self.__wrapper__.invalidate()
         return directivedef
 
     def make_template(
@@ -97,6 +245,7 @@ class Grammar:
 
         templatedef = TemplateDef(name, args, tokens, modifier)
         self.__templates__[name] = templatedef
+        self.__wrapper__.invalidate()
         return templatedef
 
     def __setattr__(self, attr: str, value: Renderable | Modifier) -> None:
@@ -110,20 +259,42 @@ class Grammar:
         super().__setattr__(attr, value)
 
     def __getattr__(self, attr: str) -> Rule | Terminal:
-        if is_rule(attr):
-            return Rule(attr, self)
-        if is_term(attr):
-            return Terminal(attr, self)
-        raise AttributeError(attr)
+        if attr.startswith("__"):
+            raise AttributeError(attr)
+
+        # references are immutable, so one object per name is enough
+        reference = self.__references__.get(attr)
+        if reference is None:
+            if is_rule(attr):
+                reference = Rule(attr, self)
+            elif is_term(attr):
+                reference = Terminal(attr, self)
+            else:
+                raise AttributeError(attr)
+            self.__references__[attr] = reference
+        return reference
 
     def __repr__(self) -> str:
-        return "\n\n".join(
-            [
-                *[repr(rule) for rule in self.__rules__.values()],
-                *[repr(term) for term in self.__terminals__.values()],
-                *[repr(directive) for directive in self.__directives__],
-            ]
-        )
+        return "".join(iter_trees(self.__wrapper__.repr_definitions()))
+
+    def __getstate__(self) -> dict[str, Any]:
+        # caches are not pickled, an unpickled grammar uses the default parser cache
+        return {
+            "rules": self.__rules__,
+            "terminals": self.__terminals__,
+            "directives": self.__directives__,
+            "templates": self.__templates__,
+            "cache_size": self.__cache__.maxsize if self.__cache__ else None,
+            "flat": self.__flat__,
+        }
+
+    def __setstate__(self, state: dict[str, Any]) -> None:
+        Grammar.__init__(self, state["cache_size"], None, state["flat"])
+        self.__rules__.update(state["rules"])
+        self.__terminals__.update(state["terminals"])
+        self.__directives__.extend(state["directives"])
+        self.__templates__.update(state["templates"])
+        self.__wrapper__.track_includes()
 
     def use_wrapper(self) -> GrammarWrapper:
         return self.__wrapper__
@@ -136,6 +307,87 @@ class GrammarWrapper:
     def get_def(self, key: str) -> RuleDef | TerminalDef | TemplateDef | None:
         return self.rules.get(key) or self.terminals.get(key) or self.templates.get(key)
 
+    @property
+    def cache(self) -> GenerationCache[str] | None:
+        return self.grammar.__cache__
+
+    @property
+    def parser_cache(self) -> ParserCache:
+        return self.grammar.__parsers__
+
+    def invalidate(self, definition: Definition | None = None) -> None:
+        # called on every change made through the grammar or the wrapper
+        if definition is not None:
+            definition.invalidate()
+        self.grammar.__fingerprint__ = None
+        self.grammar.__fragments__.clear()
+        if self.grammar.__cache__ is not None:
+            self.grammar.__cache__.clear()
+        if self.grammar.__segments__ is not None:
+            if definition is None:
+                self.grammar.__segments__.clear()
+            else:
+                self.grammar.__segments__.mark_dirty(definition)
+
+        # only includes of this grammar are changed in the grammars including it
+        for includer in list(self.grammar.__includers__):
+            includer.use_wrapper().invalidate_includes(self.grammar)
+
+    def track_includes(self) -> None:
+        for directive in self.directives:
+            if isinstance(directive, IncludeDef):
+                directive.grammar.__includers__.add(self.grammar)
+
+    def invalidate_includes(self, grammar: Grammar) -> None:
+        for directive in self.directives:
+            if isinstance(directive, IncludeDef) and directive.grammar is grammar:
+                # an include shared with a snapshot keeps its fragment, the grammar gets a new one
+                self.invalidate(self.own(directive))
+
+    def own(self, definition: D) -> D:
+        # definitions shared with a frozen snapshot are copied before being changed
+        if not definition.frozen:
+            return definition
+
+        copy = cast(D, definition.copy())
+        if isinstance(copy, DirectiveDef):
+            for i, directive in enumerate(self.directives):
+                if directive is definition:
+                    self.directives[i] = copy
+        else:
+            for section in (self.terminals, self.rules, self.templates):
+                if section.get(copy.name) is definition:
+                    section[copy.name] = copy  # type: ignore
+
+        if self.grammar.__segments__ is not None:
+            self.grammar.__segments__.replace_definition(definition, copy)
+        return copy
+
+    def iter_chunks(self, **context: Any) -> Iterator[str]:
+        # the same output as of `.generate()`, rendered in chunks
+        return iter_chunks(iter_grammar(self.grammar, context))
+
+    def write(self, fp: Writable, **context: Any) -> None:
+        write_chunks(fp, self.iter_chunks(**context))
+
+    def repr_definitions(self) -> Iterator[Definition]:
+        # in the order of `repr()` (templates are not shown)
+        yield from self.rules.values()
+        yield from self.terminals.values()
+        yield from self.directives
+
+    def dump(
+        self, fp: Writable, max_depth: int | None = None, max_width: int | None = None
+    ) -> None:
+        # `repr()` of the grammar, written in chunks, deeper and wider parts of the trees can be cut
+        write_chunks(fp, iter_trees(self.repr_definitions(), max_depth, max_width))
+
+    def get_dependencies(self, context: ContextType) -> Dependencies:
+        tracked = TrackingContext(context)
+        with memo_scope():
+            render_grammar(self.grammar, tracked)
+        return tracked.dependencies()
+
     @property
     def rules(self) -> dict[str, RuleDef]:
         return self.grammar.__rules__
@@ -158,7 +410,9 @@ class GrammarWrapper:
         if not definition:
             raise AttributeError(f"No definition by the name '{key}'")
 
+        definition = self.own(definition)
         definition.tokens = (Option(*definition.tokens, *alternatives),)
+        self.invalidate(definition)
 
     def replace(self, key: str, tokens: Renderable) -> None:
         definition = self.get_def(key)
@@ -168,7 +422,9 @@ class GrammarWrapper:
         if not isinstance(tokens, tuple):
             tokens = (tokens,)
 
+        definition = self.own(definition)
         definition.tokens = tokens
+        self.invalidate(definition)
 
     def edit(
         self, key: str, modifier: Modifier | None = None, priority: int | None = None
@@ -178,17 +434,42 @@ class GrammarWrapper:
         if not definition:
             raise AttributeError(f"No definition by the name '{key}'")
 
+        definition = self.own(definition)
+
         if modifier is not None:
             definition.modifier = modifier.type
 
         if priority is not None:
             definition.priority = priority
 
+        self.invalidate(definition)
+
 
 from .constants import ContextType
 from .utils import is_rule, is_term
 from .modifier import Modifier
 from .token import Renderable, Token
-from .definitions import DirectiveDef, RuleDef, TemplateDef, TerminalDef
+from .definitions import Definition, DirectiveDef, RuleDef, TemplateDef, TerminalDef
 from .combinators import Option
 from .atoms import Rule, Terminal
+from .cache import GenerationCache
+from .parser import ParserCache, parser_cache as default_parser_cache
+from .tracking import Dependencies, TrackingContext
+from .variants import generate_variants
+from .variable import DeferredContext, fill_holes, memo_scope, split_holes
+from .renderer import (
+    SegmentCache,
+    grammar_parts,
+    iter_grammar,
+    render_grammar,
+    render_pieces_flat,
+)
+from .stream import Writable, iter_chunks, write_chunks
+from .treedump import iter_trees
+from .frozen import FrozenGrammar
+from .pruning import PrunedGrammar, generate_pruned
+from .optimizer import OptimizedGrammar, generate_optimized
+from .fingerprint import Fingerprint
+from .aio import agenerate
+from .profiling import RenderProfile, generate_profiled
+from .composition import Fragment, IncludeDef, includes
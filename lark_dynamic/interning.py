@@ -0,0 +1,78 @@
+from __future__ import annotations
+from typing import Hashable
+
+from .token import Renderable, Token
+from .utils import get_children, rebuild_tree
+
+
+# Hash-consing: equal subtrees are replaced with a single shared instance.
+# Interned tokens are shared between definitions (and grammars), so they must not be mutated
+
+
+class TokenInterner:
+    def __init__(self) -> None:
+        self.table: dict[Hashable, Renderable] = {}
+
+    def __len__(self) -> int:
+        return len(self.table)
+
+    def __call__(self, token: Renderable) -> Renderable:
+        return self.intern(token)
+
+    def intern(self, token: Renderable) -> Renderable:
+        # children are interned before their parents
+        return rebuild_tree(token, self.lookup)
+
+    def lookup(self, node: Renderable, children: list[Renderable]) -> Renderable:
+        # children are already canonical, so they can be compared by identity
+        child_keys = tuple(
+            child if isinstance(child, str) else id(child) for child in children
+        )
+        unchanged = all(a is b for a, b in zip(children, get_children(node)))
+
+        rebuilt: Renderable
+        key: Hashable
+        if isinstance(node, str):
+            rebuilt, key = node, node
+        elif isinstance(node, tuple):
+            rebuilt, key = node if unchanged else tuple(children), (tuple, child_keys)
+        elif isinstance(node, list):
+            rebuilt, key = node if unchanged else children, (list, child_keys)
+        else:
+            rebuilt = node if unchanged else node.replace_children(children)
+            if isinstance(node, Definition):
+                # definitions are edited in place by the grammar wrapper, so they are never shared
+                return rebuilt
+            key = (type(node), node.get_key(), child_keys)
+
+        try:
+            return self.table.setdefault(key, rebuilt)
+        except TypeError:
+            # unhashable key (e.g. a variable with an unhashable callback)
+            return rebuilt
+
+    def intern_grammar(self, grammar: Grammar) -> None:
+        wrapper = grammar.use_wrapper()
+
+        for definition in (
+            *wrapper.terminals.values(),
+            *wrapper.rules.values(),
+            *wrapper.templates.values(),
+        ):
+            definition = wrapper.own(definition)
+            definition.tokens = tuple(map(self.intern, definition.tokens))
+            if isinstance(definition, TemplateDef):
+                definition.args = self.intern(definition.args)
+            wrapper.invalidate(definition)
+
+        for directive in wrapper.directives[:]:
+            if isinstance(directive.content, Token):
+                directive = wrapper.own(directive)
+                content = self.intern(directive.content)
+                assert isinstance(content, Token)
+                directive.content = content
+                wrapper.invalidate(directive)
+
+
+from .definitions import Definition, TemplateDef
+from .grammar import Grammar
@@ -0,0 +1,337 @@
+from __future__ import annotations
+from typing import Any, Callable, List, NamedTuple, Sequence, Tuple, Union
+from functools import partial
+
+from .constants import ContextType
+
+
+# Simplifies definitions for a given context before rendering.
+# Tokens are first converted to the structure Lark sees in the rendered text:
+# a list of alternatives (`Segment`s), each a sequence of items. This matters because `Option`
+# renders without parens, so `a Option(b, c) d` is `(a b) | (c d)` for Lark, not `a (b | c) d`.
+# Every transformation keeps the language and the parse trees the same:
+#     (a)      -> a             (groups without alternatives are spliced into the sequence)
+#     (a)*     -> a*            (operators are applied to atoms directly)
+#     ((a)?)*  -> a*            (nested operators are merged)
+#     a | (b | c) -> a | b | c  (nested alternatives are flattened)
+#     (a | )   -> a?            (empty alternatives, e.g. from an `Empty` variable, become `?`)
+
+
+class OptimizedGrammar(NamedTuple):
+    text: str
+    size_before: int
+    size_after: int
+
+
+class Unoptimizable(Exception):
+    # the definition can't be represented safely (e.g. an alias in the middle of a sequence)
+    pass
+
+
+class Segment:
+    __slots__ = ("items", "alias")
+
+    def __init__(self, items: list[Item] | None = None, alias: str | None = None):
+        self.items: list[Item] = items or []
+        self.alias = alias
+
+    def append(self, item: Item) -> None:
+        if self.alias is not None:
+            raise Unoptimizable
+        self.items.append(item)
+
+    def extend(self, items: list[Item]) -> None:
+        for item in items:
+            self.append(item)
+
+
+class Paren:
+    __slots__ = ("alternatives",)
+
+    def __init__(self, alternatives: list[Segment]):
+        self.alternatives = alternatives
+
+
+class Bracket(Paren):
+    __slots__ = ()
+
+
+class Postfix:
+    __slots__ = ("item", "op")
+
+    def __init__(self, item: Item, op: str):
+        self.item = item
+        self.op = op
+
+
+class Opaque:
+    # a token with unknown content (e.g. a non-empty `Prerendered`), groups around it are kept
+    __slots__ = ("token",)
+
+    def __init__(self, token: Token):
+        self.token = token
+
+
+Item = Union["Token", str, Paren, Postfix, Opaque]
+Alternatives = List[Segment]
+
+OPERATORS = ("*", "+", "?")
+
+
+def is_atom(item: Item) -> bool:
+    # items that can have an operator applied without parens
+    return isinstance(item, (str, Literal, RegExp, Rule, Terminal, Template)) or (
+        type(item) is Paren
+    )
+
+
+def merge_operators(outer: str, inner: str) -> str:
+    # (a?)? -> a?, (a+)+ -> a+, any other combination is a*
+    return outer if outer == inner else "*"
+
+
+# tasks of `make_alternatives`
+TOKEN = "token"
+SEPARATOR = "separator"
+ALIAS = "alias"
+NESTED = "nested"
+
+Task = Tuple[str, Any, Alternatives]
+
+
+def add_token(
+    stack: list[Task], segments: Alternatives, token: Renderable, context: ContextType
+) -> None:
+    # children are pushed as tasks, groups get their own segments, added to `segments` when done
+    children: Sequence[Renderable]
+    finish: Callable[[Alternatives], list[Item]]
+
+    while isinstance(token, Variable):
+        token = token.evaluate(context)
+
+    if isinstance(token, Option):
+        for i in reversed(range(len(token.children))):
+            stack.append((TOKEN, token.children[i], segments))
+            if i:
+                stack.append((SEPARATOR, None, segments))
+        return
+    if isinstance(token, Alias):
+        stack.append((ALIAS, token.name, segments))
+        stack.extend((TOKEN, child, segments) for child in reversed(token.tokens))
+        return
+
+    if isinstance(token, (tuple, Group)):
+        children = token if isinstance(token, tuple) else token.children
+        finish = simplify_group
+    elif isinstance(token, (list, Optional)):
+        children = token if isinstance(token, list) else token.children
+        finish = make_bracket
+    elif isinstance(token, PostfixCombinator):
+        children = token.children
+        finish = partial(simplify_postfix, op=token.postfix)
+    elif isinstance(token, Repeat):
+        children = (token.content,)
+        finish = partial(simplify_postfix, op=" ~ " + "".join(token.render_range(context)))
+    elif type(token) is Prerendered and not token.string:
+        # `Empty`
+        return
+    elif isinstance(token, (str, Literal, RegExp, Rule, Terminal, Template)):
+        segments[-1].append(token)
+        return
+    else:
+        segments[-1].append(Opaque(token))
+        return
+
+    nested = [Segment()]
+    stack.append((NESTED, (finish, segments), nested))
+    stack.extend((TOKEN, child, nested) for child in reversed(children))
+
+
+def make_alternatives(
+    tokens: Sequence[Renderable], context: ContextType
+) -> Alternatives:
+    # an explicit stack of tasks instead of recursion, so deeply nested tokens are optimized too
+    segments: Alternatives = [Segment()]
+    stack: list[Task] = [(TOKEN, token, segments) for token in reversed(tokens)]
+
+    while stack:
+        task, value, current = stack.pop()
+        if task is TOKEN:
+            add_token(stack, current, value, context)
+        elif task is SEPARATOR:
+            current.append(Segment())
+        elif task is ALIAS:
+            if current[-1].alias is not None:
+                raise Unoptimizable
+            current[-1].alias = value
+        else:
+            finish, parent = value
+            parent[-1].extend(finish(flatten_alternatives(current)))
+
+    return flatten_alternatives(segments)
+
+
+def flatten_alternatives(segments: Alternatives) -> Alternatives:
+    result: Alternatives = []
+    for segment in segments:
+        if (
+            segment.alias is None
+            and len(segment.items) == 1
+            and type(segment.items[0]) is Paren
+        ):
+            # a | (b | c) -> a | b | c
+            result.extend(segment.items[0].alternatives)
+        else:
+            result.append(segment)
+    return result
+
+
+def make_bracket(alternatives: Alternatives) -> list[Item]:
+    return [Bracket(alternatives)]
+
+
+def is_empty(segment: Segment) -> bool:
+    return not segment.items and segment.alias is None
+
+
+def simplify_group(alternatives: Alternatives) -> list[Item]:
+    for segment in alternatives:
+        if segment.alias is not None:
+            # aliases are only allowed at the top level
+            raise Unoptimizable
+
+    if any(map(is_empty, alternatives)):
+        return simplify_postfix(alternatives, "?")
+
+    if len(alternatives) == 1 and not any(
+        isinstance(item, Opaque) for item in alternatives[0].items
+    ):
+        return alternatives[0].items
+    return [Paren(alternatives)]
+
+
+def simplify_postfix(alternatives: Alternatives, op: str) -> list[Item]:
+    for segment in alternatives:
+        if segment.alias is not None:
+            raise Unoptimizable
+
+    if op in OPERATORS:
+        nonempty = [segment for segment in alternatives if not is_empty(segment)]
+        if not nonempty:
+            return []
+        if len(nonempty) < len(alternatives):
+            op = merge_operators(op, "?")
+        alternatives = nonempty
+
+    if len(alternatives) == 1 and len(alternatives[0].items) == 1:
+        item = alternatives[0].items[0]
+        if is_atom(item):
+            return [Postfix(item, op)]
+        if isinstance(item, Postfix) and item.op in OPERATORS and op in OPERATORS:
+            return [Postfix(item.item, merge_operators(op, item.op))]
+
+    return [Postfix(Paren(alternatives), op)]
+
+
+def alternatives_token(alternatives: Alternatives) -> Renderable:
+    # post-order traversal with an explicit stack, tokens made of children are kept in `tokens`
+    tokens: list[Renderable] = []
+    # nodes with the number of their children once these are pushed, -1 before
+    stack: list[tuple[Any, int]] = [(alternatives, -1)]
+
+    while stack:
+        node, count = stack.pop()
+        if count < 0:
+            children: Sequence[Any]
+            if isinstance(node, list):
+                children = node
+            elif isinstance(node, Segment):
+                children = node.items
+            elif isinstance(node, Paren):
+                children = (node.alternatives,)
+            elif isinstance(node, Postfix):
+                children = (node.item,)
+            else:
+                tokens.append(node.token if isinstance(node, Opaque) else node)
+                continue
+            stack.append((node, len(children)))
+            stack.extend((child, -1) for child in reversed(children))
+            continue
+
+        made = tuple(tokens[len(tokens) - count :])
+        del tokens[len(tokens) - count :]
+        tokens.append(make_token(node, made))
+
+    return tokens[0]
+
+
+def make_token(
+    node: Alternatives | Segment | Paren | Postfix, children: tuple[Renderable, ...]
+) -> Renderable:
+    if isinstance(node, list):
+        return children[0] if len(children) == 1 else Option(*children)
+    if isinstance(node, Segment):
+        if node.alias is not None:
+            return Alias(node.alias, children)
+        if len(children) == 1:
+            return children[0]
+        return Concat(*children)
+    if isinstance(node, Bracket):
+        return Optional(children[0])
+    if isinstance(node, Paren):
+        return Group(children[0])
+    return Suffixed(children[0], node.op)
+
+
+def optimize_tokens(
+    tokens: Sequence[Renderable], context: ContextType
+) -> tuple[Renderable, ...]:
+    alternatives = make_alternatives(tokens, context)
+
+    if any(map(is_empty, alternatives)) and all(
+        segment.alias is None for segment in alternatives
+    ):
+        # rule: a | b |  ->  rule: (a | b)?
+        alternatives = [Segment(simplify_postfix(alternatives, "?"))]
+
+    return (alternatives_token(alternatives),)
+
+
+def optimize_definition(definition: Definition, context: ContextType) -> Definition:
+    if isinstance(definition, DirectiveDef):
+        return definition
+
+    try:
+        tokens = optimize_tokens(definition.tokens, context)
+    except Unoptimizable:
+        return definition
+
+    if isinstance(definition, TemplateDef):
+        return definition.replace_children((definition.args, *tokens))
+    return definition.replace_children(tokens)
+
+
+def generate_optimized(grammar: Grammar, context: ContextType) -> OptimizedGrammar:
+    parts = [
+        optimize_definition(part, context) if isinstance(part, Definition) else part
+        for part in grammar_parts(grammar)
+    ]
+    text = render_parts_flat(parts, context).strip()
+    return OptimizedGrammar(text, len(render_grammar(grammar, context)), len(text))
+
+
+from .grammar import Grammar
+from .token import Renderable, Token
+from .atoms import Literal, Prerendered, RegExp, Rule, Template, Terminal
+from .combinators import (
+    Concat,
+    Group,
+    Option,
+    Optional,
+    PostfixCombinator,
+    Repeat,
+    Suffixed,
+)
+from .definitions import Alias, Definition, DirectiveDef, TemplateDef
+from .variable import Variable
+from .renderer import grammar_parts, render_grammar, render_parts_flat
@@ -0,0 +1,124 @@
+from __future__ import annotations
+from typing import TYPE_CHECKING, Any, Callable, NamedTuple
+from hashlib import sha256
+from time import perf_counter
+
+from .cache import LRUCache
+from .store import GrammarStore
+
+if TYPE_CHECKING:
+    from lark import Lark
+
+
+class ParserCacheInfo(NamedTuple):
+    hits: int
+    misses: int
+    evictions: int
+    loads: int
+    build_time: float
+    maxsize: int
+    currsize: int
+
+
+class ParserCache(LRUCache[str, "Lark"]):
+    def __init__(self, maxsize: int = 32, store: GrammarStore | None = None):
+        super().__init__(maxsize)
+        self.store = store
+        self.evictions = 0
+        self.loads = 0
+        self.build_time = 0.0
+
+    @staticmethod
+    def make_key(grammar: str, options: dict[str, Any]) -> str:
+        digest = sha256(grammar.encode("utf-8"))
+        digest.update(b"\0")
+        digest.update(repr(sorted(options.items())).encode("utf-8"))
+        return digest.hexdigest()
+
+    def get_parser(self, grammar: str, options: dict[str, Any]) -> Lark:
+        return self.get_parser_by_key(self.make_key(grammar, options), options, lambda: grammar)
+
+    def get_parser_by_fingerprint(
+        self,
+        fingerprint: str,
+        options: dict[str, Any],
+        render: Callable[[], str],
+        build: Callable[[], Lark] | None = None,
+    ) -> Lark:
+        # `render` is called only if the parser has to be built
+        key = self.make_key("fingerprint:" + fingerprint, options)
+        return self.get_parser_by_key(key, options, render, build)
+
+    def get_parser_by_key(
+        self,
+        key: str,
+        options: dict[str, Any],
+        render: Callable[[], str],
+        build: Callable[[], Lark] | None = None,
+    ) -> Lark:
+        # with `build`, the parser is built without the grammar text,
+        # which is then rendered only to be kept in the store.
+        # Grammars of parsers that can't be saved are rendered once for all processes using the store
+        parser = self.get(key)
+        if parser is not None:
+            return parser
+
+        parser = self.load(key)
+        if parser is None:
+            grammar = None if self.store is None else self.store.get_text(key)
+            if build is None:
+                if grammar is None:
+                    grammar = render()
+                parser = self.build(grammar, options)
+            else:
+                start = perf_counter()
+                parser = build()
+                self.build_time += perf_counter() - start
+            if self.store is not None:
+                self.store.put_text(key, render() if grammar is None else grammar)
+                self.store.put_parser(key, parser)
+        self.put(key, parser)
+        return parser
+
+    def load(self, key: str) -> Lark | None:
+        if self.store is None:
+            return None
+        parser = self.store.get_parser(key)
+        if parser is not None:
+            self.loads += 1
+        return parser
+
+    def evicted(self, key: str, value: Lark) -> None:
+        self.evictions += 1
+
+    def info(self) -> ParserCacheInfo:  # type: ignore[override]
+        return ParserCacheInfo(
+            self.hits,
+            self.misses,
+            self.evictions,
+            self.loads,
+            self.build_time,
+            self.maxsize,
+            len(self.data),
+        )
+
+    def build(self, grammar: str, options: dict[str, Any]) -> Lark:
+        start = perf_counter()
+        parser = build_lark(grammar, options)
+        self.build_time += perf_counter() - start
+        return parser
+
+
+def build_lark(grammar: str, options: dict[str, Any]) -> Lark:
+    try:
+        from lark import Lark
+    except ImportError:  # pragma: no cover
+        raise ImportError(
+            "Lark is required to build parsers, install it with `python -m pip install lark-dynamic[lark]`"
+        ) from None
+
+    return Lark(grammar, **options)
+
+
+# shared by all grammars by default, so equal grammars get the same parser
+parser_cache = ParserCache()
@@ -0,0 +1,191 @@
+from __future__ import annotations
+from typing import Any, Callable, Hashable, NamedTuple
+from contextvars import ContextVar
+from time import perf_counter
+
+from .constants import ContextType
+from .token import NEWLINE, Renderable, Token
+
+
+# `generate_profiled` renders a grammar definition by definition, timing each of them,
+# while variables report their evaluations to the current profiler.
+# Without a profiler, the only cost is a context variable lookup per rendered variable
+
+
+class DefinitionProfile(NamedTuple):
+    name: str
+    kind: str
+    time: float
+    size: int
+    nodes: int
+    static: bool
+
+
+class VariableProfile(NamedTuple):
+    # `calls` of the callback itself, `evaluations` also count values reused from memos and caches
+    name: str
+    calls: int
+    evaluations: int
+    time: float
+
+
+class RenderProfile(NamedTuple):
+    text: str
+    time: float
+    nodes: int
+    definitions: list[DefinitionProfile]
+    variables: list[VariableProfile]
+
+    def to_dict(self) -> dict[str, Any]:
+        # plain types only, for JSON and metrics exporters
+        return {
+            "time": self.time,
+            "size": len(self.text),
+            "nodes": self.nodes,
+            "definitions": [profile._asdict() for profile in self.definitions],
+            "variables": [profile._asdict() for profile in self.variables],
+        }
+
+
+def variable_function(variable: Variable) -> Callable[..., Renderable] | None:
+    # the function given by the user, subclasses computing their value themselves have none
+    function = getattr(variable, "function", None) or variable.callback
+    if getattr(function, "__self__", None) is variable:
+        return None
+    return function  # type: ignore[no-any-return]
+
+
+def callback_name(variable: Variable) -> str:
+    function = variable_function(variable)
+    if function is None:
+        key = getattr(variable, "key", None)
+        return type(variable).__name__ if key is None else f"{type(variable).__name__}:{key}"
+    if isinstance(function, CallableRef):
+        return function.path
+    module = getattr(function, "__module__", None)
+    name = getattr(function, "__qualname__", None) or repr(function)
+    return name if module is None else f"{module}:{name}"
+
+
+class Profiler:
+    def __init__(self) -> None:
+        # by callback (or by variable, for variables without one)
+        self.names: dict[Hashable, str] = {}
+        self.calls: dict[Hashable, int] = {}
+        self.evaluations: dict[Hashable, int] = {}
+        self.times: dict[Hashable, float] = {}
+        # last values of variables, by id (variables are kept, so ids aren't reused)
+        self.values: dict[int, tuple[Variable, Renderable]] = {}
+
+    def evaluate(self, variable: Variable, context: ContextType) -> Renderable:
+        start = perf_counter()
+        result = variable.evaluate(context)
+        elapsed = perf_counter() - start
+
+        key = self.get_key(variable)
+        if type(variable).evaluate is not Variable.evaluate:
+            # computed by the variable itself every time
+            self.calls[key] = self.calls.get(key, 0) + 1
+        self.evaluations[key] = self.evaluations.get(key, 0) + 1
+        self.times[key] = self.times.get(key, 0.0) + elapsed
+        self.values[id(variable)] = (variable, result)
+        return result
+
+    def called(self, variable: Variable) -> None:
+        # reported by `Variable` when its callback is called
+        key = self.get_key(variable)
+        self.calls[key] = self.calls.get(key, 0) + 1
+
+    def get_key(self, variable: Variable) -> Hashable:
+        function = variable_function(variable)
+        key: Hashable = id(variable) if function is None else function
+        if key not in self.names:
+            self.names[key] = callback_name(variable)
+        return key
+
+    def count_nodes(self, token: Renderable) -> int:
+        # tokens rendered for a definition, variables are counted with their values
+        nodes = 0
+        stack = [token]
+        while stack:
+            current = stack.pop()
+            nodes += 1
+            if isinstance(current, (tuple, list)):
+                stack.extend(current)
+            elif isinstance(current, Variable):
+                if id(current) in self.values:
+                    stack.append(self.values[id(current)][1])
+            elif isinstance(current, Token):
+                stack.extend(current.get_children())
+        return nodes
+
+    def variables(self) -> list[VariableProfile]:
+        profiles = [
+            VariableProfile(
+                self.names[key],
+                self.calls.get(key, 0),
+                self.evaluations.get(key, 0),
+                self.times.get(key, 0.0),
+            )
+            for key in self.names
+        ]
+        return sorted(profiles, key=lambda profile: profile.time, reverse=True)
+
+
+profiler: ContextVar[Profiler | None] = ContextVar("profiler", default=None)
+
+
+def generate_profiled(grammar: Grammar, context: ContextType) -> RenderProfile:
+    # grammar caches are not used, so the report shows the cost of a full render
+    # (static definitions are still rendered once and kept)
+    current = Profiler()
+    token = profiler.set(current)
+    pieces: list[str] = []
+    definitions: list[DefinitionProfile] = []
+    wrapper = grammar.use_wrapper()
+
+    start = perf_counter()
+    try:
+        for kind, section in (
+            ("terminal", wrapper.terminals.values()),
+            ("rule", wrapper.rules.values()),
+            ("directive", wrapper.directives),
+            ("template", wrapper.templates.values()),
+        ):
+            for definition in section:
+                definition_start = perf_counter()
+                if grammar.__flat__:
+                    text = render_parts_flat([definition], context)
+                else:
+                    text = "".join(definition.render(context))
+                elapsed = perf_counter() - definition_start
+
+                pieces.append(text)
+                pieces.append(NEWLINE)
+                definitions.append(
+                    DefinitionProfile(
+                        definition.name,
+                        kind,
+                        elapsed,
+                        len(text),
+                        current.count_nodes(definition),
+                        bool(definition.static),
+                    )
+                )
+            pieces.append(NEWLINE)
+    finally:
+        profiler.reset(token)
+    elapsed = perf_counter() - start
+
+    return RenderProfile(
+        "".join(pieces).strip(),
+        elapsed,
+        sum(profile.nodes for profile in definitions),
+        definitions,
+        current.variables(),
+    )
+
+
+from .grammar import Grammar
+from .variable import CallableRef, Variable
+from .renderer import render_parts_flat
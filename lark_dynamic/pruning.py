@@ -0,0 +1,88 @@
+from __future__ import annotations
+from typing import Iterable, NamedTuple
+import re
+
+from .constants import ContextType
+
+
+NAME_RE = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+
+
+class PrunedGrammar(NamedTuple):
+    text: str
+    dropped: list[str]
+
+
+def find_references(token: Renderable, context: ContextType) -> Iterable[str]:
+    # names that might be referenced by the token, variables are evaluated for the context.
+    # Raw text (prerendered tokens, directives) is scanned for anything that looks like a name
+    stack: list[Renderable] = [token]
+    while stack:
+        current = stack.pop()
+        if isinstance(current, (tuple, list)):
+            stack.extend(current)
+        elif isinstance(current, str):
+            continue
+        elif isinstance(current, Variable):
+            stack.append(current.evaluate(context))
+        elif isinstance(current, (Rule, Terminal)):
+            yield current.string
+        elif isinstance(current, Prerendered):
+            yield from NAME_RE.findall(current.string)
+        elif isinstance(current, Template):
+            yield current.name
+            stack.extend(current.args)
+        elif isinstance(current, DirectiveDef) and not isinstance(
+            current.content, Token
+        ):
+            yield from NAME_RE.findall(current.content)
+        else:
+            stack.extend(current.get_children())
+
+
+def find_reachable(
+    grammar: Grammar, start: str | Iterable[str], context: ContextType
+) -> set[str]:
+    wrapper = grammar.use_wrapper()
+    names = [start] if isinstance(start, str) else list(start)
+
+    for name in names:
+        if name not in wrapper.rules:
+            raise AttributeError(f"No rule by the name '{name}'")
+
+    # directives (e.g. `%ignore`) can't be unreachable, so they are roots as well
+    stack: list[Renderable] = [*wrapper.directives]
+    reachable: set[str] = set()
+
+    while stack or names:
+        for name in names:
+            definition = wrapper.get_def(name)
+            if definition is not None and name not in reachable:
+                reachable.add(name)
+                stack.append(definition)
+        names = list(find_references(stack.pop(), context)) if stack else []
+
+    return reachable
+
+
+def generate_pruned(
+    grammar: Grammar, start: str | Iterable[str], context: ContextType
+) -> PrunedGrammar:
+    reachable = find_reachable(grammar, start, context)
+    wrapper = grammar.use_wrapper()
+
+    dropped = [
+        name
+        for section in (wrapper.terminals, wrapper.rules, wrapper.templates)
+        for name in section
+        if name not in reachable
+    ]
+    return PrunedGrammar(render_grammar(grammar, context, reachable), dropped)
+
+
+from .grammar import Grammar
+from .token import Renderable, Token
+from .atoms import Prerendered, Rule, Template, Terminal
+from .definitions import DirectiveDef
+from .variable import Variable
+from .renderer import render_grammar
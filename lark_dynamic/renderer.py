@@ -0,0 +1,219 @@
+from __future__ import annotations
+from typing import Container, Iterator, Sequence
+
+from .constants import ContextType
+from .token import (
+    CLOSE_BRACKET,
+    CLOSE_PAREN,
+    NEWLINE,
+    OPEN_BRACKET,
+    OPEN_PAREN,
+    SPACE,
+    Raw,
+    Renderable,
+    Token,
+    str_encoder,
+)
+from .utils import separated_parts
+
+
+# Renders tokens with an explicit stack instead of nested generators.
+# Output is the same as of `Token.render_str`, but deeply nested tokens don't hit the recursion limit
+
+
+def render_flat(token: Renderable, context: ContextType) -> str:
+    return render_parts_flat([token], context)
+
+
+def render_parts_flat(parts: Sequence[Renderable], context: ContextType) -> str:
+    return "".join(render_pieces_flat(parts, context))
+
+
+def render_pieces_flat(parts: Sequence[Renderable], context: ContextType) -> list[str]:
+    # the output before joining, so `Hole`s of a deferred render are kept
+    buffer: list[str] = []
+    write = buffer.append
+
+    stack = list(reversed(parts))
+    pop = stack.pop
+    extend = stack.extend
+
+    while stack:
+        part = pop()
+
+        if isinstance(part, Raw):
+            write(part)
+        elif isinstance(part, str):
+            write(f'"{str_encoder(part)[0].decode("utf-8")}"')
+        elif isinstance(part, tuple):
+            stack.append(CLOSE_PAREN)
+            extend(reversed(separated_parts(part, SPACE)))
+            stack.append(OPEN_PAREN)
+        elif isinstance(part, list):
+            stack.append(CLOSE_BRACKET)
+            extend(reversed(separated_parts(part, SPACE)))
+            stack.append(OPEN_BRACKET)
+        else:
+            extend(reversed(part.render_parts(context)))
+
+    return buffer
+
+
+def grammar_parts(
+    grammar: Grammar, names: Container[str] | None = None
+) -> list[Renderable]:
+    wrapper = grammar.use_wrapper()
+    parts: list[Renderable] = []
+
+    for section in (
+        wrapper.terminals.values(),
+        wrapper.rules.values(),
+        wrapper.directives,
+        wrapper.templates.values(),
+    ):
+        for definition in section:
+            if (
+                names is None
+                or isinstance(definition, DirectiveDef)
+                or definition.name in names
+            ):
+                parts.append(definition)
+                parts.append(NEWLINE)
+        parts.append(NEWLINE)
+
+    return parts
+
+
+def render_segments(
+    grammar: Grammar, parts: list[Renderable], context: ContextType, maxsize: int
+) -> list[str]:
+    pieces: list[str] = []
+    for part in parts:
+        if isinstance(part, Definition):
+            pieces.append(part.render_segment(context, maxsize, grammar.__flat__))
+        else:
+            assert isinstance(part, Raw)
+            pieces.append(part)
+    return pieces
+
+
+class Segments:
+    # a rendered grammar split into definitions, `dirty` are positions of edited definitions
+    __slots__ = ("pieces", "dirty")
+
+    def __init__(self, pieces: list[str]):
+        self.pieces = pieces
+        self.dirty: set[int] = set()
+
+
+class SegmentCache:
+    # keeps previous outputs of a grammar by definition, so after editing a definition
+    # only it is rendered again and spliced into the output, everything else is reused as is
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.outputs: GenerationCache[Segments] = GenerationCache(maxsize)
+        self.parts: list[Renderable] | None = None
+        self.positions: dict[int, int] = {}
+
+    def mark_dirty(self, definition: Definition) -> None:
+        position = self.positions.get(id(definition))
+        if position is None:
+            return
+        for segments in self.outputs.data.values():
+            segments.dirty.add(position)
+
+    def replace_definition(self, old: Definition, new: Definition) -> None:
+        position = self.positions.pop(id(old), None)
+        if position is None or self.parts is None:
+            return
+        self.parts[position] = new
+        self.positions[id(new)] = position
+        for segments in self.outputs.data.values():
+            segments.dirty.add(position)
+
+    def clear(self) -> None:
+        # the layout of the grammar has changed (e.g. a definition was added)
+        self.outputs.clear()
+        self.parts = None
+        self.positions = {}
+
+    def render(self, grammar: Grammar, context: ContextType) -> str:
+        if self.parts is None:
+            self.parts = grammar_parts(grammar)
+            self.positions = {
+                id(part): position
+                for position, part in enumerate(self.parts)
+                if isinstance(part, Definition)
+            }
+
+        parts = self.parts
+        dependencies, segments = self.outputs.get_or_compute(
+            context,
+            lambda tracked: Segments(
+                render_segments(grammar, parts, tracked, self.maxsize)
+            ),
+        )
+
+        if segments.dirty:
+            tracked = TrackingContext(context)
+            tracked.replay(dependencies)
+            for position in segments.dirty:
+                definition = parts[position]
+                assert isinstance(definition, Definition)
+                segments.pieces[position] = definition.render_segment(
+                    tracked, self.maxsize, grammar.__flat__
+                )
+            segments.dirty.clear()
+
+            # edited definitions could have read other keys, or be impure
+            if tracked.impure:
+                self.outputs.remove(context, dependencies)
+            elif tracked.dependencies() != dependencies:
+                self.outputs.remove(context, dependencies)
+                self.outputs.store(context, tracked.dependencies(), segments)
+
+        return "".join(segments.pieces).strip()
+
+
+def render_grammar(
+    grammar: Grammar, context: ContextType, names: Container[str] | None = None
+) -> str:
+    if grammar.__segments__ is not None:
+        if names is None:
+            return grammar.__segments__.render(grammar, context)
+        parts = grammar_parts(grammar, names)
+        maxsize = grammar.__segments__.maxsize
+        return "".join(render_segments(grammar, parts, context, maxsize)).strip()
+    if grammar.__flat__:
+        return render_parts_flat(grammar_parts(grammar, names), context).strip()
+    return "".join(grammar.build_grammar(context, names)).strip()
+
+
+def iter_grammar(grammar: Grammar, context: ContextType) -> Iterator[str]:
+    # the output of `Grammar.generate()` (before stripping) a definition at a time,
+    # variables are evaluated once for the whole grammar, as in `generate()`
+    if grammar.__cache__ is not None:
+        # cached outputs are kept whole
+        yield grammar.generate(**context)
+        return
+
+    memo: Memo = {}
+    for part in grammar_parts(grammar):
+        if not isinstance(part, Definition):
+            assert isinstance(part, Raw)
+            yield part
+            continue
+        # the scope isn't kept open between pieces, the consumer runs in between
+        with memo_scope(memo):
+            if grammar.__flat__:
+                piece = render_flat(part, context)
+            else:
+                piece = "".join(part.render(context))
+        yield piece
+
+
+from .grammar import Grammar
+from .cache import GenerationCache
+from .tracking import TrackingContext
+from .definitions import Definition, DirectiveDef
+from .variable import Memo, memo_scope
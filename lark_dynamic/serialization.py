@@ -0,0 +1,28 @@
+from __future__ import annotations
+import pickle
+import zlib
+
+
+# Grammars are pickled without caches and compressed.
+# Only declarative variables (`Lookup`, `BoolSwitch`, `Switch`) and importable callbacks
+# (module-level functions or `CallableRef`) can be pickled, lambdas and closures can't
+
+
+def dumps(grammar: Grammar, level: int = 6) -> bytes:
+    try:
+        data = pickle.dumps(grammar, pickle.HIGHEST_PROTOCOL)
+    except (pickle.PicklingError, AttributeError, TypeError) as error:
+        raise TypeError(
+            f"Grammar can't be serialized ({error}). Use declarative variables (Lookup, BoolSwitch, Switch) or CallableRef instead of lambdas"
+        ) from error
+    return zlib.compress(data, level)
+
+
+def loads(data: bytes) -> Grammar:
+    grammar = pickle.loads(zlib.decompress(data))
+    if not isinstance(grammar, Grammar):
+        raise TypeError(f"Expected a serialized Grammar, got {type(grammar).__name__}")
+    return grammar
+
+
+from .grammar import Grammar
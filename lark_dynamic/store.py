@@ -0,0 +1,141 @@
+from __future__ import annotations
+from typing import IO, TYPE_CHECKING, Callable, TypeVar, Union
+from pathlib import Path
+import mmap
+import os
+import pickle
+import tempfile
+
+if TYPE_CHECKING:
+    from lark import Lark
+
+
+T = TypeVar("T")
+PathType = Union[str, "os.PathLike[str]"]
+
+TEXT_SUFFIX = ".lark"
+PARSER_SUFFIX = ".parser"
+# the directory is scanned again after this many writes, to see files written by other processes
+RESCAN_WRITES = 64
+
+
+# directory with generated grammars and serialized parsers, by the key of the parser
+# (a hash of the grammar and the options), files are written atomically and never modified,
+# so it can be shared between processes
+class GrammarStore:
+    def __init__(self, path: PathType, max_size: int | None = None):
+        self.path = Path(path)
+        self.max_size = max_size
+        self.path.mkdir(parents=True, exist_ok=True)
+        # size of the files, updated on writes and rescanned from time to time
+        self.total: int | None = None
+        self.writes = 0
+
+    def get_path(self, key: str, suffix: str) -> Path:
+        return self.path / key[:2] / (key + suffix)
+
+    def get_text(self, key: str) -> str | None:
+        return self.read(
+            self.get_path(key, TEXT_SUFFIX), lambda data: str(data, "utf-8")
+        )
+
+    def put_text(self, key: str, text: str) -> None:
+        path = self.get_path(key, TEXT_SUFFIX)
+        if not path.exists():
+            self.write(path, lambda file: file.write(text.encode("utf-8")))
+
+    def get_parser(self, key: str) -> Lark | None:
+        from lark import Lark
+
+        return self.read(self.get_path(key, PARSER_SUFFIX), Lark.load)
+
+    def put_parser(self, key: str, parser: Lark) -> bool:
+        path = self.get_path(key, PARSER_SUFFIX)
+        if path.exists():
+            return True
+        try:
+            self.write(path, parser.save)
+        except (NotImplementedError, pickle.PicklingError, TypeError, AttributeError):
+            # only LALR parsers with picklable options can be saved
+            return False
+        return True
+
+    def read(self, path: Path, load: Callable[[mmap.mmap], T]) -> T | None:
+        try:
+            with open(path, "rb") as file:
+                with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                    result = load(data)
+        except FileNotFoundError:
+            # file is missing or evicted by another process
+            return None
+        except Exception:
+            # empty or corrupt file, or a parser saved by another version of Lark
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+            return None
+
+        try:
+            # modification time is used as the last access time for eviction
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        return result
+
+    def write(self, path: Path, dump: Callable[[IO[bytes]], object]) -> None:
+        path.parent.mkdir(exist_ok=True)
+        with tempfile.NamedTemporaryFile(
+            dir=path.parent, suffix=".tmp", delete=False
+        ) as file:
+            try:
+                dump(file)
+            except BaseException:
+                file.close()
+                os.unlink(file.name)
+                raise
+        os.replace(file.name, path)
+
+        if self.max_size is None:
+            return
+        self.writes += 1
+        if self.total is None or self.writes >= RESCAN_WRITES:
+            self.evict(self.max_size)
+            return
+        try:
+            self.total += path.stat().st_size
+        except FileNotFoundError:
+            pass
+        if self.total > self.max_size:
+            self.evict(self.max_size)
+
+    def entries(self) -> list[tuple[float, int, Path]]:
+        entries = []
+        for path in self.path.glob("*/*"):
+            if path.suffix not in (TEXT_SUFFIX, PARSER_SUFFIX):
+                continue
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def size(self) -> int:
+        return sum(size for _, size, _ in self.entries())
+
+    def evict(self, max_size: int) -> None:
+        entries = sorted(self.entries())
+        total = sum(size for _, size, _ in entries)
+
+        for _, size, path in entries:
+            if total <= max_size:
+                break
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+            total -= size
+
+        self.total = total
+        self.writes = 0
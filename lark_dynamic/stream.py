@@ -0,0 +1,92 @@
+from __future__ import annotations
+from typing import IO, Iterable, Iterator, Union
+import errno
+import io
+import select
+import socket
+import time
+
+
+CHUNK_SIZE = 1 << 16
+# non-blocking raw streams return None when they can't take any data,
+# waiting for them is retried this many times before giving up
+WRITE_RETRIES = 100
+WRITE_TIMEOUT = 0.1
+
+Writable = Union["IO[str]", "IO[bytes]", socket.socket]
+
+
+def iter_chunks(pieces: Iterable[str], chunk_size: int = CHUNK_SIZE) -> Iterator[str]:
+    # joins pieces into chunks of about `chunk_size` characters, output is the same as of
+    # `"".join(pieces).strip()`, but only the current chunk is held in memory.
+    # Trailing whitespace is held back until something else follows it
+    buffer: list[str] = []
+    size = 0
+    pending = ""
+    started = False
+
+    for piece in pieces:
+        if not started:
+            piece = piece.lstrip()
+            if not piece:
+                continue
+            started = True
+
+        content = piece.rstrip()
+        if not content:
+            pending += piece
+            continue
+
+        if pending:
+            buffer.append(pending)
+            size += len(pending)
+        buffer.append(content)
+        size += len(content)
+        pending = piece[len(content) :]
+
+        if size >= chunk_size:
+            yield "".join(buffer)
+            buffer = []
+            size = 0
+
+    if buffer:
+        yield "".join(buffer)
+
+
+def write_chunks(fp: Writable, chunks: Iterable[str]) -> None:
+    # text files get `str`, binary files, pipes and sockets get UTF-8 bytes
+    if isinstance(fp, socket.socket):
+        for chunk in chunks:
+            fp.sendall(chunk.encode("utf-8"))
+    elif isinstance(fp, io.TextIOBase):
+        for chunk in chunks:
+            fp.write(chunk)
+    elif isinstance(fp, io.RawIOBase):
+        for chunk in chunks:
+            # raw streams can write only a part of the data
+            data = memoryview(chunk.encode("utf-8"))
+            retries = 0
+            while data:
+                written = fp.write(data)
+                if written is None:
+                    retries += 1
+                    if retries > WRITE_RETRIES:
+                        raise BlockingIOError(errno.EAGAIN, "The stream isn't writable")
+                    wait_writable(fp)
+                    continue
+                retries = 0
+                data = data[written:]
+    elif isinstance(fp, io.BufferedIOBase) or "b" in getattr(fp, "mode", ""):
+        for chunk in chunks:
+            fp.write(chunk.encode("utf-8"))  # type: ignore
+    else:
+        for chunk in chunks:
+            fp.write(chunk)  # type: ignore
+
+
+def wait_writable(fp: io.RawIOBase) -> None:
+    try:
+        select.select([], [fp], [], WRITE_TIMEOUT)
+    except (OSError, ValueError):
+        # streams without a file descriptor
+        time.sleep(WRITE_TIMEOUT)
@@ -1,28 +1,130 @@
 from __future__ import annotations
-from typing import Iterable, Union
+from typing import Any, Hashable, Iterable, Sequence, Union
 from codecs import getencoder
 
 from .constants import ContextType
-from .utils import add_tab
+from .tracking import Dependencies, TrackingContext
 
 
 Renderable = Union[str, "list[Renderable]", "tuple[Renderable, ...]", "Token"]
 str_encoder = getencoder("unicode_escape")
 
 
+class Raw(str):
+    # already rendered text, as opposed to `str` renderables (which are rendered as literals)
+    __slots__ = ()
+
+
+class DumpText(str):
+    # text of a tree dump written as is, as opposed to children of a token (see treedump.py)
+    __slots__ = ()
+
+
+SPACE = Raw(" ")
+COMMA = Raw(", ")
+PIPE = Raw(" | ")
+NEWLINE = Raw("\n")
+OPEN_PAREN = Raw("(")
+CLOSE_PAREN = Raw(")")
+OPEN_BRACKET = Raw("[")
+CLOSE_BRACKET = Raw("]")
+CLOSE_BRACE = Raw("}")
+DUMP_NEWLINE = DumpText("\n")
+
+
 class Token:
+    __slots__ = ()
+
+    # tokens rendering differently depending on the context (e.g. `Variable`)
+    dynamic = False
+
     def get_name(self) -> str:
         return self.__class__.__name__
 
+    def get_children(self) -> Sequence[Renderable]:
+        return ()
+
+    def get_key(self) -> tuple[Hashable, ...]:
+        # everything identifying the token besides its type and children
+        return ()
+
+    def replace_children(self, children: Sequence[Renderable]) -> Token:
+        return self
+
+    def __eq__(self, other: object) -> bool:
+        if self is other:
+            return True
+        if type(self) is not type(other):
+            return NotImplemented
+        return trees_equal(self, other)
+
+    def __hash__(self) -> int:
+        # tokens are not changed after they are made (unlike definitions), so tokens
+        # with children keep their hash, see `hash_tree`
+        value = cached_hash(self)
+        return hash_tree(self) if value is None else value
+
+    def __getstate__(self) -> dict[str, Any]:
+        # cached hashes are not pickled, hashes of strings differ between processes
+        state = {
+            slot: getattr(self, slot)
+            for cls in type(self).__mro__
+            for slot in getattr(cls, "__slots__", ())
+            if hasattr(self, slot)
+        }
+        state.update(getattr(self, "__dict__", ()))
+        state.pop("hash_value", None)
+        return state
+
+    def __setstate__(self, state: dict[str, Any]) -> None:
+        for slot, value in state.items():
+            setattr(self, slot, value)
+
+    def is_static(self) -> bool:
+        return Token.is_static_str(self)
+
+    @staticmethod
+    def is_static_str(token: Renderable) -> bool:
+        stack: list[Renderable] = [token]
+        while stack:
+            current = stack.pop()
+            if isinstance(current, (tuple, list)):
+                stack.extend(current)
+            elif isinstance(current, Token):
+                if current.dynamic:
+                    return False
+                stack.extend(current.get_children())
+        return True
+
     def repr_children(self) -> str:
+        # text between the parens of `repr()`, for tokens without children
         return ""
 
+    def repr_header(self) -> str:
+        return self.get_name()
+
+    def repr_parts(self) -> Sequence[Renderable]:
+        # `DumpText` is written as is, other parts are dumped as trees
+        text = self.repr_children()
+        return [DumpText(text)] if text else []
+
     def __repr__(self) -> str:
-        return f"{self.get_name()}({add_tab(self.repr_children())})"
+        return format_tree(self)
 
     def render(self, context: ContextType) -> Iterable[str]:
         return NotImplemented
 
+    def render_parts(self, context: ContextType) -> Sequence[Renderable]:
+        # used by the flat renderer: `Raw` parts are written as is, others are rendered in turn
+        return [Raw("".join(self.render(context)))]
+
+    def get_dependencies(self, context: ContextType) -> Dependencies:
+        # rendered with the flat renderer, so deep trees don't hit the recursion limit
+        tracked = TrackingContext(context)
+        with memo_scope():
+            render_flat(self, tracked)
+        return tracked.dependencies()
+
     @staticmethod
     def render_str(token: Renderable, context: ContextType) -> Iterable[str]:
         if isinstance(token, tuple):
@@ -45,4 +147,93 @@ class Token:
         return Option(other, self)
 
 
+def cached_hash(token: Token) -> int | None:
+    # `object.__getattribute__` doesn't fall back to `__getattr__` (e.g. flags of `Literal`)
+    try:
+        return object.__getattribute__(token, "hash_value")  # type: ignore[no-any-return]
+    except AttributeError:
+        return None
+
+
+def hash_tree(token: Token) -> int:
+    # post-order traversal with an explicit stack, so deep trees don't hit the recursion limit.
+    # Equal to `hash((type, key, child hashes))` of every token, kept on tokens having a `hash_value` slot
+    values: list[int] = []
+    # nodes with the number of their children once these are pushed, -1 before
+    stack: list[tuple[Any, int]] = [(token, -1)]
+
+    while stack:
+        node, count = stack.pop()
+        if count < 0:
+            if isinstance(node, Token):
+                if type(node).__hash__ is not Token.__hash__ or cached_hash(node) is not None:
+                    values.append(hash(node))
+                    continue
+                children: Sequence[Any] = node.get_children()
+            elif isinstance(node, (tuple, list)):
+                children = node
+            else:
+                values.append(hash(node))
+                continue
+            stack.append((node, len(children)))
+            stack.extend((child, -1) for child in reversed(children))
+            continue
+
+        hashes = tuple(values[len(values) - count :])
+        del values[len(values) - count :]
+        if isinstance(node, Token):
+            value = hash((type(node), node.get_key(), hashes))
+            try:
+                node.hash_value = value  # type: ignore[attr-defined]
+            except AttributeError:
+                pass
+        elif isinstance(node, list):
+            value = hash((list, hashes))
+        else:
+            value = hash(hashes)
+        values.append(value)
+
+    return values[0]
+
+
+def trees_equal(first: Token, second: object) -> bool:
+    # the same as comparing types, keys and children recursively, with an explicit stack
+    stack: list[tuple[Any, Any]] = [(first, second)]
+
+    while stack:
+        a, b = stack.pop()
+        if a is b:
+            continue
+        if isinstance(a, Token) and isinstance(b, Token):
+            if type(a) is not type(b):
+                return False
+            if type(a).__eq__ is not Token.__eq__:
+                if a != b:
+                    return False
+                continue
+            hash_a = cached_hash(a)
+            hash_b = cached_hash(b)
+            if hash_a is not None and hash_b is not None and hash_a != hash_b:
+                return False
+            if a.get_key() != b.get_key():
+                return False
+            a, b = tuple(a.get_children()), tuple(b.get_children())
+        elif isinstance(a, (tuple, list)) and isinstance(b, (tuple, list)):
+            if isinstance(a, list) is not isinstance(b, list):
+                return False
+        else:
+            if a != b:
+                return False
+            continue
+
+        if len(a) != len(b):
+            return False
+        stack.extend(zip(a, b))
+
+    return True
+
+
 from .combinators import Group, Option, Optional
+from .treedump import format_tree
+from .renderer import render_flat
+from .variable import memo_scope
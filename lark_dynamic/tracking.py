@@ -0,0 +1,100 @@
+from __future__ import annotations
+from typing import Any, Dict, FrozenSet, ItemsView, Iterator, KeysView, Optional, ValuesView
+
+from .constants import ContextType
+
+
+# `None` means that the whole context was read (e.g. iterated over)
+Dependencies = Optional[FrozenSet[str]]
+
+
+class TrackingContext(Dict[str, Any]):
+    def __init__(self, context: ContextType):
+        # `dict.items` bypasses the tracking of a parent context
+        super().__init__(dict.items(context))
+        self.accessed: set[str] = set()
+        self.reads_all = False
+        # an impure variable was rendered, the result can't be cached
+        self.impure = False
+        self.parent = context if isinstance(context, TrackingContext) else None
+
+    def record(self, key: str) -> None:
+        self.accessed.add(key)
+        if self.parent is not None:
+            self.parent.record(key)
+
+    def record_all(self) -> None:
+        self.reads_all = True
+        if self.parent is not None:
+            self.parent.record_all()
+
+    def record_impure(self) -> None:
+        self.impure = True
+        if self.parent is not None:
+            self.parent.record_impure()
+
+    def replay(self, dependencies: Dependencies) -> None:
+        # records the reads of an earlier render, whose result is reused
+        if dependencies is None:
+            self.record_all()
+            return
+        for key in dependencies:
+            self.record(key)
+
+    def dependencies(self) -> Dependencies:
+        if self.reads_all:
+            return None
+        return frozenset(self.accessed)
+
+    def __getitem__(self, key: str) -> Any:
+        self.record(key)
+        return super().__getitem__(key)
+
+    def __contains__(self, key: object) -> bool:
+        if isinstance(key, str):
+            self.record(key)
+        return super().__contains__(key)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        self.record(key)
+        return super().get(key, default)
+
+    def setdefault(self, key: str, default: Any = None) -> Any:
+        self.record(key)
+        return super().setdefault(key, default)
+
+    def pop(self, key: str, *default: Any) -> Any:
+        self.record(key)
+        return super().pop(key, *default)
+
+    def __iter__(self) -> Iterator[str]:
+        self.record_all()
+        return super().__iter__()
+
+    def __len__(self) -> int:
+        self.record_all()
+        return super().__len__()
+
+    def __eq__(self, other: object) -> bool:
+        self.record_all()
+        return super().__eq__(other)
+
+    def keys(self) -> KeysView[str]:  # type: ignore[override]
+        self.record_all()
+        return super().keys()
+
+    def values(self) -> ValuesView[Any]:  # type: ignore[override]
+        self.record_all()
+        return super().values()
+
+    def items(self) -> ItemsView[str, Any]:  # type: ignore[override]
+        self.record_all()
+        return super().items()
+
+    def copy(self) -> dict[str, Any]:
+        self.record_all()
+        return dict(super().items())
+
+    def __repr__(self) -> str:
+        self.record_all()
+        return super().__repr__()
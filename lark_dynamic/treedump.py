@@ -0,0 +1,254 @@
+from __future__ import annotations
+from typing import Any, Callable, Iterable, Iterator, Sequence
+
+from .stream import Writable, write_chunks
+from .token import DUMP_NEWLINE, DumpText, Token
+
+
+# Dumps token trees in the format of `repr()`: every token is `Name(`, its parts indented
+# by 4 spaces on the following lines and `)`. Tokens describe themselves with `repr_parts()`
+# (text and children), the tree is traversed with an explicit stack and indentation is
+# written once per line, so the time is linear in the size of the output, whatever the depth.
+# The output is yielded in chunks of about `chunk_size` pieces.
+# `max_depth` collapses deeper tokens to `Name(...)`, `max_width` shows only the first children
+# of every token, tuple and list.
+# Without limits, trees up to `SHALLOW_DEPTH` levels (most of them) are written recursively,
+# without the bookkeeping of the stack, which is faster for them
+
+INDENT = "    "
+CHUNK_SIZE = 1 << 12
+SHALLOW_DEPTH = 32
+
+
+class TooDeep(Exception):
+    pass
+
+
+def limit_width(parts: Sequence[Any], max_width: int | None) -> Sequence[Any]:
+    # text is kept up to the first hidden child
+    if max_width is None:
+        return parts
+    shown: list[Any] = []
+    children = 0
+    for i, part in enumerate(parts):
+        if not isinstance(part, DumpText):
+            if children == max_width:
+                hidden = sum(1 for rest in parts[i:] if not isinstance(rest, DumpText))
+                shown.append(DumpText(f"... ({hidden} more)"))
+                break
+            children += 1
+        shown.append(part)
+    return shown
+
+
+def container_parts(container: tuple[Any, ...] | list[Any]) -> list[Any]:
+    # items separated like in Python's repr, tokens inside are dumped as trees
+    parts: list[Any] = []
+    for i, item in enumerate(container):
+        if i:
+            parts.append(COMMA)
+        parts.append(item)
+    return parts
+
+
+COMMA = DumpText(", ")
+
+
+def write_shallow(
+    part: Any, write: Callable[[str], None], newline: str, depth: int = 0
+) -> None:
+    # `newline` is "\n" and the indentation of `part`
+    if isinstance(part, Token):
+        if type(part).repr_parts is Token.repr_parts:
+            # a leaf, like `Rule(name)`
+            text = part.repr_children()
+            if not text:
+                write(part.repr_header() + "()")
+                return
+            inner = newline + INDENT
+            if "\n" in text:
+                text = text.replace("\n", inner)
+            write(part.repr_header() + "(" + inner + text + newline + ")")
+            return
+
+        parts = part.repr_parts()
+        if not parts:
+            write(part.repr_header() + "()")
+            return
+        if depth == SHALLOW_DEPTH:
+            raise TooDeep()
+        inner = newline + INDENT
+        write(part.repr_header() + "(" + inner)
+        for child in parts:
+            if type(child) is str:
+                write(repr(child))
+            elif child is DUMP_NEWLINE:
+                write(inner)
+            else:
+                write_shallow(child, write, inner, depth + 1)
+        write(newline + ")")
+    elif isinstance(part, (tuple, list)):
+        if depth == SHALLOW_DEPTH:
+            raise TooDeep()
+        write("(" if isinstance(part, tuple) else "[")
+        for i, item in enumerate(part):
+            if i:
+                write(", ")
+            if type(item) is str:
+                write(repr(item))
+            else:
+                write_shallow(item, write, newline, depth + 1)
+        if isinstance(part, list):
+            write("]")
+        else:
+            write(",)" if len(part) == 1 else ")")
+    else:
+        # text, and other values as in Python's repr of containers
+        text = part if isinstance(part, DumpText) else repr(part)
+        if "\n" in text:
+            text = text.replace("\n", newline)
+        write(text)
+
+
+def iter_deep_tree(
+    token: Any,
+    max_depth: int | None = None,
+    max_width: int | None = None,
+    chunk_size: int = CHUNK_SIZE,
+) -> Iterator[str]:
+    buffer: list[str] = []
+    write = buffer.append
+
+    # parts left to write of every open token or container, and what closes it
+    # (`None` for tokens, their closing paren is indented)
+    frames: list[Iterator[Any]] = [iter((token,))]
+    closings: list[str | None] = [""]
+    # "\n" and the indentation, by depth
+    newlines = ["\n"]
+    depth = 0
+
+    while frames:
+        for part in frames[-1]:
+            if part is DUMP_NEWLINE:
+                write(newlines[depth])
+            elif isinstance(part, str):
+                text = part if isinstance(part, DumpText) else repr(part)
+                if "\n" in text:
+                    text = text.replace("\n", newlines[depth])
+                write(text)
+            elif isinstance(part, Token):
+                parts = part.repr_parts()
+                header = part.repr_header()
+                if not parts:
+                    write(header + "()")
+                    continue
+                if max_depth is not None and depth >= max_depth:
+                    write(header + "(...)")
+                    continue
+
+                depth += 1
+                if depth == len(newlines):
+                    newlines.append(newlines[-1] + INDENT)
+                if len(parts) == 1 and isinstance(parts[0], DumpText):
+                    # a leaf, like `Rule(name)`
+                    text = parts[0]
+                    if "\n" in text:
+                        text = text.replace("\n", newlines[depth])
+                    write(header + "(" + newlines[depth] + text + newlines[depth - 1] + ")")
+                    depth -= 1
+                    continue
+
+                write(header + "(" + newlines[depth])
+                frames.append(iter(limit_width(parts, max_width)))
+                closings.append(None)
+                break
+            elif isinstance(part, (tuple, list)):
+                if isinstance(part, tuple):
+                    write("(")
+                    closings.append(",)" if len(part) == 1 else ")")
+                else:
+                    write("[")
+                    closings.append("]")
+                frames.append(iter(limit_width(container_parts(part), max_width)))
+                break
+            else:
+                # other values, as in Python's repr of containers
+                text = repr(part)
+                if "\n" in text:
+                    text = text.replace("\n", newlines[depth])
+                write(text)
+        else:
+            frames.pop()
+            closing = closings.pop()
+            if closing is None:
+                depth -= 1
+                write(newlines[depth] + ")")
+            else:
+                write(closing)
+
+        if len(buffer) >= chunk_size:
+            yield "".join(buffer)
+            buffer.clear()
+
+    if buffer:
+        yield "".join(buffer)
+
+
+def iter_tree(
+    token: Any,
+    max_depth: int | None = None,
+    max_width: int | None = None,
+    chunk_size: int = CHUNK_SIZE,
+) -> Iterator[str]:
+    return iter_trees((token,), max_depth, max_width, chunk_size)
+
+
+def iter_trees(
+    tokens: Iterable[Any],
+    max_depth: int | None = None,
+    max_width: int | None = None,
+    chunk_size: int = CHUNK_SIZE,
+) -> Iterator[str]:
+    # trees separated by blank lines, like `repr()` of a grammar
+    buffer: list[str] = []
+    write = buffer.append
+    shallow = max_depth is None and max_width is None
+
+    for i, token in enumerate(tokens):
+        if i:
+            write("\n\n")
+        if shallow:
+            start = len(buffer)
+            try:
+                write_shallow(token, write, "\n")
+            except TooDeep:
+                del buffer[start:]
+            else:
+                if len(buffer) >= chunk_size:
+                    yield "".join(buffer)
+                    buffer.clear()
+                continue
+
+        if buffer:
+            yield "".join(buffer)
+            buffer.clear()
+        yield from iter_deep_tree(token, max_depth, max_width, chunk_size)
+
+    if buffer:
+        yield "".join(buffer)
+
+
+def format_tree(
+    token: Any, max_depth: int | None = None, max_width: int | None = None
+) -> str:
+    return "".join(iter_tree(token, max_depth, max_width))
+
+
+def dump_tree(
+    fp: Writable,
+    token: Any,
+    max_depth: int | None = None,
+    max_width: int | None = None,
+) -> None:
+    write_chunks(fp, iter_tree(token, max_depth, max_width))
+
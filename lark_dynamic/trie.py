@@ -0,0 +1,102 @@
+from __future__ import annotations
+from typing import AbstractSet, Dict, FrozenSet, Iterable
+
+
+# Builds a regexp matching exactly a given set of strings, factored by common prefixes:
+#     {"cat", "car", "cart", "dog"} -> (?:ca(?:rt?|t)|dog)
+# Branches of every node start with different characters and optional parts are greedy,
+# so the longest keyword is always matched first.
+
+SPECIAL = frozenset(".^$*+?{}[]()|\\/")
+CLASS_SPECIAL = frozenset("[]^-\\/")
+ESCAPES = {"\n": "\\n", "\t": "\\t", "\r": "\\r", "\f": "\\f"}
+
+# patterns of already rendered branches are kept by the `KeywordSet` (and the sets made
+# from it by `add`/`remove`), so edited sets only render the branches that differ.
+# Small branches are cheaper to render again than to keep
+BranchCache = Dict[FrozenSet[str], str]
+CACHED_BRANCH_SIZE = 16
+
+
+def escape_char(char: str, special: AbstractSet[str] = SPECIAL) -> str:
+    if char in special:
+        return "\\" + char
+    if char in ESCAPES:
+        return ESCAPES[char]
+    if not char.isprintable():
+        code = ord(char)
+        if code < 0x100:
+            return f"\\x{code:02x}"
+        if code < 0x10000:
+            return f"\\u{code:04x}"
+        return f"\\U{code:08x}"
+    return char
+
+
+def char_class(chars: Iterable[str]) -> str:
+    codes = sorted(map(ord, chars))
+    if len(codes) == 1:
+        return escape_char(chr(codes[0]))
+
+    parts: list[str] = []
+    start = end = codes[0]
+    for code in [*codes[1:], None]:
+        if code is not None and code == end + 1:
+            end = code
+            continue
+        # runs of 3 or more characters are written as ranges
+        if end - start >= 2:
+            parts.append(
+                escape_char(chr(start), CLASS_SPECIAL)
+                + "-"
+                + escape_char(chr(end), CLASS_SPECIAL)
+            )
+        else:
+            parts.extend(
+                escape_char(chr(char), CLASS_SPECIAL) for char in range(start, end + 1)
+            )
+        if code is not None:
+            start = end = code
+
+    return "[" + "".join(parts) + "]"
+
+
+def trie_pattern(words: FrozenSet[str], cache: BranchCache | None = None) -> str:
+    # `words` are suffixes of a single node, an empty suffix means a keyword can end here
+    store = cache if len(words) >= CACHED_BRANCH_SIZE else None
+    if store is not None:
+        pattern = store.get(words)
+        if pattern is not None:
+            return pattern
+
+    branches: dict[str, set[str]] = {}
+    for word in words:
+        if word:
+            branches.setdefault(word[0], set()).add(word[1:])
+
+    # keywords ending right after their first character are merged into a class
+    leaves = [char for char, rest in branches.items() if rest == {""}]
+    alternatives = [
+        escape_char(char) + trie_pattern(frozenset(rest), cache)
+        for char, rest in sorted(branches.items())
+        if rest != {""}
+    ]
+    if leaves:
+        alternatives.append(char_class(leaves))
+
+    if len(alternatives) > 1:
+        pattern = "(?:" + "|".join(alternatives) + ")"
+    elif alternatives:
+        pattern = alternatives[0]
+        if "" in words and not leaves:
+            # a branch is a sequence, it has to be grouped to be made optional
+            pattern = "(?:" + pattern + ")"
+    else:
+        pattern = ""
+
+    if "" in words and alternatives:
+        pattern += "?"
+
+    if store is not None:
+        store[words] = pattern
+    return pattern
@@ -1,5 +1,5 @@
 from __future__ import annotations
-from typing import Iterable, Sequence
+from typing import Any, Callable, Hashable, Iterable, Sequence
 
 
 def wrap(parens: Sequence[str], content: Iterable[str]) -> Iterable[str]:
@@ -34,8 +34,59 @@ def render_all(
         yield Token.render_str(renderable, context)
 
 
-def add_tab(text: str) -> str:
-    return ("\n" + text).replace("\n", "\n    ") + "\n" if text else ""
+def separated_parts(parts: Sequence[Renderable], sep: str) -> list[Renderable]:
+    # `sep` is `Raw` for rendering and `DumpText` for tree dumps
+    if not parts:
+        return []
+    result: list[Renderable] = [sep] * (2 * len(parts) - 1)
+    result[::2] = parts
+    return result
+
+
+def get_children(node: Renderable) -> Sequence[Renderable]:
+    if isinstance(node, (tuple, list)):
+        return node
+    if isinstance(node, Token):
+        return node.get_children()
+    return ()
+
+
+def rebuild_tree(
+    token: Renderable,
+    rebuild: Callable[[Renderable, list[Renderable]], Renderable],
+    children_of: Callable[[Renderable], Sequence[Renderable]] = get_children,
+) -> Renderable:
+    # post-order traversal: `rebuild` gets every node with its rebuilt children,
+    # shared subtrees are rebuilt once
+    rebuilt: dict[int, Renderable] = {}
+    # keeps the original nodes alive, so their ids aren't reused
+    originals: list[Renderable] = []
+
+    stack: list[tuple[Renderable, bool]] = [(token, False)]
+    while stack:
+        node, expanded = stack.pop()
+        if id(node) in rebuilt:
+            continue
+
+        children = children_of(node)
+        if not expanded:
+            stack.append((node, True))
+            stack.extend((child, False) for child in children)
+            continue
+
+        rebuilt[id(node)] = rebuild(node, [rebuilt[id(child)] for child in children])
+        originals.append(node)
+
+    return rebuilt[id(token)]
+
+
+def freeze(value: Hashable | list[Any] | tuple[Any, ...]) -> Hashable:
+    # makes renderables hashable, lists are distinguished from tuples
+    if isinstance(value, list):
+        return (list, tuple(map(freeze, value)))
+    if isinstance(value, tuple):
+        return tuple(map(freeze, value))
+    return value
 
 
 def is_rule(s: str) -> bool:
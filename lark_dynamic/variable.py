@@ -1,28 +1,350 @@
-from typing import Callable, Iterable
+from __future__ import annotations
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Hashable,
+    Iterable,
+    Iterator,
+    Mapping,
+    Sequence,
+    Tuple,
+)
+from contextlib import contextmanager
+from contextvars import ContextVar
+from importlib import import_module
 
 from .constants import ContextType
-from .token import Renderable, Token
+from .token import DUMP_NEWLINE, DumpText, Raw, Renderable, Token
+
+
+class DeferredContext(Dict[str, Any]):
+    # variables rendered with this context yield a `Hole` instead of their content
+    pass
+
+
+class Hole(Raw):
+    variable: Variable
+
+    def __new__(cls, variable: Variable) -> Hole:
+        hole = super().__new__(cls, "")
+        hole.variable = variable
+        return hole
+
+
+# values of variables during a single render, with the context keys they read, by variable id
+# (variables are kept, so ids of variables made by callbacks aren't reused).
+# A variable used in many places calls its callback once
+Memo = Dict[int, Tuple["Variable", "Dependencies", Renderable]]
+
+render_memo: ContextVar[Memo | None] = ContextVar("render_memo", default=None)
+
+
+@contextmanager
+def memo_scope(memo: Memo | None = None) -> Iterator[None]:
+    # `memo` continues an earlier scope, e.g. between chunks of a streamed render
+    token = render_memo.set({} if memo is None else memo)
+    try:
+        yield
+    finally:
+        render_memo.reset(token)
 
 
 class Variable(Token):
-    def __init__(self, callback: Callable[[ContextType], Renderable]):
+    # `pure=False` calls the callback every time the variable is rendered,
+    # with `cache_size` results are also kept between renders, by the context keys the callback read
+    __slots__ = ("callback", "pure", "cache_size", "cache")
+
+    dynamic = True
+
+    def __init__(
+        self,
+        callback: Callable[[ContextType], Renderable],
+        pure: bool = True,
+        cache_size: int | None = None,
+    ):
         self.callback = callback
+        self.pure = pure
+        self.cache_size = cache_size
+        # made in advance, so threads rendering the variable share a single (locked) cache
+        self.cache: GenerationCache[Renderable] | None = (
+            GenerationCache(cache_size) if cache_size else None
+        )
 
     def render(self, context: ContextType) -> Iterable[str]:
-        yield from Token.render_str(self.callback(context), context)
+        if isinstance(context, DeferredContext):
+            yield Hole(self)
+            return
+        current = profiler.get()
+        value = self.evaluate(context) if current is None else current.evaluate(self, context)
+        yield from Token.render_str(value, context)
+
+    def render_parts(self, context: ContextType) -> Sequence[Renderable]:
+        if isinstance(context, DeferredContext):
+            return [Hole(self)]
+        current = profiler.get()
+        if current is None:
+            return [self.evaluate(context)]
+        return [current.evaluate(self, context)]
+
+    def evaluate(self, context: ContextType) -> Renderable:
+        memo = render_memo.get()
+        if not self.pure:
+            if isinstance(context, TrackingContext):
+                context.record_impure()
+            return self.call(context)
+        if memo is None and not self.cache_size:
+            return self.call(context)
+
+        if memo is not None and id(self) in memo:
+            _, dependencies, result = memo[id(self)]
+            if isinstance(context, TrackingContext):
+                context.replay(dependencies)
+        elif self.cache is not None:
+            dependencies, result = self.cache.get_or_compute(context, self.call)
+        elif not isinstance(context, TrackingContext):
+            # nothing uses the keys read, they would only be replayed from the memo,
+            # where `None` (the whole context) is always correct
+            result = self.call(context)
+            dependencies = None
+        else:
+            tracked = TrackingContext(context)
+            result = self.call(tracked)
+            dependencies = tracked.dependencies()
+
+        if memo is not None:
+            memo[id(self)] = (self, dependencies, result)
+        return result
+
+    def call(self, context: ContextType) -> Renderable:
+        current = profiler.get()
+        if current is not None:
+            current.called(self)
+        return self.callback(context)
+
+    def __getstate__(self) -> dict[str, Any]:
+        # cached results are not pickled
+        return {
+            slot: getattr(self, slot)
+            for cls in type(self).__mro__
+            for slot in getattr(cls, "__slots__", ())
+            if slot != "cache" and hasattr(self, slot)
+        }
+
+    def __setstate__(self, state: dict[str, Any]) -> None:
+        for slot, value in state.items():
+            setattr(self, slot, value)
+        self.cache = GenerationCache(self.cache_size) if self.cache_size else None
+
+    def get_key(self) -> tuple[Hashable, ...]:
+        return (self.callback, self.pure, self.cache_size)
 
     def repr_children(self) -> str:
         return str(self.callback.__doc__ if self.callback.__doc__ else self.callback)
 
 
+# Subclasses compute their value in `evaluate`, which is also their `callback`
+
+
 class BoolVariable(Variable):
+    __slots__ = ("function", "key", "default")
+
     def __init__(
         self, callback: Callable[[bool], Renderable], key: str, default: bool = False
     ):
-        self.callback = lambda context: callback(bool(context.get(key, default)))
+        super().__init__(self.evaluate)
+        self.function = callback
+        self.key = key
+        self.default = default
+
+    def evaluate(self, context: ContextType) -> Renderable:
+        return self.function(bool(context.get(self.key, self.default)))
+
+    def get_key(self) -> tuple[Hashable, ...]:
+        return (self.function, self.key, self.default)
+
+    def repr_children(self) -> str:
+        return f"{self.key}: {self.function.__doc__ or self.function}"
+
+
+# Declarative variables: unlike callbacks (which are often lambdas),
+# these can be pickled, so grammars using them can be sent to other processes
+
+
+class Lookup(Variable):
+    # a value from the context, `default` is used when the key is missing
+    __slots__ = ("key", "default")
+
+    def __init__(self, key: str, default: Renderable | None = None):
+        super().__init__(self.evaluate)
+        self.key = key
+        self.default = default
+
+    def evaluate(self, context: ContextType) -> Renderable:
+        if self.default is None:
+            return context[self.key]
+        return context.get(self.key, self.default)
+
+    def get_children(self) -> Sequence[Renderable]:
+        return () if self.default is None else (self.default,)
+
+    def get_key(self) -> tuple[Hashable, ...]:
+        return (self.key,)
+
+    def replace_children(self, children: Sequence[Renderable]) -> Lookup:
+        return Lookup(self.key, children[0] if children else None)
+
+    def repr_children(self) -> str:
+        return self.key
+
+
+class BoolSwitch(BoolVariable):
+    # `BoolVariable` choosing between two tokens, made by `makeBoolVariable`
+    __slots__ = ("true", "false")
+
+    def __init__(
+        self, key: str, true: Renderable, false: Renderable, default: bool = False
+    ):
+        super().__init__(self.choose, key, default)
+        self.true = true
+        self.false = false
+
+    def choose(self, value: bool) -> Renderable:
+        return self.true if value else self.false
+
+    def evaluate(self, context: ContextType) -> Renderable:
+        return self.true if context.get(self.key, self.default) else self.false
+
+    def get_children(self) -> Sequence[Renderable]:
+        return (self.true, self.false)
+
+    def get_key(self) -> tuple[Hashable, ...]:
+        return (self.key, self.default)
+
+    def replace_children(self, children: Sequence[Renderable]) -> BoolSwitch:
+        return BoolSwitch(self.key, children[0], children[1], self.default)
+
+    def repr_parts(self) -> Sequence[Renderable]:
+        return [DumpText(self.key), DUMP_NEWLINE, self.true, DUMP_NEWLINE, self.false]
+
+
+class Switch(Variable):
+    # one of `cases` by the value of a context key, `default` is used for other values
+    __slots__ = ("key", "cases", "default")
+
+    def __init__(
+        self,
+        key: str,
+        cases: Mapping[Hashable, Renderable],
+        default: Renderable | None = None,
+    ):
+        super().__init__(self.evaluate)
+        self.key = key
+        self.cases = dict(cases)
+        self.default = default
+
+    def evaluate(self, context: ContextType) -> Renderable:
+        value = context.get(self.key)
+        try:
+            return self.cases[value]
+        except (KeyError, TypeError):
+            if self.default is None:
+                raise KeyError(
+                    f"No case for {self.key}={value!r} and no default"
+                ) from None
+            return self.default
+
+    def get_children(self) -> Sequence[Renderable]:
+        cases = tuple(self.cases.values())
+        return cases if self.default is None else (*cases, self.default)
+
+    def get_key(self) -> tuple[Hashable, ...]:
+        return (self.key, tuple(self.cases), self.default is None)
+
+    def replace_children(self, children: Sequence[Renderable]) -> Switch:
+        cases = dict(zip(self.cases, children))
+        default = None if self.default is None else children[-1]
+        return Switch(self.key, cases, default)
+
+    def repr_parts(self) -> Sequence[Renderable]:
+        parts: list[Renderable] = [DumpText(self.key)]
+        for value, case in self.cases.items():
+            parts.extend((DumpText(f"\n{value!r}: "), case))
+        return parts
+
+
+class CallableRef:
+    # a picklable reference to an importable function: "package.module:qualified.name",
+    # can be used as a callback of `Variable` and `BoolVariable`
+    __slots__ = ("path", "function")
+
+    def __init__(self, path: str):
+        if ":" not in path:
+            raise ValueError(f"Invalid callable path: '{path}', expected 'module:name'")
+        self.path = path
+        self.function: Callable[..., Renderable] | None = None
+
+    def resolve(self) -> Callable[..., Renderable]:
+        if self.function is None:
+            module_name, _, name = self.path.partition(":")
+            function: Any = import_module(module_name)
+            for attr in name.split("."):
+                function = getattr(function, attr)
+            self.function = function
+        return self.function
+
+    def __call__(self, *args: Any) -> Renderable:
+        return self.resolve()(*args)
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, CallableRef) and self.path == other.path
+
+    def __hash__(self) -> int:
+        return hash(self.path)
+
+    def __reduce__(self) -> tuple[Any, ...]:
+        return (CallableRef, (self.path,))
+
+    def __repr__(self) -> str:
+        return f"CallableRef({self.path!r})"
 
 
 def makeBoolVariable(
     key: str, true: Renderable, false: Renderable, default: bool = False
-) -> BoolVariable:
-    return BoolVariable(lambda value: true if value else false, key, default)
+) -> BoolSwitch:
+    return BoolSwitch(key, true, false, default)
+
+
+def split_holes(pieces: Iterable[str]) -> list[str | Variable]:
+    parts: list[str | Variable] = []
+    static: list[str] = []
+
+    for piece in pieces:
+        if isinstance(piece, Hole):
+            parts.append("".join(static))
+            parts.append(piece.variable)
+            static = []
+        else:
+            static.append(piece)
+
+    parts.append("".join(static))
+    return parts
+
+
+def fill_holes(
+    parts: list[str | Variable], context: ContextType, flat: bool = False
+) -> Iterable[str]:
+    for part in parts:
+        if isinstance(part, Variable):
+            if flat:
+                yield render_flat(part, context)
+            else:
+                yield from part.render(context)
+        else:
+            yield part
+
+
+from .cache import GenerationCache
+from .tracking import Dependencies, TrackingContext
+from .profiling import profiler
+from .renderer import render_flat
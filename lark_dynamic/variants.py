@@ -0,0 +1,146 @@
+from __future__ import annotations
+from concurrent.futures import ProcessPoolExecutor
+from itertools import product
+from typing import Any, Iterable, Iterator, Mapping, Sequence
+import multiprocessing
+
+from .constants import ContextType
+from .tracking import TrackingContext
+
+
+class Unassigned(Exception):
+    def __init__(self, key: str):
+        super().__init__(key)
+        self.key = key
+
+
+class BranchingContext(TrackingContext):
+    # raises `Unassigned` when a key from `domains` is read before it got a value,
+    # so every value of that key can be explored separately
+    def __init__(self, context: ContextType, domains: Mapping[str, Sequence[Any]]):
+        super().__init__(context)
+        self.domains = domains
+
+    def record(self, key: str) -> None:
+        if key in self.domains and not dict.__contains__(self, key):
+            raise Unassigned(key)
+        super().record(key)
+
+
+def iter_variables(token: Renderable) -> Iterator[Variable]:
+    stack: list[Renderable] = [token]
+    while stack:
+        current = stack.pop()
+        if isinstance(current, (tuple, list)):
+            stack.extend(current)
+        elif isinstance(current, Variable):
+            yield current
+        elif isinstance(current, Token):
+            stack.extend(current.get_children())
+
+
+def find_dependencies(
+    roots: Iterable[Renderable],
+    domains: Mapping[str, Sequence[Any]],
+    context: ContextType,
+) -> set[str]:
+    context = {key: value for key, value in context.items() if key not in domains}
+    relevant: set[str] = set()
+    seen: set[tuple[int, tuple[tuple[str, int], ...]]] = set()
+
+    stack: list[tuple[Renderable, dict[str, Any]]] = [(root, {}) for root in roots]
+    while stack:
+        token, assigned = stack.pop()
+
+        for variable in iter_variables(token):
+            seen_key = (
+                id(variable),
+                tuple((key, id(value)) for key, value in sorted(assigned.items())),
+            )
+            if seen_key in seen:
+                continue
+            seen.add(seen_key)
+
+            branching = BranchingContext({**context, **assigned}, domains)
+            try:
+                result = variable.evaluate(branching)
+            except Unassigned as error:
+                relevant.add(error.key)
+                for value in domains[error.key]:
+                    stack.append((variable, {**assigned, error.key: value}))
+                continue
+
+            if branching.reads_all:
+                return set(domains)
+
+            relevant.update(key for key in branching.accessed if key in domains)
+            stack.append((result, assigned))
+
+    return relevant
+
+
+worker_grammar: Grammar | None = None
+
+
+def init_worker(grammar: Grammar) -> None:
+    global worker_grammar
+    worker_grammar = grammar
+
+
+def generate_variant(context: ContextType) -> str:
+    assert worker_grammar is not None
+    return worker_grammar.generate(**context)
+
+
+def generate_variants(
+    grammar: Grammar,
+    domains: Mapping[str, Iterable[Any]],
+    processes: int = 1,
+    context: ContextType | None = None,
+) -> dict[str, list[dict[str, Any]]]:
+    context = context or {}
+    domain_values = {key: list(values) for key, values in domains.items()}
+
+    wrapper = grammar.use_wrapper()
+    roots: list[Renderable] = [
+        *wrapper.terminals.values(),
+        *wrapper.rules.values(),
+        *wrapper.directives,
+        *wrapper.templates.values(),
+    ]
+    relevant = find_dependencies(roots, domain_values, context)
+
+    keys = [key for key in domain_values if key in relevant]
+    variants = [
+        dict(zip(keys, values))
+        for values in product(*(domain_values[key] for key in keys))
+    ]
+    contexts = [{**context, **variant} for variant in variants]
+
+    if processes > 1 and len(contexts) > 1:
+        # forked workers inherit the grammar, so it doesn't have to be picklable
+        mp_context = multiprocessing.get_context(
+            "fork" if "fork" in multiprocessing.get_all_start_methods() else None
+        )
+        with ProcessPoolExecutor(
+            processes, mp_context, initializer=init_worker, initargs=(grammar,)
+        ) as executor:
+            texts = list(
+                executor.map(
+                    generate_variant,
+                    contexts,
+                    chunksize=max(1, len(contexts) // (processes * 4)),
+                )
+            )
+    else:
+        texts = [grammar.generate(**variant_context) for variant_context in contexts]
+
+    result: dict[str, list[dict[str, Any]]] = {}
+    for text, variant in zip(texts, variants):
+        result.setdefault(text, []).append(variant)
+    return result
+
+
+from .grammar import Grammar
+from .token import Renderable, Token
+from .variable import Variable
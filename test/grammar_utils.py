@@ -0,0 +1,22 @@
+from __future__ import annotations
+from typing import Any
+
+from lark_dynamic import Grammar, Many, RegExp, makeBoolVariable
+
+
+def make_grammar(reverse: bool = False, **kwargs: Any) -> Grammar:
+    # a small grammar with a variable, which Lark can build parsers of:
+    # signed numbers with `flag=True`, words otherwise.
+    # `reverse` adds the same definitions in the reverse order
+    g = Grammar(**kwargs)
+    definitions = [
+        ("start", lambda: Many(g.item)),
+        ("item", lambda: makeBoolVariable("flag", (g.SIGN, g.NUMBER), g.WORD)),
+        ("SIGN", lambda: "-"),
+        ("NUMBER", lambda: RegExp("[0-9]+")),
+        ("WORD", lambda: RegExp("[a-z]+")),
+    ]
+    for name, make in reversed(definitions) if reverse else definitions:
+        setattr(g, name, make())
+    g.make_directive("ignore", '" "')
+    return g
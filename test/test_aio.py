@@ -0,0 +1,105 @@
+from __future__ import annotations
+import asyncio
+
+from lark_dynamic import AsyncVariable, Grammar, Variable
+
+import pytest
+
+
+class FlagService:
+    # stands in for a remote feature flag service
+    def __init__(self, delay: float = 0.05):
+        self.delay = delay
+        self.calls: list[str] = []
+        self.active = 0
+        self.max_active = 0
+
+    async def get(self, name: str, context) -> bool:
+        self.calls.append(name)
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        await asyncio.sleep(self.delay)
+        self.active -= 1
+        return name in context.get("enabled", ())
+
+
+def make_grammar(service: FlagService, **kwargs) -> Grammar:
+    async def signed(context):
+        return ["-"] if await service.get("signed", context) else "+"
+
+    async def hex_numbers(context):
+        return g.HEX if await service.get("hex", context) else g.DEC
+
+    g = Grammar(**kwargs)
+    g.start = AsyncVariable(signed), g.number
+    g.number = AsyncVariable(hex_numbers) | AsyncVariable(signed)
+    g.HEX = "0x"
+    g.DEC = "0"
+    return g
+
+
+class TestClass:
+    @pytest.mark.parametrize("flat", [False, True])
+    def test_agenerate(self, flat):
+        service = FlagService()
+        g = make_grammar(service, flat=flat)
+
+        text = asyncio.run(g.agenerate(enabled=["signed"]))
+        assert text.split("\n")[-2:] == ['start: ["-"] number', 'number: DEC | ["-"]']
+
+        # callbacks are awaited concurrently, equal ones once
+        assert sorted(service.calls) == ["hex", "signed"]
+        assert service.max_active == 2
+
+    def test_sync_generate(self):
+        with pytest.raises(RuntimeError):
+            make_grammar(FlagService()).generate()
+
+    def test_nested(self):
+        async def outer(context):
+            return AsyncVariable(inner), "b"
+
+        async def inner(context):
+            return Variable(lambda context: context["value"])
+
+        g = Grammar(cache_size=4)
+        g.start = AsyncVariable(outer)
+        assert asyncio.run(g.agenerate(value="a")) == 'start: ("a" "b")'
+
+    def test_timeout(self):
+        async def slow(context):
+            await asyncio.sleep(1)
+            return "slow"
+
+        g = Grammar()
+        g.start = AsyncVariable(slow, timeout=0.01, default="fallback")
+        assert asyncio.run(g.agenerate()) == 'start: "fallback"'
+
+        g.use_wrapper().replace("start", AsyncVariable(slow, timeout=0.01))
+        with pytest.raises(asyncio.TimeoutError):
+            asyncio.run(g.agenerate())
+
+    def test_concurrent_renders(self):
+        g = make_grammar(FlagService())
+
+        async def main():
+            ticks = 0
+
+            async def tick():
+                nonlocal ticks
+                while True:
+                    ticks += 1
+                    await asyncio.sleep(0.001)
+
+            ticker = asyncio.ensure_future(tick())
+            texts = await asyncio.gather(
+                g.agenerate(enabled=["hex"]), g.agenerate(enabled=["signed"])
+            )
+            ticker.cancel()
+            return texts, ticks
+
+        texts, ticks = asyncio.run(main())
+        assert texts[0].endswith('number: HEX | "+"')
+        assert texts[1].endswith('number: DEC | ["-"]')
+        # the loop kept running while the callbacks were awaited
+        assert ticks > 5
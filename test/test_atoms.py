@@ -1,6 +1,7 @@
 from __future__ import annotations
+import re
 
-from lark_dynamic import Literal, RegExp
+from lark_dynamic import Grammar, KeywordSet, Literal, RegExp
 from lark_dynamic.atoms import Prerendered, Rule, Terminal
 from lark_dynamic.constants import ContextType
 from lark_dynamic.definitions import TemplateDef
@@ -86,3 +87,60 @@ class TestClass:
         assert token.render(context) == NotImplemented
 
         str(token)
+
+    def test_keyword_set(self):
+        keywords = KeywordSet(["cat", "car", "cart", "dog"])
+
+        assert render_token(keywords) == "/(?:ca(?:rt?|t)|dog)/"
+        assert render_token(keywords.i) == "/(?:ca(?:rt?|t)|dog)/i"
+        assert render_token(KeywordSet(["a", "ab", "abc"])) == "/a(?:bc?)?/"
+        assert render_token(KeywordSet(map(str, range(10)))) == "/[0-9]/"
+
+        # the longest keyword is matched first
+        assert re.match(KeywordSet(["a", "ab", "abc"]).get_pattern(), "abcd")[0] == "abc"
+
+        assert keywords.add("cow").keywords == {"cat", "car", "cart", "dog", "cow"}
+        assert keywords.remove("cart").get_pattern() == "(?:ca[rt]|dog)"
+        assert keywords.get_pattern() is keywords.get_pattern()
+
+        with pytest.raises(ValueError):
+            KeywordSet([])
+        with pytest.raises(ValueError):
+            KeywordSet(["a", ""])
+
+    def test_keyword_set_branches(self):
+        words = [f"word{i}" for i in range(100)]
+        keywords = KeywordSet(words)
+        pattern = keywords.get_pattern()
+
+        # large branches are kept by the set, and shared with the sets made from it
+        assert pattern in keywords.branches.values()
+        added = keywords.add("other")
+        assert added.branches is keywords.branches
+        assert added.get_pattern() == "(?:other|" + pattern + ")"
+        assert KeywordSet(words).branches is not keywords.branches
+
+    def test_keyword_set_escaping(self):
+        keywords = ["a.b", "/", "\\", "]", "-", "^x", "\n", "(", "é", "\x00", '"', "'"]
+        pattern = KeywordSet(keywords).get_pattern()
+
+        for keyword in keywords:
+            assert re.fullmatch(pattern, keyword)
+        assert not re.fullmatch(pattern, "axb")
+
+        lark = pytest.importorskip("lark")
+
+        g = Grammar()
+        g.start = g.KEYWORD
+        g.KEYWORD = KeywordSet(keywords)
+        parser = lark.Lark(g.generate(), parser="lalr")
+
+        for keyword in keywords:
+            assert parser.parse(keyword).children[0] == keyword
+
+        g = Grammar()
+        g.start = g.KEYWORD
+        g.KEYWORD = KeywordSet(["Select", "SET"], "i")
+        parser = lark.Lark(g.generate(), parser="lalr")
+
+        assert parser.parse("sElEcT").children[0] == "sElEcT"
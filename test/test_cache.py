@@ -0,0 +1,177 @@
+from __future__ import annotations
+
+from lark_dynamic import Grammar, Modifier, Variable, makeBoolVariable
+from lark_dynamic.cache import GenerationCache, LRUCache
+from lark_dynamic.tracking import TrackingContext
+
+import pytest
+
+
+class TestClass:
+    def test_lru(self):
+        cache: LRUCache[str, int] = LRUCache(2)
+
+        cache.put("a", 1)
+        cache.put("b", 2)
+
+        assert cache.get("a") == 1
+
+        cache.put("c", 3)
+
+        assert cache.get("b") is None
+        assert cache.get("a") == 1
+        assert cache.get("c") == 3
+        assert cache.info() == (3, 1, 2, 2)
+
+        with pytest.raises(ValueError):
+            LRUCache(0)
+
+    def test_get_or_compute(self):
+        cache: GenerationCache[str] = GenerationCache(4)
+        calls = []
+
+        def compute(context):
+            calls.append(context)
+            return context.get("a", "")
+
+        assert cache.get_or_compute({"a": "x", "b": 1}, compute) == (frozenset({"a"}), "x")
+        outer = TrackingContext({"a": "x", "b": 2})
+        assert cache.get_or_compute(outer, compute) == (frozenset({"a"}), "x")
+        # reads of the kept result are replayed
+        assert len(calls) == 1 and outer.dependencies() == {"a"}
+
+        def impure(context):
+            context.record_impure()
+            return "y"
+
+        outer = TrackingContext({})
+        assert cache.get_or_compute(outer, impure) == (frozenset(), "y")
+        assert outer.impure and len(cache) == 1
+
+    def test_generate_cache(self):
+        g = Grammar(cache_size=4)
+        g.rule = makeBoolVariable("flag", "yes", "no")
+
+        cache = g.use_wrapper().cache
+        assert cache is not None
+
+        assert g.generate(flag=True) == 'rule: "yes"'
+        assert g.generate(flag=True) == 'rule: "yes"'
+        assert g.generate(flag=False) == 'rule: "no"'
+        assert cache.info().hits == 1
+        assert cache.info().misses == 2
+
+        # unhashable contexts are rendered, but never cached
+        assert g.generate(flag=[]) == 'rule: "no"'
+        assert cache.info().currsize == 2
+
+        assert Grammar().use_wrapper().cache is None
+
+    def test_invalidation(self):
+        g = Grammar(cache_size=4)
+        g.rule = "a"
+        wrapper = g.use_wrapper()
+
+        assert g.generate() == 'rule: "a"'
+
+        wrapper.extend("rule", "b")
+        assert g.generate() == 'rule: "a" | "b"'
+
+        wrapper.replace("rule", "c")
+        assert g.generate() == 'rule: "c"'
+
+        wrapper.edit("rule", Modifier.INLINE_SINGLE, 2)
+        assert g.generate() == '?rule.2: "c"'
+
+        g.TERM = "d"
+        g.template[g.x] = g.x
+        g.make_directive("ignore", "TERM")
+
+        assert g.generate().split("\n") == [
+            'TERM: "d"',
+            "",
+            '?rule.2: "c"',
+            "",
+            "%ignore TERM",
+            "",
+            "template{x}: x",
+        ]
+
+    def test_dependencies(self):
+        g = Grammar(cache_size=4)
+        g.rule = makeBoolVariable("flag", "yes", "no")
+        g.other = "a"
+
+        cache = g.use_wrapper().cache
+        assert cache is not None
+
+        assert g.use_wrapper().get_dependencies({}) == {"flag"}
+
+        assert g.generate(flag=True, request_id=1) == g.generate(flag=True, request_id=2)
+        assert g.generate(flag=False, request_id=3) != g.generate(flag=True)
+
+        assert cache.info().hits == 2
+        assert cache.info().misses == 2
+
+    def test_segments(self):
+        calls = []
+
+        def variable(name):
+            def callback(context):
+                calls.append(name)
+                return context.get(name, "default")
+
+            return Variable(callback)
+
+        g = Grammar(cache_size=4)
+        g.first = variable("a")
+        g.second = variable("b")
+        g.third = "static"
+        wrapper = g.use_wrapper()
+
+        g.generate(a="x", b="y")
+        assert calls == ["a", "b"]
+
+        # only the edited definition is rendered again
+        wrapper.extend("second", "z")
+        assert g.generate(a="x", b="y").split("\n") == [
+            'first: "x"',
+            'second: "y" | "z"',
+            'third: "static"',
+        ]
+        assert calls == ["a", "b", "b"]
+
+        # only definitions reading the changed key are rendered again
+        g.generate(a="x", b="w")
+        assert calls == ["a", "b", "b", "b"]
+
+        # reused segments still count as reads for the grammar cache
+        wrapper.edit("third", priority=2)
+        assert g.generate(a="x", b="w") == g.generate(a="x", b="w", c="unused")
+        assert g.generate(a="v", b="w").startswith('first: "v"')
+        assert calls == ["a", "b", "b", "b", "a"]
+
+    def test_segments_splicing(self):
+        grammars = [Grammar(cache_size=4), Grammar(), Grammar(cache_size=4, flat=True)]
+        for g in grammars:
+            g.first = makeBoolVariable("a", "x", "y")
+            g.second = "static"
+
+        def check(**context):
+            texts = [g.generate(**context) for g in grammars]
+            assert texts[0] == texts[1] == texts[2]
+
+        check(a=True, b=True)
+
+        for g in grammars:
+            # now depends on another key
+            g.use_wrapper().replace("second", makeBoolVariable("b", "p", "q"))
+        check(a=True, b=True)
+        check(a=True, b=False)
+        check(a=False, b=False)
+
+        for g in grammars:
+            g.use_wrapper().extend("first", "z")
+            g.third = g.first
+        check(a=True, b=False)
+        check(a=False, b=False)
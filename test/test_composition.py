@@ -0,0 +1,169 @@
+from __future__ import annotations
+
+from lark_dynamic import Grammar, Many, Option, Variable, makeBoolVariable
+from lark_dynamic.serialization import dumps, loads
+
+import pytest
+
+
+def make_common(calls: list | None = None) -> Grammar:
+    common = Grammar()
+    common.expr = Option(common.NUMBER, common._paren, common.call[common.NUMBER])
+    common._paren = "(", common.expr, ")"
+    common.call[common.arg] = common.arg, "()"
+    common.NUMBER = makeBoolVariable("hex", common.HEX, common.DEC)
+    common.HEX = "0x"
+    common.DEC = Variable(lambda context: calls.append(1) or "0") if calls is not None else "0"
+    common.make_directive("import", "common.WS")
+    common.make_directive("ignore", "WS")
+    return common
+
+
+class TestClass:
+    def test_include(self):
+        common = make_common()
+        g = Grammar()
+        g.start = Many(g.ex__expr)
+        g.include(common, "ex")
+        g.make_directive("ignore", "EX__WS")
+
+        assert g.generate().split("\n") == [
+            "start: (ex__expr)+",
+            "",
+            "EX__NUMBER: EX__DEC",
+            'EX__HEX: "0x"',
+            'EX__DEC: "0"',
+            "ex__expr: EX__NUMBER | _ex__paren | ex__call{EX__NUMBER}",
+            '_ex__paren: "(" ex__expr ")"',
+            "ex__call{ex__arg}: ex__arg \"()\"",
+            "%import common.WS -> EX__WS",
+            "%ignore EX__WS",
+        ]
+        assert "EX__NUMBER: EX__HEX" in g.generate(hex=True)
+
+        lark = pytest.importorskip("lark")
+        tree = lark.Lark(g.generate()).parse("(0) 0")
+        assert [child.data for child in tree.children] == ["ex__expr", "ex__expr"]
+
+        other = Grammar()
+        other.start = other.NUMBER
+        other.include(common)
+        assert "\nNUMBER: DEC\n" in other.generate()
+        assert "%ignore" not in other.generate()
+
+    @pytest.mark.parametrize("flat", [False, True])
+    def test_generate_many(self, flat):
+        shared = Grammar()
+        shared.kw = makeBoolVariable("flag", "yes", "no")
+        g = Grammar(flat=flat)
+        g.start = g.s__kw
+        g.include(shared, "s")
+
+        texts = g.generate_many([{"flag": True}, {"flag": False}])
+        # outputs with holes in place of variables aren't kept
+        assert not shared.__fragments__["s"].outputs.data
+        assert 's__kw: "yes"' in texts[0] and 's__kw: "no"' in texts[1]
+        assert texts == [g.generate(flag=True), g.generate(flag=False)]
+
+    def test_shared_fragment(self):
+        calls: list[int] = []
+        common = make_common(calls)
+        grammars = []
+        for _ in range(3):
+            g = Grammar(cache_size=4)
+            g.start = g.ex__expr
+            g.include(common, "ex")
+            grammars.append(g)
+
+        texts = [g.generate() for g in grammars]
+        assert texts[0] == texts[1] == texts[2]
+        # the included grammar is rendered once for all of them
+        assert len(calls) == 1
+        assert set(common.__fragments__) == {"ex"}
+
+    def test_invalidation(self):
+        common = make_common()
+        own_calls: list[int] = []
+
+        g = Grammar(cache_size=4)
+        g.start = Variable(lambda context: own_calls.append(1) or g.ex__expr)
+        g.include(common, "ex")
+        unrelated = Grammar(cache_size=4)
+        unrelated.start = "a"
+        unrelated.generate()
+
+        assert 'EX__DEC: "0"' in g.generate()
+        common.use_wrapper().replace("DEC", "1")
+        assert 'EX__DEC: "1"' in g.generate()
+        common.ZERO = "0"
+        assert 'EX__ZERO: "0"' in g.generate()
+
+        # only the include is rendered again
+        assert len(own_calls) == 1
+        assert unrelated.use_wrapper().cache.info().currsize == 1
+
+    def test_nested(self):
+        inner = Grammar()
+        inner.item = inner.WORD
+        inner.WORD = "w"
+
+        outer = Grammar()
+        outer.list = Many(outer.in__item)
+        outer.include(inner, "in")
+
+        g = Grammar()
+        g.start = g.out__list
+        g.include(outer, "out")
+        text = g.generate()
+        assert "out__list: (out__in__item)+" in text
+        assert "out__in__item: OUT__IN__WORD" in text
+
+        inner.use_wrapper().replace("WORD", "x")
+        assert 'OUT__IN__WORD: "x"' in g.generate()
+
+        with pytest.raises(ValueError):
+            inner.include(g, "loop")
+        with pytest.raises(ValueError):
+            g.include(inner, "Bad")
+
+    def test_pickle(self):
+        common = Grammar()
+        common.WORD = "w"
+        g = Grammar(cache_size=4)
+        g.start = g.EX__WORD
+        g.include(common, "ex")
+
+        copy = loads(dumps(g))
+        assert copy.generate() == g.generate()
+
+        shared = copy.use_wrapper().directives[0].grammar
+        shared.use_wrapper().replace("WORD", "x")
+        assert 'EX__WORD: "x"' in copy.generate()
+
+    @pytest.mark.parametrize("namespace", ["ns", None])
+    def test_freeze(self, namespace):
+        shared = Grammar()
+        shared.expr = "a"
+        nested = Grammar()
+        nested.item = "b"
+        shared.include(nested, "nested")
+
+        g = Grammar()
+        g.start = g.ns__expr if namespace else g.expr
+        g.include(shared, namespace)
+
+        snapshot = g.freeze()
+        text = snapshot.generate()
+        fingerprint = snapshot.fingerprint()
+
+        # the snapshot keeps the included grammars as they were
+        shared.use_wrapper().replace("expr", "CHANGED")
+        nested.use_wrapper().replace("item", "CHANGED")
+        assert snapshot.generate() == text
+        assert snapshot.fingerprint() == fingerprint
+        assert "CHANGED" not in text
+
+        # while the grammar itself sees the changes
+        assert g.generate().count('"CHANGED"') == 2
+        assert g.fingerprint() != fingerprint
+        assert snapshot.thaw().generate() == text
@@ -0,0 +1,238 @@
+from __future__ import annotations
+
+from lark_dynamic import (
+    Alias,
+    Grammar,
+    KeywordSet,
+    Literal,
+    Many,
+    Maybe,
+    Modifier,
+    Option,
+    Prerendered,
+    RegExp,
+    Repeat,
+    Some,
+    SomeSeparated,
+    Variable,
+    makeBoolVariable,
+)
+from lark_dynamic.combinators import Concat, Range, Suffixed
+from lark_dynamic.parser import ParserCache
+
+import pytest
+
+pytest.importorskip("lark")
+
+from lark import Lark
+from lark.load_grammar import _parse_grammar
+
+from lark_dynamic.direct import build_lark_direct, grammar_statements
+
+
+def make_grammar() -> Grammar:
+    g = Grammar()
+    g.start = SomeSeparated(";", g.statement)
+    g.statement = Option(
+        Alias.assign(g.NAME, "=", g.expr),
+        Alias.call(g.NAME, "(", [g.args], ")"),
+        Alias.loop(Literal("loop").i, g.NUMBER, g.block),
+        g.keyword,
+    )
+    g.args = g.expr, Some(",", g.expr)
+    g.expr = Modifier.INLINE_SINGLE(Option(g.term, (g.expr, g.OP, g.term)))
+    g.term = Option(g.NUMBER, g.NAME, g._paren, g.pair[g.NUMBER], g.STRING)
+    g._paren = "(", g.expr, ")"
+    g.pair[g.item] = "<", g.item, ",", g.item, ">"
+    g.block = "{", Many(g.statement, Maybe(";")), "}"
+    g.keyword = Modifier.KEEP_TERMINALS(KeywordSet(["break", "continue", "pass"]))
+    g.make_rule("digits", Repeat(g.DIGIT, (2, 4)), priority=2)
+
+    g.NAME = RegExp("[a-z_]+")
+    g.make_terminal("OP", Option("+", "-", "*", "/"), priority=3)
+    g.DIGIT = RegExp("[0-9]")
+    g.NUMBER = Many(g.DIGIT)
+    g.STRING = Literal('"'), Some(RegExp('[^"]')), Literal('"')
+    g._WS = Suffixed(RegExp(r"[ \t\n]"), "+")
+    g.make_directive("ignore", g._WS)
+    g.make_directive("import", "common.CNAME")
+    g.make_directive("declare", "UNUSED")
+    return g
+
+
+def summary(parser: Lark) -> tuple:
+    terminals = sorted(
+        (terminal.name, terminal.pattern, terminal.priority) for terminal in parser.terminals
+    )
+    rules = sorted(
+        (
+            str(rule.origin),
+            tuple(map(str, rule.expansion)),
+            rule.alias,
+            rule.order,
+            rule.options.keep_all_tokens,
+            rule.options.expand1,
+            rule.options.priority,
+        )
+        for rule in parser.rules
+    )
+    return terminals, rules, sorted(parser.ignore_tokens)
+
+
+def assert_parity(g: Grammar, options: dict | None = None, **context) -> tuple[Lark, Lark]:
+    options = options or {}
+    text = g.generate(**context)
+    assert grammar_statements(g, context) == _parse_grammar(text, "<string>").children
+
+    from_text = Lark(text, **options)
+    direct = build_lark_direct(g, context, options)
+    assert summary(direct) == summary(from_text)
+    return from_text, direct
+
+
+class TestClass:
+    @pytest.mark.parametrize("parser", ["lalr", "earley"])
+    def test_parity(self, parser):
+        g = make_grammar()
+        from_text, direct = assert_parity(g, {"parser": parser})
+
+        source = 'x = (1 + <2, 3>) - y; f(1, "a b"); LOOP 12 {x = 1; f()}; x = 99'
+        assert direct.parse(source) == from_text.parse(source)
+
+    def test_constructs(self):
+        g = Grammar()
+        # alternatives start with different literals, so Lark accepts the grammar
+        g.start = Option(
+            ("1", g.a, [g.b], Some(g.a, g.b), Many(g.a), Maybe(g.b)),
+            Concat("2", g.a, Option(g.b, Alias.both("3", g.a, g.b))),
+            Alias.empty(),
+            ("4", Repeat(g.a, 3)),
+            ("5", Repeat((g.a, g.b), Range(1, 2))),
+            Concat("6", Suffixed(g.a, "?"), Suffixed(g.b, " ~ 2..3")),
+            (g.A, Prerendered("")),
+        )
+        g.a = "a\n", Literal('"quoted"'), RegExp("a+").i
+        g.b = Option("b", ("c", ()))
+        g.make_rule("inlined", g.a, "?", 4)
+        g.A = Option(Literal("x").i, RegExp(r"y\d"))
+        g._B = "b"
+        g.make_directive("ignore", Option(g._B, " "))
+
+        assert_parity(g)
+        assert_parity(g, {"parser": "earley", "keep_all_tokens": True})
+
+    def test_variables(self):
+        calls = []
+
+        def value(context):
+            calls.append(1)
+            return (g.item, "!") if context.get("loud") else g.item
+
+        g = Grammar()
+        g.start = Many(Variable(value)), makeBoolVariable("end", ".", ())
+        g.item = Variable(lambda context: "x")
+        g.make_template("wrap", g.inner, ("[", g.inner, "]"))
+
+        _, direct = assert_parity(g, loud=True, end=True)
+        assert direct.parse("x!x!.") is not None
+        assert_parity(g, loud=False, end=False)
+
+        # a variable used in many places is evaluated once per build
+        calls.clear()
+        build_lark_direct(g, {}, {})
+        assert len(calls) == 1
+
+    def test_fallback(self):
+        # prerendered text and `%override` are parsed, everything else is built directly
+        g = Grammar()
+        g.start = g.word, Prerendered('"a".."c"')
+        g.word = Prerendered("WORD")
+        g.make_directive("import", "common.WORD")
+        g.make_directive("import", "common (WS, INT)")
+        g.make_directive("ignore", "WS")
+        g.make_directive("override", 'INT: "0"')
+
+        from_text, direct = assert_parity(g)
+        assert direct.parse("hello b") == from_text.parse("hello b")
+
+    def test_include(self):
+        common = Grammar()
+        common.value = Option(common.NUMBER, common.pair[common.NUMBER])
+        common.pair[common.item] = common.item, ",", common.item
+        common.NUMBER = RegExp("[0-9]+")
+        common.make_directive("import", "common.WS")
+        common.make_directive("ignore", "WS")
+
+        g = Grammar()
+        g.start = Many(g.ex__value)
+        g.include(common, "ex")
+        g.make_directive("ignore", "EX__WS")
+
+        from_text, direct = assert_parity(g)
+        assert direct.parse("1 2,3") == from_text.parse("1 2,3")
+
+    def test_errors(self):
+        # invalid grammars fail as they do when parsed from text
+        g = Grammar()
+        g.start = g.missing
+
+        with pytest.raises(Exception) as from_text:
+            Lark(g.generate())
+        with pytest.raises(type(from_text.value)):
+            build_lark_direct(g, {}, {})
+
+        g = Grammar()
+        g.start = Alias.x(g.a), g.a
+        g.a = 'quote"'
+
+        with pytest.raises(Exception) as from_text:
+            Lark(g.generate())
+        with pytest.raises(type(from_text.value)):
+            build_lark_direct(g, {}, {})
+
+    @pytest.mark.parametrize("error", [AttributeError, ValueError])
+    def test_other_lark_versions(self, monkeypatch, error):
+        # when Lark internals are missing or have another shape, the grammar text is built
+        from lark.load_grammar import GrammarBuilder
+
+        from lark_dynamic import direct
+
+        class ChangedBuilder(GrammarBuilder):
+            def _unpack_definition(self, *args, **kwargs):
+                raise error("not enough values to unpack")
+
+        monkeypatch.setattr(direct, "GrammarBuilder", ChangedBuilder)
+
+        g = make_grammar()
+        parser = build_lark_direct(g, {}, {})
+        assert parser.parse("a = 1 + 2") == Lark(g.generate()).parse("a = 1 + 2")
+
+    def test_build_parser_direct(self):
+        cache = ParserCache()
+        g = make_grammar()
+        g.__parsers__ = cache
+
+        direct = g.build_parser_direct({"parser": "lalr"})
+
+        # equivalent parsers are cached by the same key
+        assert g.build_parser({"parser": "lalr"}) is direct
+        assert g.build_parser_direct({"parser": "lalr"}) is direct
+        info = cache.info()
+        assert (info.hits, info.misses) == (2, 1)
+        assert info.build_time > 0
+
+    def test_build_parser_direct_store(self, tmp_path):
+        from lark_dynamic.store import GrammarStore
+
+        store = GrammarStore(tmp_path)
+        g = make_grammar()
+        g.__parsers__ = ParserCache(store=store)
+
+        g.build_parser_direct({"parser": "lalr"})
+
+        (path,) = tmp_path.glob("*/*.lark")
+        assert store.get_text(path.stem) == g.generate()
+        loaded = ParserCache(store=store)
+        g.__parsers__ = loaded
+        assert g.build_parser_direct({"parser": "lalr"}) is not None
+        assert loaded.info().loads == 1
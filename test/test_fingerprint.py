@@ -0,0 +1,93 @@
+from __future__ import annotations
+import os
+import subprocess
+import sys
+
+from lark_dynamic import Grammar, Group, Maybe, RegExp, Variable, makeBoolVariable
+from lark_dynamic.parser import ParserCache
+
+from grammar_utils import make_grammar
+
+import pytest
+
+
+class TestClass:
+    def test_fingerprint(self):
+        g = make_grammar()
+        fingerprint = g.fingerprint(flag=True)
+
+        assert len(fingerprint) == 64
+        assert g.fingerprint(flag=True, other=1) == fingerprint
+        assert g.fingerprint(flag=False) != fingerprint
+        assert make_grammar(cache_size=4).fingerprint(flag=True) == fingerprint
+
+        # the order of definitions doesn't matter
+        assert make_grammar(reverse=True).fingerprint(flag=True) == fingerprint
+        assert make_grammar(reverse=True).generate(flag=True) != g.generate(flag=True)
+
+        # hashes of static definitions are kept until they are changed
+        wrapper = g.use_wrapper()
+        assert wrapper.get_def("NUMBER").digest is not None
+        assert wrapper.get_def("item").digest is None
+
+        wrapper.replace("NUMBER", "1")
+        assert g.fingerprint(flag=True) != fingerprint
+        wrapper.replace("NUMBER", RegExp("[0-9]+"))
+        assert g.fingerprint(flag=True) == fingerprint
+
+
+    def test_stable(self):
+        fingerprint = make_grammar().fingerprint(flag=True)
+
+        code = "from grammar_utils import make_grammar; print(make_grammar().fingerprint(flag=True))"
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        env = {**os.environ, "PYTHONHASHSEED": "1234", "PYTHONPATH": root}
+        output = subprocess.run(
+            [sys.executable, "-c", code],
+            cwd=os.path.dirname(__file__),
+            env=env,
+            stdout=subprocess.PIPE,
+            check=True,
+        ).stdout
+        assert output.decode().strip() == fingerprint
+
+    def test_build_parser(self):
+        pytest.importorskip("lark")
+
+        calls = []
+
+        def item(context):
+            calls.append(context)
+            return "a"
+
+        g = Grammar(parser_cache=ParserCache())
+        g.start = Variable(item)
+
+        parser = g.build_parser()
+        rendered = len(calls)
+        assert g.build_parser() is parser
+        # the variable is evaluated for the fingerprint, but the grammar isn't rendered again
+        assert len(calls) == rendered + 1
+
+    def test_deep_flat(self):
+        class TextCache(ParserCache):
+            # Lark itself can't build parsers of so deep grammars, the rendered text is kept instead
+            def build(self, grammar, options):
+                return grammar
+
+        def make(leaf):
+            g = Grammar(flat=True, parser_cache=TextCache())
+            token = leaf
+            for _ in range(20000):
+                token = Maybe(Group(token))
+            g.deep = token
+            g.start = makeBoolVariable("flag", g.deep, "b")
+            return g
+
+        g = make("a")
+        fingerprint = g.fingerprint(flag=True)
+        assert fingerprint == make("a").fingerprint(flag=True)
+        assert fingerprint != make("c").fingerprint(flag=True)
+        assert fingerprint != g.fingerprint(flag=False)
+
+        assert g.build_parser(flag=True) == g.generate(flag=True)
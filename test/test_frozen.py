@@ -0,0 +1,94 @@
+from __future__ import annotations
+from concurrent.futures import ThreadPoolExecutor
+
+from lark_dynamic import Grammar, Group, Maybe, Modifier, Variable
+
+from grammar_utils import make_grammar
+
+import pytest
+
+
+class TestClass:
+    def test_snapshot(self):
+        g = make_grammar()
+        frozen = g.freeze()
+        text = g.generate(flag=True)
+
+        assert frozen.generate(flag=True) == text
+        assert frozen.get_def("NUMBER") is g.use_wrapper().get_def("NUMBER")
+        assert frozen.get_def("NUMBER").rendered == "NUMBER: /[0-9]+/"
+
+        wrapper = g.use_wrapper()
+        wrapper.extend("start", "x")
+        wrapper.replace("item", "z")
+        wrapper.edit("NUMBER", Modifier.INLINE, 2)
+        g.other = "new"
+
+        assert frozen.generate(flag=True) == text
+        assert g.generate(flag=True) != text
+        assert frozen.get_def("NUMBER") is not wrapper.get_def("NUMBER")
+
+        with pytest.raises(AttributeError):
+            frozen.rules = ()
+
+    def test_thaw(self):
+        frozen = make_grammar(flat=True).freeze()
+        g = frozen.thaw(cache_size=4)
+        wrapper = g.use_wrapper()
+
+        assert g.generate(flag=False) == frozen.generate(flag=False)
+        assert wrapper.get_def("start") is frozen.get_def("start")
+
+        # the shared definition is copied on the first change
+        wrapper.extend("start", "x")
+        assert wrapper.get_def("start") is not frozen.get_def("start")
+        assert wrapper.get_def("item") is frozen.get_def("item")
+        assert g.generate(flag=False).split("\n")[4] == 'start: (item)+ | "x"'
+        assert frozen.generate(flag=False).split("\n")[4] == "start: (item)+"
+
+        other = frozen.thaw()
+        assert other.generate(flag=False) == frozen.generate(flag=False)
+
+    def test_threads(self):
+        g = make_grammar(cache_size=4)
+        frozen = g.freeze()
+        expected = {flag: frozen.generate(flag=flag) for flag in (True, False)}
+
+        def render(i):
+            if i % 10 == 0:
+                # the master grammar is changed concurrently
+                g.use_wrapper().extend("start", str(i))
+            flag = bool(i % 2)
+            return frozen.generate(flag=flag) == expected[flag]
+
+        with ThreadPoolExecutor(8) as executor:
+            assert all(executor.map(render, range(1000)))
+
+    def test_threads_caches(self):
+        # variables with a `cache_size` and included grammars keep caches, written by every thread
+        included = Grammar()
+        included.item = Variable(lambda context: str(context.get("n")), cache_size=2)
+
+        g = Grammar()
+        g.start = Variable(lambda context: f"v{context.get('n')}", cache_size=3), g.inc__item
+        g.include(included, "inc")
+        frozen = g.freeze()
+        expected = {n: frozen.generate(n=n) for n in range(10)}
+
+        def render(i):
+            n = i % 10
+            return frozen.generate(n=n) == expected[n]
+
+        with ThreadPoolExecutor(8) as executor:
+            assert all(executor.map(render, range(2000)))
+
+    def test_deep_flat(self):
+        g = Grammar(flat=True)
+        token = "a"
+        for _ in range(20000):
+            token = Maybe(Group(token))
+        g.start = token
+
+        frozen = g.freeze()
+        assert frozen.generate() == g.generate()
+        assert frozen.fingerprint() == g.fingerprint()
@@ -1,6 +1,6 @@
 from __future__ import annotations
 
-from lark_dynamic import Literal, RegExp
+from lark_dynamic import Group, Literal, RegExp, Some, Variable, makeBoolVariable
 from lark_dynamic.atoms import Prerendered, Rule, Terminal
 from lark_dynamic.definitions import RuleDef, TemplateDef
 from lark_dynamic.grammar import Grammar
@@ -91,3 +91,52 @@ class TestClass:
         assert definition.modifier == ""
         assert definition.priority == 1
         assert definition.tokens == ("b",)
+
+    def test_static_render_cache(self):
+        g = Grammar()
+        g.static = "a", Some(g.b)
+        g.dynamic = makeBoolVariable("flag", "yes", "no")
+        wrapper = g.use_wrapper()
+
+        static, dynamic = wrapper.rules["static"], wrapper.rules["dynamic"]
+
+        assert static.is_static()
+        assert not dynamic.is_static()
+        assert not Group("a", [Variable(lambda context: "b")]).is_static()
+
+        assert g.generate(flag=True) == 'static: "a" (b)*\ndynamic: "yes"'
+        assert static.rendered == 'static: "a" (b)*'
+        assert dynamic.rendered is None
+        assert g.generate(flag=False) == 'static: "a" (b)*\ndynamic: "no"'
+
+        wrapper.extend("static", "c")
+        assert static.rendered is None
+        assert g.generate() == 'static: "a" | (b)* | "c"\ndynamic: "no"'
+
+        wrapper.edit("static", priority=2)
+        assert g.generate() == 'static.2: "a" | (b)* | "c"\ndynamic: "no"'
+
+    def test_generate_many(self):
+        g = Grammar()
+        g.TERM = makeBoolVariable("flag", "yes", Some("no"))
+        g.rule = "a", Variable(lambda context: context.get("rule", "b")), g.TERM
+        g.static = "c"
+        g.make_directive("ignore", makeBoolVariable("flag", g.TERM, '" "'))
+
+        contexts = [{}, {"flag": True}, {"rule": g.static, "flag": False}]
+
+        assert g.generate_many(contexts) == [g.generate(**context) for context in contexts]
+        assert g.generate_many([]) == []
+
+    def test_references(self):
+        g = Grammar()
+
+        assert g.some_rule is g.some_rule
+        assert g.SOME_TERMINAL is g.SOME_TERMINAL
+        assert g.some_rule is not Grammar().some_rule
+
+        with pytest.raises(AttributeError):
+            g.__something__
+
+        for token in (Literal("a"), RegExp("a"), Group("a"), g.some_rule, Variable(len)):
+            assert not hasattr(token, "__dict__")
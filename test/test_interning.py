@@ -0,0 +1,104 @@
+from __future__ import annotations
+
+import pickle
+
+from lark_dynamic import (
+    BoolVariable,
+    Grammar,
+    Group,
+    Literal,
+    Many,
+    Parens,
+    Range,
+    RegExp,
+    Repeat,
+    Some,
+    Variable,
+    makeBoolVariable,
+)
+from lark_dynamic.definitions import RuleDef
+from lark_dynamic.interning import TokenInterner
+
+
+class TestClass:
+    def test_equality(self):
+        assert Literal("a") == Literal("a")
+        assert Literal("a") != Literal("a").i
+        assert Literal("a") != RegExp("a")
+        assert Group(Some("a", ["b"])) == Group(Some("a", ["b"]))
+        assert Group(Some("a", ["b"])) != Group(Some("a", ("b",)))
+        assert Group("a") != Parens("a")
+        assert Repeat("a", [1, 2]) == Repeat("a", [1, 2])
+        assert Repeat("a", Range(1, 2)) != Repeat("a", [1, 2])
+
+        assert len({Group(Some("a", ["b"])), Group(Some("a", ["b"])), Literal("a")}) == 2
+
+        assert Grammar().rule != Grammar().rule
+
+        assert Variable(len) == Variable(len)
+        assert Variable(len) != Variable(str)
+        assert BoolVariable(str, "a") == BoolVariable(str, "a")
+        assert BoolVariable(str, "a") != BoolVariable(str, "a", True)
+
+    def test_deep(self):
+        def make(leaf):
+            token = leaf
+            for _ in range(10000):
+                token = Group(Some(token), Literal("x"))
+            return token
+
+        first, second = make("a"), make("a")
+
+        # hashes are computed without recursion, and kept
+        assert hash(first) == hash(second)
+        assert first.hash_value == hash(first)
+        assert first == second
+        assert first != make("b")
+        assert len({first, second, make("b")}) == 2
+
+        # and aren't pickled, as hashes of strings differ between processes
+        token = Group("a", Some("b"))
+        hash(token)
+        copy = pickle.loads(pickle.dumps(token))
+        assert not hasattr(copy, "hash_value")
+        assert copy == Group("a", Some("b"))
+
+    def test_definitions(self):
+        # definitions are edited in place, so they are compared by identity
+        g = Grammar()
+        g.rule = "a"
+        rule = g.use_wrapper().rules["rule"]
+        definitions = {rule}
+
+        g.use_wrapper().replace("rule", "b")
+
+        assert rule in definitions
+        assert RuleDef("a", ("b",)) != RuleDef("a", ("b",))
+
+    def test_interner(self):
+        interner = TokenInterner()
+
+        first = interner(Group(Some(Literal("a"), ["b"]), Many(RegExp("c"))))
+        second = interner((Some(Literal("a"), ["b"]), Literal("a")))
+
+        assert isinstance(first, Group) and isinstance(second, tuple)
+        assert first.children[0] is second[0]
+        assert second[0].children[0] is second[1]
+        assert interner(Literal("a")) is second[1]
+
+    def test_intern_grammar(self):
+        g = Grammar()
+        g.first = Some(Literal("a"), "b"), g.TERM
+        g.second = Some(Literal("a"), "b"), makeBoolVariable("flag", "c", "d")
+        g.TERM = Group(Literal("a"))
+        g.make_directive("ignore", Group(Literal("a")))
+
+        expected = g.generate(flag=True)
+
+        interner = TokenInterner()
+        interner.intern_grammar(g)
+
+        rules = g.use_wrapper().rules
+        assert rules["first"].tokens[0] is rules["second"].tokens[0]
+        assert g.use_wrapper().terminals["TERM"].tokens[0] is g.use_wrapper().directives[0].content
+        assert g.generate(flag=True) == expected
@@ -0,0 +1,120 @@
+from __future__ import annotations
+
+from lark_dynamic import (
+    Alias,
+    Empty,
+    Grammar,
+    Group,
+    Many,
+    Maybe,
+    Option,
+    Prerendered,
+    Repeat,
+    Some,
+    Variable,
+    makeBoolVariable,
+)
+
+import pytest
+
+
+def optimized(*tokens):
+    g = Grammar()
+    g.rule = tokens
+    return g.generate_optimized().text
+
+
+def make_grammar() -> Grammar:
+    g = Grammar()
+    g.start = Some(Group(g.item))
+    g.item = Option(
+        Group(Option(g.number, g.word)),
+        Alias.pair(Group(g.word), ":", Many(Group(g.number))),
+        makeBoolVariable("lists", g.list, Empty),
+    )
+    g.list = ("[", Maybe(Maybe(g.item, Some(",", g.item))), "]")
+    g.number = Group(Repeat(Group(g.DIGIT), [1, 3]))
+    g.word = Option(g.WORD, (g.WORD, Group("-", g.WORD)))
+    g.DIGIT = Group(Option("0", "1", "2"))
+    g.WORD = Many(Group(Option("a", "b")))
+    g.WS = " "
+    g.make_directive("ignore", "WS")
+    return g
+
+
+class TestClass:
+    def test_groups(self):
+        assert optimized(Group("a")) == 'rule: "a"'
+        assert optimized("a", ("b", "c"), "d") == 'rule: "a" "b" "c" "d"'
+        assert optimized("a", Group(Option("b", "c")), "d") == 'rule: "a" ("b" | "c") "d"'
+        assert optimized(Group(Option("b", "c"))) == 'rule: "b" | "c"'
+        assert optimized("a", Option("b", ("c", "d"))) == 'rule: "a" "b" | "c" "d"'
+        assert optimized(Option("a", Group(Option("b", "c")))) == 'rule: "a" | "b" | "c"'
+        assert optimized(Group(Prerendered("a | b")), "c") == "rule: (a | b) \"c\""
+
+    def test_postfix(self):
+        assert optimized(Some("a")) == 'rule: "a"*'
+        assert optimized(Some("a", "b")) == 'rule: ("a" "b")*'
+        assert optimized(Maybe(Option("a", "b"))) == 'rule: ("a" | "b")?'
+        assert optimized(Many(Maybe("a"))) == 'rule: "a"*'
+        assert optimized(Maybe(Maybe("a"))) == 'rule: "a"?'
+        assert optimized(Many(Group(Many("a")))) == 'rule: "a"+'
+        assert optimized(Some(["a"])) == 'rule: (["a"])*'
+        assert optimized(Repeat(Group("a"), 3)) == 'rule: "a" ~ 3'
+        assert optimized(Repeat(Some("a"), (1, 2))) == 'rule: ("a"*) ~ 1..2'
+
+    def test_empty(self):
+        empty = Variable(lambda context: Empty)
+
+        assert optimized(Option("a", empty)) == 'rule: "a"?'
+        assert optimized("a", Group(Option("b", empty))) == 'rule: "a" "b"?'
+        assert optimized(Many(Option("b", empty))) == 'rule: "b"*'
+        assert optimized(Some(empty)) == "rule:"
+        assert optimized(Option(Alias.x("a"), empty)) == 'rule: "a" -> x |'
+        assert optimized(Option(Alias.x("a"), empty), "b") == 'rule: "a" -> x | "b"'
+
+    def test_aliases(self):
+        # aliases in the middle of a sequence are left as is
+        g = Grammar()
+        g.rule = (Alias.x(Group("a")), Group("b"))
+
+        assert g.generate_optimized().text == g.generate()
+
+    def test_size(self):
+        g = make_grammar()
+        result = g.generate_optimized(lists=True)
+
+        assert result.size_before == len(g.generate(lists=True))
+        assert result.size_after == len(result.text) < result.size_before
+
+    @pytest.mark.parametrize("lists", [True, False])
+    def test_lark(self, lists):
+        lark = pytest.importorskip("lark")
+
+        g = make_grammar()
+        original = lark.Lark(g.generate(lists=lists))
+        optimized = lark.Lark(g.generate_optimized(lists=lists).text)
+
+        texts = ["12 ab", "a-b:0 ba", "1 ab:12 2"]
+        if lists:
+            texts.append("[1, [ab, a-b:1], []] 12")
+
+        for text in texts:
+            assert optimized.parse(text) == original.parse(text)
+
+    def test_deep(self):
+        # nested operators are merged and groups spliced, whatever the depth
+        g = Grammar(flat=True)
+        token = "a"
+        for _ in range(5000):
+            token = Maybe(Group(token))
+        g.rule = token
+        assert g.generate_optimized().text == 'rule: "a"?'
+
+        token = "a"
+        for i in range(5000):
+            token = Option(f"x{i}", (Group(token), "y"))
+        g.other = Group(token)
+        result = g.generate_optimized()
+        assert result.text.count("(") == 4999
+        assert result.size_after < result.size_before
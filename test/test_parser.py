@@ -0,0 +1,72 @@
+from __future__ import annotations
+
+from lark_dynamic.parser import ParserCache
+
+from grammar_utils import make_grammar
+
+import pytest
+
+pytest.importorskip("lark")
+
+
+class TestClass:
+    def test_build_parser(self):
+        cache = ParserCache(maxsize=2)
+        g = make_grammar(parser_cache=cache)
+
+        parser = g.build_parser(flag=True)
+
+        assert parser.parse("-12").children[0].children == ["-", "12"]
+        assert g.build_parser(flag=True) is parser
+        assert g.build_parser(flag=True, other_key=1) is parser
+
+        info = cache.info()
+        assert (info.hits, info.misses, info.evictions) == (2, 1, 0)
+        assert info.build_time > 0
+        assert g.use_wrapper().parser_cache is cache
+
+    def test_same_grammar(self):
+        # different contexts producing the same grammar share one parser
+        cache = ParserCache()
+        g = make_grammar(parser_cache=cache)
+
+        assert g.generate(flag=False) == g.generate(flag=0) == g.generate()
+        parser = g.build_parser(flag=False)
+        assert g.build_parser(flag=0) is parser
+        assert g.build_parser() is parser
+
+        # and so do equal grammars
+        assert make_grammar(parser_cache=cache).build_parser(flag=False) is parser
+        assert (cache.info().hits, cache.info().misses) == (3, 1)
+
+        assert g.build_parser(flag=True) is not parser
+
+    def test_options(self):
+        cache = ParserCache()
+        g = make_grammar(parser_cache=cache)
+
+        earley = g.build_parser(flag=True)
+        lalr = g.build_parser({"parser": "lalr"}, flag=True)
+
+        assert lalr is not earley
+        assert lalr.options.parser == "lalr"
+        assert g.build_parser({"parser": "lalr"}, flag=True) is lalr
+        assert g.build_parser({"parser": "lalr", "debug": False}, flag=True) is not lalr
+        assert (cache.info().hits, cache.info().misses) == (1, 3)
+
+    def test_eviction(self):
+        cache = ParserCache(maxsize=2)
+        g = make_grammar(parser_cache=cache)
+
+        numbers = g.build_parser(flag=True)
+        words = g.build_parser(flag=False)
+        assert g.build_parser(flag=True) is numbers
+
+        # the least recently used parser is evicted
+        lalr = g.build_parser({"parser": "lalr"}, flag=True)
+        assert cache.info().evictions == 1
+        assert g.build_parser(flag=True) is numbers
+        assert g.build_parser({"parser": "lalr"}, flag=True) is lalr
+        assert g.build_parser(flag=False) is not words
+        assert cache.info().evictions == 2
+        assert len(cache) == 2
@@ -0,0 +1,58 @@
+from __future__ import annotations
+import json
+import time
+
+from lark_dynamic import Grammar, Lookup, Many, Variable
+
+
+def slow_keywords(context):
+    time.sleep(0.01)
+    return ["a", "b"]
+
+
+def make_grammar(**kwargs) -> Grammar:
+    g = Grammar(**kwargs)
+    keywords = Variable(slow_keywords)
+    g.start = keywords, Many(g.item)
+    g.item = keywords | Lookup("word")
+    g.WORD = "w"
+    g.make_directive("ignore", "WORD")
+    return g
+
+
+class TestClass:
+    def test_profile(self):
+        g = make_grammar()
+        profile = g.generate_profiled(word="x")
+
+        assert profile.text == g.generate(word="x")
+
+        by_name = {definition.name: definition for definition in profile.definitions}
+        assert list(by_name) == ["WORD", "start", "item", "ignore"]
+        assert by_name["start"].kind == "rule"
+        assert by_name["start"].size == len('start: ["a" "b"] (item)*')
+        assert by_name["start"].time >= 0.01
+        assert by_name["WORD"].static and not by_name["item"].static
+        # the definition, Option, Variable, its value with 2 literals, Lookup, its value
+        assert by_name["item"].nodes == 1 + 1 + 1 + 3 + 1 + 1
+        assert profile.nodes == sum(definition.nodes for definition in profile.definitions)
+
+        variables = {variable.name: variable for variable in profile.variables}
+        keywords = variables["test_profiling:slow_keywords"]
+        # the memoized callback is called once, but evaluated at every use
+        assert keywords.calls == 1 and keywords.evaluations == 2
+        assert keywords.time >= 0.01
+        assert variables["Lookup:word"].calls == 1
+        assert variables["Lookup:word"].evaluations == 1
+        assert profile.variables[0] == keywords
+
+    def test_flat_and_export(self):
+        g = make_grammar(flat=True, cache_size=4)
+        profile = g.generate_profiled(word="x")
+        assert profile.text == g.generate(word="x")
+
+        exported = json.loads(json.dumps(profile.to_dict()))
+        assert exported["size"] == len(profile.text)
+        assert exported["definitions"][1]["name"] == "start"
+        assert exported["variables"][0]["calls"] == 1
+        assert exported["variables"][0]["evaluations"] == 2
@@ -0,0 +1,74 @@
+from __future__ import annotations
+
+from lark_dynamic import Grammar, Option, Prerendered, Variable, makeBoolVariable
+
+import pytest
+
+
+def make_grammar(flat: bool = False) -> Grammar:
+    g = Grammar(flat=flat)
+    g.start = makeBoolVariable("json", g.value, g.expr)
+    g.value = Option(g.NUMBER, g.list[g.value])
+    g.expr = Option(g.NUMBER, (g.expr, g.PLUS))
+    g.list[g.item] = ("[", g.item, "]")
+    g.unused = g.OTHER
+    g.NUMBER = g.DIGIT
+    g.DIGIT = "0"
+    g.PLUS = "+"
+    g.OTHER = "?"
+    g.WS = " "
+    g.make_directive("ignore", "WS")
+    return g
+
+
+class TestClass:
+    def test_prune(self):
+        g = make_grammar()
+
+        text, dropped = g.generate_pruned(json=True)
+        assert dropped == ["PLUS", "OTHER", "expr", "unused"]
+        assert text.split("\n") == [
+            'NUMBER: DIGIT',
+            'DIGIT: "0"',
+            'WS: " "',
+            "",
+            "start: value",
+            "value: NUMBER | list{value}",
+            "",
+            "%ignore WS",
+            "",
+            'list{item}: "[" item "]"',
+        ]
+
+        text, dropped = g.generate_pruned(json=False)
+        assert dropped == ["OTHER", "value", "unused", "list"]
+
+        assert make_grammar(flat=True).generate_pruned(json=True) == g.generate_pruned(
+            json=True
+        )
+
+    def test_start(self):
+        g = make_grammar()
+
+        assert g.generate_pruned(["start", "unused"]).dropped == ["value", "list"]
+
+        with pytest.raises(AttributeError):
+            g.generate_pruned("missing")
+
+    def test_prerendered(self):
+        g = Grammar()
+        g.start = Variable(lambda context: Prerendered("first | SECOND"))
+        g.first = "a"
+        g.SECOND = "b"
+        g.third = "c"
+
+        assert g.generate_pruned().dropped == ["third"]
+
+    def test_lark(self):
+        lark = pytest.importorskip("lark")
+
+        g = make_grammar()
+        text, _ = g.generate_pruned(json=False)
+        parser = lark.Lark(text, parser="lalr")
+
+        assert parser.parse("0 + +") == lark.Lark(g.generate(json=False)).parse("0 + +")
@@ -0,0 +1,98 @@
+from __future__ import annotations
+
+from lark_dynamic import (
+    Alias,
+    Empty,
+    Grammar,
+    Group,
+    Literal,
+    Many,
+    Maybe,
+    Modifier,
+    Option,
+    OptionG,
+    Prerendered,
+    Range,
+    RegExp,
+    Repeat,
+    Some,
+    SomeSeparated,
+    Variable,
+    makeBoolVariable,
+)
+from lark_dynamic.renderer import render_flat
+from token_utils import render_token
+
+import pytest
+
+
+def make_grammar(flat: bool) -> Grammar:
+    g = Grammar(flat=flat)
+    g.DIGIT = g.NONZERO | "0"
+    g.NONZERO = Range("1", "9")
+    g.INTEGER = makeBoolVariable(
+        "zero_leading_numbers", true=Many(g.DIGIT), false=(g.NONZERO, Some(g.DIGIT))
+    )
+    g.FLOAT[2] = Group(g.INTEGER, ".", Some(g.DIGIT)) | (".", Many(g.DIGIT))
+    g.WORD = RegExp(r"\w+", "i")
+    g.number = Alias.integer(g.INTEGER) | Alias.float(g.FLOAT)
+    g.words = Modifier.INLINE_SINGLE(SomeSeparated(",", g.WORD), Empty)
+    g.repeated = Repeat(Literal("a").i, [2, 3]), Repeat("b", 4), ["c", Maybe("d")]
+    g.pair[g.key, g.value] = g.key, "=", g.value
+    g.use = g.pair[g.WORD, Variable(lambda context: context.get("value", "x\n"))]
+    g.make_directive("ignore", g.WORD)
+    g.make_directive("import", "common.WS")
+    return g
+
+
+def deep_token(leaf, depth=10000):
+    # deeper than the recursion limit of the recursive renderer
+    token = leaf
+    for _ in range(depth):
+        token = Maybe(Group(token))
+    return token
+
+
+class TestClass:
+    def test_parity(self):
+        tokens = [
+            "a\tb",
+            ("a", ["b", "c"]),
+            OptionG("a", Option("b", ("c",))),
+            Prerendered("(raw)"),
+            Alias.name("a", Maybe("b")),
+            Repeat(Group("a", "b"), Range(1, 3)),
+        ]
+
+        for token in tokens:
+            assert render_flat(token, {}) == render_token(token)
+
+        for context in ({}, {"zero_leading_numbers": True, "value": "y"}):
+            assert make_grammar(True).generate(**context) == make_grammar(False).generate(**context)
+
+    def test_deep_nesting(self):
+        token = "a"
+        for _ in range(10000):
+            token = Maybe(Group(token))
+
+        with pytest.raises(RecursionError):
+            render_token(token)
+
+        text = render_flat(token, {})
+
+        assert text.startswith("((((")
+        assert text.endswith("))?))?")
+        assert len(text) == 3 + 10000 * 5
+
+        g = Grammar(flat=True)
+        g.deep = token
+
+        assert g.generate() == "deep: " + text
+
+    def test_deep_generate_many(self):
+        g = Grammar(flat=True)
+        g.deep = deep_token(Variable(lambda context: deep_token(context["leaf"])))
+        g.static = deep_token("a")
+
+        contexts = [{"leaf": "x"}, {"leaf": ("y", "z")}]
+        assert g.generate_many(contexts) == [g.generate(**context) for context in contexts]
@@ -0,0 +1,83 @@
+from __future__ import annotations
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+
+from lark_dynamic import (
+    Alias,
+    BoolVariable,
+    CallableRef,
+    Grammar,
+    KeywordSet,
+    Lookup,
+    Many,
+    Switch,
+    Variable,
+    makeBoolVariable,
+)
+from lark_dynamic.serialization import dumps, loads
+
+import pytest
+
+
+def integer_term(zero_leading_numbers: bool):
+    if zero_leading_numbers:
+        return Many("0")
+    return "1", Many("0")
+
+
+def make_grammar() -> Grammar:
+    g = Grammar(cache_size=8)
+    g.start = Alias.number(g.INTEGER) | Alias.word(g.WORD)
+    g.INTEGER = BoolVariable(integer_term, "zero_leading_numbers")
+    g.WORD = Switch("language", {"en": KeywordSet(["hello", "world"])}, Lookup("word"))
+    g.SPACE = makeBoolVariable("spaces", " ", "\t")
+    g.make_directive("ignore", "SPACE")
+    return g
+
+
+def generate(data: bytes, context: dict) -> str:
+    return loads(data).generate(**context)
+
+
+def parse(data: bytes, text: str) -> str:
+    return str(loads(data).build_parser({"parser": "lalr"}, language="en").parse(text))
+
+
+class TestClass:
+    def test_roundtrip(self):
+        g = make_grammar()
+        contexts = [{"language": "en"}, {"word": "x", "zero_leading_numbers": True}]
+        texts = [g.generate(**context) for context in contexts]
+
+        copy = loads(dumps(g))
+        wrapper = copy.use_wrapper()
+        assert wrapper.cache is not None and not wrapper.cache.info().currsize
+        assert wrapper.get_def("SPACE").rendered is None
+
+        assert [copy.generate(**context) for context in contexts] == texts
+
+        # references keep working on the copy
+        copy.other = copy.start
+        assert "other: start" in copy.generate(language="en")
+
+    def test_unpicklable(self):
+        g = Grammar()
+        g.rule = Variable(lambda context: "a")
+
+        with pytest.raises(TypeError):
+            dumps(g)
+
+        g.use_wrapper().replace("rule", Variable(CallableRef("builtins:str")))
+        assert loads(dumps(g)).generate() == g.generate()
+
+    def test_process_pool(self):
+        data = dumps(make_grammar())
+        contexts = [{"language": "en", "spaces": spaces} for spaces in (True, False)]
+
+        # spawned workers don't inherit anything, the grammar is sent to them
+        with ProcessPoolExecutor(2, multiprocessing.get_context("spawn")) as executor:
+            texts = list(executor.map(generate, [data] * 2, contexts))
+            assert texts == [make_grammar().generate(**context) for context in contexts]
+
+            pytest.importorskip("lark")
+            assert executor.submit(parse, data, "hello").result() == "Tree('word', [Token('WORD', 'hello')])"
@@ -0,0 +1,141 @@
+from __future__ import annotations
+
+from pathlib import Path
+import os
+
+from lark_dynamic import Grammar, RegExp, Variable
+from lark_dynamic.parser import ParserCache
+from lark_dynamic.store import PARSER_SUFFIX, RESCAN_WRITES, TEXT_SUFFIX, GrammarStore
+
+from grammar_utils import make_grammar
+
+import pytest
+
+
+class TestClass:
+    def test_text(self, tmp_path: Path):
+        store = GrammarStore(tmp_path / "store")
+
+        store.put_text("key", "start: WORD")
+        store.put_text("key", "ignored")
+
+        assert store.get_text("key") == "start: WORD"
+        assert store.get_text("other") is None
+
+    def test_eviction(self, tmp_path: Path):
+        store = GrammarStore(tmp_path, max_size=10)
+
+        store.put_text("first", "12345")
+        store.put_text("second", "67890")
+
+        os.utime(store.get_path("first", TEXT_SUFFIX), (1, 1))
+        os.utime(store.get_path("second", TEXT_SUFFIX), (2, 2))
+
+        assert store.size() == 10
+
+        store.put_text("third", "abc")
+
+        assert store.get_text("first") is None
+        assert store.get_text("second") == "67890"
+        assert store.get_text("third") == "abc"
+        assert store.size() == 8
+
+    def test_eviction_scans(self, tmp_path: Path, monkeypatch):
+        store = GrammarStore(tmp_path, max_size=1000)
+        scans = []
+        entries = store.entries
+        monkeypatch.setattr(store, "entries", lambda: scans.append(1) or entries())
+
+        # the size is tracked, the directory is scanned only when it's needed
+        for i in range(RESCAN_WRITES - 1):
+            store.put_text(str(i), "x")
+        assert len(scans) == 1
+
+        store.put_text("more", "x" * 1000)
+        assert len(scans) == 2
+        assert store.get_text("0") is None
+
+        # files written by other processes are found by a periodic rescan
+        other = GrammarStore(tmp_path)
+        other.put_text("other", "x" * 500)
+        for i in range(RESCAN_WRITES):
+            store.put_text(f"new{i}", "x")
+        assert len(scans) == 3
+        assert store.size() <= 1000
+
+    def test_corrupt(self, tmp_path: Path):
+        store = GrammarStore(tmp_path)
+
+        store.put_text("empty", "")
+        store.put_text("binary", "")
+        store.get_path("binary", TEXT_SUFFIX).write_bytes(b"\xff\xfe")
+
+        # unreadable files are misses, and are removed
+        assert store.get_text("empty") is None
+        assert store.get_text("binary") is None
+        assert not store.get_path("binary", TEXT_SUFFIX).exists()
+
+    def test_parsers(self, tmp_path: Path):
+        pytest.importorskip("lark")
+
+        # two caches sharing a directory behave like two worker processes
+        first = ParserCache(store=GrammarStore(tmp_path))
+        second = ParserCache(store=GrammarStore(tmp_path))
+
+        parser = make_grammar(parser_cache=first).build_parser({"parser": "lalr"})
+        loaded = make_grammar(parser_cache=second).build_parser({"parser": "lalr"})
+
+        assert parser is not loaded
+        assert loaded.parse("ab cd") == parser.parse("ab cd")
+        assert first.info().loads == 0
+        assert second.info().loads == 1
+        assert second.info().build_time == 0
+
+        # Earley parsers can't be serialized, but are still built and cached in memory
+        earley = make_grammar(parser_cache=second).build_parser()
+        assert earley.parse("ab cd") == parser.parse("ab cd")
+        assert make_grammar(parser_cache=second).build_parser() is earley
+
+    def test_corrupt_parser(self, tmp_path: Path):
+        pytest.importorskip("lark")
+
+        store = GrammarStore(tmp_path)
+        cache = ParserCache(store=store)
+        parser = make_grammar(parser_cache=cache).build_parser({"parser": "lalr"})
+        (path,) = tmp_path.glob("*/*" + PARSER_SUFFIX)
+        path.write_bytes(path.read_bytes()[:100])
+
+        # a truncated parser is a miss, and is removed
+        assert GrammarStore(tmp_path).get_parser(path.stem) is None
+        assert not path.exists()
+
+        cache = ParserCache(store=GrammarStore(tmp_path))
+        rebuilt = make_grammar(parser_cache=cache).build_parser({"parser": "lalr"})
+        assert rebuilt.parse("ab cd") == parser.parse("ab cd")
+        assert cache.info().loads == 0
+        assert GrammarStore(tmp_path).get_parser(path.stem) is not None
+
+    def test_stored_text(self, tmp_path: Path):
+        pytest.importorskip("lark")
+
+        renders = []
+
+        def word(context):
+            renders.append(1)
+            return RegExp("[a-z]+")
+
+        def make(cache: ParserCache) -> Grammar:
+            g = make_grammar(parser_cache=cache)
+            g.use_wrapper().replace("WORD", Variable(word))
+            return g
+
+        # grammars of parsers that can't be saved are kept in the store by the parser key
+        first = ParserCache(store=GrammarStore(tmp_path))
+        make(first).build_parser({"parser": "earley"})
+        renders.clear()
+
+        second = ParserCache(store=GrammarStore(tmp_path))
+        parser = make(second).build_parser({"parser": "earley"})
+        assert parser.parse("ab cd") is not None
+        # the fingerprint reads the variable, but the grammar isn't rendered again
+        assert len(renders) == 1
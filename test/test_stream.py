@@ -0,0 +1,143 @@
+from __future__ import annotations
+import io
+import os
+import socket
+import threading
+
+from lark_dynamic import Grammar, Group, Maybe, Prerendered, Some, Variable, makeBoolVariable
+from lark_dynamic import stream as stream_module
+from lark_dynamic.stream import iter_chunks
+
+import pytest
+
+
+def make_grammar() -> Grammar:
+    g = Grammar()
+    g.start = Some(g.item)
+    g.item = makeBoolVariable("flag", g.WORD, "é")
+    g.WORD = Prerendered(" /\\w+/ \n")
+    return g
+
+
+class TestClass:
+    @pytest.mark.parametrize("chunk_size", [1, 5, 1 << 16])
+    def test_chunks(self, chunk_size):
+        g = make_grammar()
+        text = g.generate(flag=True)
+
+        chunks = list(iter_chunks(g.build_grammar({"flag": True}), chunk_size))
+        assert "".join(chunks) == text
+        assert all(chunks)
+
+        assert "".join(iter_chunks([" \n", "a", "  ", "b \n", "\n"], chunk_size)) == "a  b"
+        assert list(iter_chunks(["  ", "\n"], chunk_size)) == []
+
+    def test_write(self, tmp_path):
+        g = make_grammar()
+        wrapper = g.use_wrapper()
+        text = g.generate(flag=False)
+
+        assert "".join(wrapper.iter_chunks(flag=False)) == text
+
+        output = io.StringIO()
+        wrapper.write(output, flag=False)
+        assert output.getvalue() == text
+
+        binary = io.BytesIO()
+        wrapper.write(binary, flag=False)
+        assert binary.getvalue() == text.encode("utf-8")
+
+        with open(tmp_path / "text.lark", "w", encoding="utf-8") as file:
+            wrapper.write(file, flag=False)
+        with open(tmp_path / "binary.lark", "wb") as file:
+            wrapper.write(file, flag=False)
+        with open(tmp_path / "raw.lark", "wb", buffering=0) as file:
+            wrapper.write(file, flag=False)
+
+        for name in ("text", "binary", "raw"):
+            assert (tmp_path / f"{name}.lark").read_text("utf-8") == text
+
+    def test_pipe_and_socket(self):
+        g = make_grammar()
+        wrapper = g.use_wrapper()
+        text = g.generate(flag=True)
+
+        read_fd, write_fd = os.pipe()
+        with open(write_fd, "wb") as pipe:
+            wrapper.write(pipe, flag=True)
+        with open(read_fd, "rb") as pipe:
+            assert pipe.read() == text.encode("utf-8")
+
+        sender, receiver = socket.socketpair()
+        received = []
+
+        def receive():
+            while True:
+                data = receiver.recv(4096)
+                if not data:
+                    break
+                received.append(data)
+
+        thread = threading.Thread(target=receive)
+        thread.start()
+        with sender:
+            wrapper.write(sender, flag=True)
+        thread.join()
+        receiver.close()
+
+        assert b"".join(received) == text.encode("utf-8")
+
+    def test_flat_and_memoized(self):
+        g = Grammar(flat=True)
+        token = "a"
+        for _ in range(10000):
+            token = Maybe(Group(token))
+        g.deep = token
+
+        calls = []
+
+        def callback(context):
+            calls.append(context)
+            return "b" if context.get("flag") else "c"
+
+        variable = Variable(callback)
+        g.start = variable, g.other
+        g.other = variable, g.deep
+
+        wrapper = g.use_wrapper()
+        text = g.generate(flag=True)
+        calls.clear()
+
+        # deep flat grammars are streamed, and the callback is called once, as in `generate()`
+        assert "".join(wrapper.iter_chunks(flag=True)) == text
+        assert len(calls) == 1
+        assert wrapper.get_dependencies({"flag": True}) == {"flag"}
+        assert len(calls) == 2
+
+    def test_raw_not_writable(self, monkeypatch):
+        monkeypatch.setattr(stream_module, "WRITE_TIMEOUT", 0)
+
+        class Stalling(io.RawIOBase):
+            def __init__(self, stalls):
+                self.stalls = stalls
+                self.data = bytearray()
+
+            def writable(self):
+                return True
+
+            def write(self, data):
+                if self.stalls:
+                    self.stalls -= 1
+                    return None
+                self.data += data[:3]
+                return min(len(data), 3)
+
+        g = make_grammar()
+        text = g.generate(flag=True)
+
+        stream = Stalling(2)
+        g.use_wrapper().write(stream, flag=True)
+        assert stream.data == text.encode("utf-8")
+
+        with pytest.raises(BlockingIOError):
+            g.use_wrapper().write(Stalling(stream_module.WRITE_RETRIES + 1), flag=True)
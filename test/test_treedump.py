@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+import io
+
+from lark_dynamic import Alias, Grammar, Many, Maybe, Option, makeBoolVariable
+from lark_dynamic.token import DumpText, Raw
+from lark_dynamic.treedump import SHALLOW_DEPTH, dump_tree, format_tree, iter_tree
+
+
+def make_grammar() -> Grammar:
+    g = Grammar()
+    g.start = Option(Alias.pair(g.a, ","), [g.b]), ("x",)
+    g.a = makeBoolVariable("flag", "y", g.b)
+    g.b = Many("b")
+    return g
+
+
+EXPECTED = """\
+RuleDef(
+    Option(
+        Alias:pair(
+            Rule(
+                a
+            )
+            ','
+        )
+        [Rule(
+            b
+        )]
+    )
+    ('x',)
+)
+
+RuleDef(
+    BoolSwitch(
+        flag
+        'y'
+        Rule(
+            b
+        )
+    )
+)
+
+RuleDef(
+    Many(
+        'b'
+    )
+)"""
+
+
+class TestClass:
+    def test_repr(self):
+        assert repr(make_grammar()) == EXPECTED
+
+    def test_containers(self):
+        assert format_tree(("a", Maybe("b"), 1)) == "('a', Maybe(\n    'b'\n), 1)"
+        assert format_tree([]) == "[]"
+        assert format_tree(Maybe(())) == "Maybe(\n    ()\n)"
+
+    def test_max_depth(self):
+        token = Option(Maybe(Many("a")), "b")
+        assert format_tree(token, max_depth=0) == "Option(...)"
+        assert format_tree(token, max_depth=1) == "Option(\n    Maybe(...)\n    'b'\n)"
+        assert format_tree(token, max_depth=3) == format_tree(token)
+
+    def test_max_width(self):
+        assert format_tree(Option("a", "b", "c", "d"), max_width=2) == (
+            "Option(\n    'a'\n    'b'\n    ... (2 more)\n)"
+        )
+        assert format_tree(("a", "b", "c"), max_width=1) == "('a', ... (2 more))"
+        assert format_tree(Option("a", "b"), max_width=2) == format_tree(Option("a", "b"))
+
+    def test_deep(self):
+        token = "a"
+        for _ in range(5000):
+            token = Maybe(token)
+
+        text = format_tree(token)
+        lines = text.splitlines()
+        assert len(lines) == 2 * 5000 + 1
+        assert lines[5000] == " " * 4 * 5000 + "'a'"
+
+        # output is streamed in chunks
+        assert len(list(iter_tree(token))) > 1
+        assert format_tree(token, max_depth=2) == "Maybe(\n    Maybe(\n        Maybe(...)\n    )\n)"
+
+    def test_shallow(self):
+        # trees without limits are formatted recursively, like the dumper does with limits
+        g = make_grammar()
+        tokens = [
+            *g.use_wrapper().repr_definitions(),
+            (Raw("a"), [DumpText("b\nc")], Maybe(Raw("d"), ())),
+            Option(1, None, ("x",)),
+        ]
+        for depth in (SHALLOW_DEPTH - 1, SHALLOW_DEPTH, SHALLOW_DEPTH + 1):
+            token = "a"
+            for i in range(depth):
+                token = Maybe(token) if i % 2 else (token, "b")
+            tokens.append(token)
+
+        for token in tokens:
+            assert format_tree(token) == format_tree(token, max_depth=1 << 20)
+
+    def test_dump(self):
+        g = make_grammar()
+
+        fp = io.StringIO()
+        g.use_wrapper().dump(fp)
+        assert fp.getvalue() == EXPECTED
+
+        fp = io.StringIO()
+        g.use_wrapper().dump(fp, max_depth=1)
+        assert fp.getvalue().startswith("RuleDef(\n    Option(...)\n    ('x',)\n)\n\n")
+
+        binary = io.BytesIO()
+        dump_tree(binary, Many("é"))
+        assert binary.getvalue().decode("utf-8") == "Many(\n    'é'\n)"
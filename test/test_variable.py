@@ -1,9 +1,22 @@
+from lark_dynamic import Grammar, Option, Some
 from lark_dynamic.constants import ContextType
 from lark_dynamic.token import Renderable
-from lark_dynamic.variable import BoolVariable, Variable, makeBoolVariable
+from lark_dynamic.tracking import TrackingContext
+from lark_dynamic.variable import (
+    BoolSwitch,
+    BoolVariable,
+    CallableRef,
+    Lookup,
+    Switch,
+    Variable,
+    makeBoolVariable,
+)
 
 from token_utils import render_token
 
+import pickle
+import pytest
+
 
 class TestClass:
     def test_variable(self):
@@ -35,3 +48,190 @@ class TestClass:
         assert render_token(simple_bool_variable) == '"no"'
         assert render_token(simple_bool_variable, {"what": True}) == '"yes"'
         assert render_token(simple_bool_variable, {"what": False}) == '"no"'
+        assert isinstance(simple_bool_variable, BoolVariable)
+        assert simple_bool_variable.function(True) == "yes"
+
+    def test_subclass_slots(self):
+        from lark_dynamic.aio import AsyncVariable
+        from lark_dynamic.composition import Mangled
+
+        async def fetch(context):
+            return "a"
+
+        variables = [
+            BoolVariable(str, "a"),
+            Lookup("a", "b"),
+            BoolSwitch("a", "b", "c"),
+            Switch("a", {1: "b"}, "c"),
+            AsyncVariable(fetch),
+            Mangled(Lookup("a", "b"), "ns"),
+        ]
+        for variable in variables:
+            # `callback` computes the value, as for `Variable`
+            assert variable.pure is True
+            assert variable.cache_size is None and variable.cache is None
+            if not isinstance(variable, AsyncVariable):
+                assert variable.callback({"a": 1}) == variable.evaluate({"a": 1})
+
+        copy = pickle.loads(pickle.dumps(Lookup("a", "b")))
+        assert copy == Lookup("a", "b") and copy.callback({}) == "b"
+
+    def test_dependencies(self):
+        def callback(context: ContextType) -> Renderable:
+            if context.get("a"):
+                return context["b"]
+            return "c"
+
+        variable = Variable(callback)
+
+        assert variable.get_dependencies({}) == {"a"}
+        assert variable.get_dependencies({"a": True, "b": "x"}) == {"a", "b"}
+        assert variable.get_dependencies({"a": False, "b": "x", "c": 1}) == {"a"}
+
+        assert makeBoolVariable("what", "yes", "no").get_dependencies({}) == {"what"}
+        assert Variable(lambda context: str(len(context))).get_dependencies({}) is None
+
+    def test_untracked(self):
+        # without caches, callbacks get the context as it is, tracking reads would only cost time
+        types = []
+        g = Grammar()
+        g.start = Variable(lambda context: types.append(type(context)) or "a")
+        g.generate(b=1)
+        assert types == [dict]
+
+        g = Grammar(cache_size=2)
+        g.start = Variable(lambda context: types.append(type(context)) or "a")
+        g.generate(b=1)
+        assert types[-1] is TrackingContext
+
+    def test_deep_dependencies(self):
+        token = Variable(lambda context: context["a"])
+        for _ in range(5000):
+            token = Some(Option(token, "b"))
+        assert token.get_dependencies({"a": "c"}) == {"a"}
+
+    def test_tracking_context(self):
+        parent = TrackingContext({"a": 1, "b": 2})
+        child = TrackingContext(parent)
+
+        assert not parent.accessed
+
+        assert "a" in child
+        assert child.get("c") is None
+
+        assert child.dependencies() == parent.dependencies() == {"a", "c"}
+
+        list(child.items())
+
+        assert child.dependencies() is None
+        assert parent.dependencies() is None
+
+    def test_declarative(self):
+        lookup = Lookup("a")
+        assert render_token(lookup, {"a": "b"}) == '"b"'
+        assert render_token(Lookup("a", "default")) == '"default"'
+        assert lookup.get_dependencies({"a": "b"}) == {"a"}
+
+        switch = BoolSwitch("what", "yes", "no")
+        assert render_token(switch) == '"no"'
+        assert render_token(switch, {"what": 1}) == '"yes"'
+        assert render_token(BoolSwitch("what", "yes", "no", True)) == '"yes"'
+        assert makeBoolVariable("what", "yes", "no") == switch
+
+        switch = Switch("mode", {"a": "x", 1: "y"})
+        assert render_token(switch, {"mode": "a"}) == '"x"'
+        assert render_token(switch, {"mode": 1}) == '"y"'
+        with pytest.raises(KeyError):
+            render_token(switch, {"mode": []})
+        assert render_token(Switch("mode", {"a": "x"}, "z"), {"mode": "b"}) == '"z"'
+
+    def test_callable_ref(self):
+        ref = CallableRef("token_utils:render_token")
+
+        assert ref("a") == '"a"'
+        assert ref == CallableRef("token_utils:render_token")
+        assert pickle.loads(pickle.dumps(ref)) == ref
+
+        variable = BoolVariable(CallableRef("builtins:str"), "what")
+        assert render_token(variable, {"what": True}) == '"True"'
+
+        with pytest.raises(ValueError):
+            CallableRef("builtins.str")
+
+    @pytest.mark.parametrize("cache_size", [None, 4])
+    def test_memoization(self, cache_size):
+        calls = []
+
+        def keywords(context):
+            calls.append(context)
+            return ["a", "b"] if context.get("locale") == "en" else ["c"]
+
+        g = Grammar(cache_size=cache_size)
+        shared = Variable(keywords)
+        g.start = shared, g.other
+        g.other = Option(shared, "x")
+        g.third = Some(shared)
+
+        text = g.generate(locale="en")
+        assert text.count('["a" "b"]') == 3
+        # called once per generation
+        assert len(calls) == 1
+
+        assert g.generate(locale="fr").count('["c"]') == 3
+        assert len(calls) == 2
+        assert g.generate(locale="en") == text
+
+        impure = Variable(keywords, pure=False)
+        g.use_wrapper().replace("other", (impure, impure))
+        calls.clear()
+        g.generate(locale="de")
+        assert len(calls) == 3
+
+    @pytest.mark.parametrize("flat", [False, True])
+    def test_impure_grammar_cache(self, flat):
+        calls = []
+
+        def counter(context):
+            calls.append(context)
+            return str(len(calls))
+
+        g = Grammar(cache_size=4, flat=flat)
+        g.start = g.a, g.b
+        g.a = Variable(counter, pure=False)
+        g.b = Variable(lambda context: context.get("b", "b"))
+
+        assert g.generate() == 'start: a b\na: "1"\nb: "b"'
+        assert g.generate() == 'start: a b\na: "2"\nb: "b"'
+
+        # included grammars aren't cached either
+        main = Grammar(cache_size=4, flat=flat)
+        main.start = main.a
+        main.include(g)
+        assert main.generate().count('a: "3"') == 1
+        assert main.generate().count('a: "4"') == 1
+
+        # cached again once the variable is pure
+        g.use_wrapper().replace("a", Variable(counter))
+        assert g.generate() == 'start: a b\na: "5"\nb: "b"'
+        assert g.generate() == 'start: a b\na: "5"\nb: "b"'
+        assert len(calls) == 5
+
+    def test_memoization_across_calls(self):
+        calls = []
+
+        def keywords(context):
+            calls.append(context)
+            return context.get("locale", "")
+
+        g = Grammar()
+        g.start = Variable(keywords, cache_size=4)
+
+        assert g.generate(locale="en") == 'start: "en"'
+        assert g.generate(locale="en", other=1) == 'start: "en"'
+        assert len(calls) == 1
+        assert g.generate(locale="fr") == 'start: "fr"'
+        assert len(calls) == 2
+
+        # the cache isn't pickled
+        copy = pickle.loads(pickle.dumps(Variable(CallableRef("builtins:str"), cache_size=2)))
+        assert len(copy.cache) == 0 and copy.cache_size == 2
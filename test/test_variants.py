@@ -0,0 +1,53 @@
+from __future__ import annotations
+
+from lark_dynamic import Grammar, Variable, makeBoolVariable
+from lark_dynamic.constants import ContextType
+from lark_dynamic.token import Renderable
+
+
+def nested(context: ContextType) -> Renderable:
+    if context["a"]:
+        return Variable(lambda context: context["mode"])
+    return "x"
+
+
+def make_grammar() -> Grammar:
+    g = Grammar()
+    g.first = makeBoolVariable("a", "yes", "no")
+    g.second = Variable(nested)
+    g.third = makeBoolVariable("b", "x", "x")
+    return g
+
+
+class TestClass:
+    def test_variants(self):
+        g = make_grammar()
+
+        domains = {
+            "a": [True, False],
+            "b": [True, False],
+            "mode": ["p", "q"],
+            "unused": range(100),
+        }
+        variants = g.generate_variants(domains)
+
+        assert len(variants) == 3
+        assert variants[g.generate(a=False)] == [
+            {"a": False, "b": True, "mode": "p"},
+            {"a": False, "b": True, "mode": "q"},
+            {"a": False, "b": False, "mode": "p"},
+            {"a": False, "b": False, "mode": "q"},
+        ]
+        assert variants[g.generate(a=True, mode="p")] == [
+            {"a": True, "b": True, "mode": "p"},
+            {"a": True, "b": False, "mode": "p"},
+        ]
+
+        assert g.generate_variants(domains, processes=2) == variants
+
+    def test_fixed_context(self):
+        g = make_grammar()
+
+        variants = g.generate_variants({"a": [True, False]}, mode="p")
+
+        assert list(variants.values()) == [[{"a": True}], [{"a": False}]]